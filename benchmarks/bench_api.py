@@ -0,0 +1,263 @@
+"""Benchmark the API hot paths in-process and compare against a baseline.
+
+Seeds a throwaway SQLite database with ``seed_db.seed_bulk``, then drives
+the app through ``TestClient`` (no network, no server process) and reports
+requests/s and p50/p95/p99 latency per scenario. Requests rotate over the
+seeded users so per-user caches are exercised the way real traffic does.
+
+    python benchmarks/bench_api.py --users 200 --requests 300 --output run.json
+    python benchmarks/bench_api.py --baseline benchmarks/baseline.json
+
+With ``--baseline`` the script exits with status 1 when a scenario's p95
+latency rose or its throughput fell by more than ``--tolerance``.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# bcrypt dominates logins, so they run fewer requests
+REQUEST_DIVISORS = {"login": 10}
+
+
+def _percentile(quantiles: list[float], pct: int) -> float:
+    return quantiles[pct - 1] * 1000
+
+
+def measure(call, requests: int, warmup: int) -> dict:
+    for i in range(warmup):
+        call(i)
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(warmup, warmup + requests):
+        t0 = time.perf_counter()
+        if not call(i):
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(quantiles, 50), 3),
+        "p95_ms": round(_percentile(quantiles, 95), 3),
+        "p99_ms": round(_percentile(quantiles, 99), 3),
+    }
+
+
+def scenarios(client, users: list[tuple[int, str]], headers: list[dict]):
+    """Map scenario names to ``call(i) -> ok`` functions."""
+    from app import models, whatsapp_api
+    from app.database import SessionLocal
+
+    month = datetime.utcnow().strftime("%Y-%m")
+    db = SessionLocal()
+    db.add_all(
+        models.Budget(owner_id=user_id, month=month, limit=10_000_000)
+        for user_id, _ in users
+    )
+    db.commit()
+    db.close()
+
+    def auth(i):
+        return headers[i % len(headers)]
+
+    def get(path):
+        return lambda i: client.get(path, headers=auth(i)).status_code == 200
+
+    def login(i):
+        _, email = users[i % len(users)]
+        resp = client.post("/token", data={"username": email, "password": "secret"})
+        return resp.status_code == 200
+
+    def create_transaction(i):
+        resp = client.post(
+            "/transactions/",
+            json={"amount": -(i % 90 + 1), "category_id": None},
+            headers=auth(i),
+        )
+        return resp.status_code == 200
+
+    def webhook(i):
+        user_id, _ = users[i % len(users)]
+        ts = str(int(time.time()))
+        messages = [
+            {
+                "id": f"wamid.BENCH{i}.{n}",
+                "from": _phone(user_id),
+                "timestamp": ts,
+                "text": {"body": f"gasto {n + 1} comida"},
+            }
+            for n in range(10)
+        ]
+        payload = {"entry": [{"changes": [{"value": {"messages": messages}}]}]}
+        body = json.dumps(payload).encode()
+        signature = hmac.new(
+            whatsapp_api.APP_SECRET.encode(), body, hashlib.sha256
+        ).hexdigest()
+        resp = client.post(
+            "/whatsapp",
+            content=body,
+            headers={
+                "content-type": "application/json",
+                whatsapp_api.SIGNATURE_HEADER: f"sha256={signature}",
+            },
+        )
+        return resp.status_code == 204
+
+    return {
+        "login": login,
+        "create_transaction": create_transaction,
+        "list_transactions": get("/transactions/?limit=100"),
+        "summary": get("/summary?granularity=month&by_category=true"),
+        "summary_monthly": get("/summary/monthly"),
+        "summary_category": get("/summary/category"),
+        "users_me": get("/users/me/"),
+        "whatsapp_webhook": webhook,
+    }
+
+
+def _phone(user_id: int) -> str:
+    return f"5491{user_id:08d}"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a description of every scenario that regressed."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms"
+            )
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {base['rps']:.1f} -> {current['rps']:.1f} req/s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--per-month", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument(
+        "--scenarios", nargs="+", help="Only run these scenarios (default: all)"
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # The app reads its configuration at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp.name}/bench.db"
+    os.environ.setdefault("MOOLAH_SECRET_KEY", "benchmark")
+    os.environ.setdefault("WHATSAPP_APP_SECRET", "benchmark")
+    # Keep the report scheduler from competing with the measured requests
+    os.environ.setdefault("MOOLAH_REPORT_INTERVAL", "0")
+    sys.path[:0] = [str(ROOT), str(ROOT / "moolah_backend")]
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import bindparam, select, update
+
+    import seed_db
+    from app import crud, models
+    from app.database import engine
+    from app.main import app
+
+    started = time.perf_counter()
+    seed_db.seed_bulk(args.users, args.months, args.per_month, bind=engine)
+    with engine.begin() as conn:
+        users = conn.execute(
+            select(models.User.id, models.User.email).order_by(models.User.id)
+        ).all()
+        conn.execute(
+            update(models.User)
+            .where(models.User.id == bindparam("uid"))
+            .values(phone_number=bindparam("phone")),
+            [{"uid": user_id, "phone": _phone(user_id)} for user_id, _ in users],
+        )
+    seeded = args.users * args.months * args.per_month
+    print(f"Seeded {seeded} transactions in {time.perf_counter() - started:.1f}s\n")
+
+    headers = [
+        {
+            "Authorization": "Bearer "
+            + crud.create_token_pair(models.User(id=user_id, email=email))[
+                "access_token"
+            ]
+        }
+        for user_id, email in users
+    ]
+    results = {}
+    with TestClient(app) as client:
+        available = scenarios(client, users, headers)
+        print(
+            f"{'scenario':<20} {'req/s':>9} {'p50 ms':>9} "
+            f"{'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for name in args.scenarios or available:
+            divisor = REQUEST_DIVISORS.get(name, 1)
+            result = measure(
+                available[name],
+                max(args.requests // divisor, 10),
+                max(args.warmup // divisor, 1),
+            )
+            results[name] = result
+            print(
+                f"{name:<20} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} "
+                f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+                + (f"  ({result['errors']} errors)" if result["errors"] else "")
+            )
+    engine.dispose()
+    tmp.cleanup()
+
+    report = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "users": args.users,
+            "months": args.months,
+            "per_month": args.per_month,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nWrote {args.output}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
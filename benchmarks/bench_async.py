@@ -0,0 +1,151 @@
+"""Load test the API in sync and async database modes.
+
+Starts a uvicorn server per mode on a fresh SQLite database, then drives it
+with ``--clients`` concurrent HTTP clients and reports requests/s and latency
+percentiles for each mode.
+
+    python benchmarks/bench_async.py --clients 500 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent / "moolah_backend"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode: str, db_path: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "MOOLAH_SECRET_KEY": os.getenv("MOOLAH_SECRET_KEY", "benchmark"),
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "MOOLAH_ASYNC_DB": "1" if mode == "async" else "0",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND,
+        env=env,
+    )
+
+
+async def _prepare(base_url: str, transactions: int) -> dict:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(100):
+            try:
+                await client.get("/config")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        await client.post(
+            "/users/", json={"email": "load@example.com", "password": "secret"}
+        )
+        token = (
+            await client.post(
+                "/token",
+                data={"username": "load@example.com", "password": "secret"},
+            )
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(transactions):
+            await client.post(
+                "/transactions/", json={"amount": i % 50 + 1}, headers=headers
+            )
+        return headers
+
+
+async def _run_load(base_url: str, headers: dict, clients: int, duration: float):
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=60
+    ) as client:
+
+        async def worker(n: int):
+            nonlocal errors
+            paths = ("/transactions/?limit=50", "/budgets/", "/summary/monthly")
+            i = n
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(paths[i % len(paths)])
+                    if resp.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+def bench(mode: str, clients: int, duration: float, transactions: int) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = _start_server(mode, f"{tmp}/bench.db", port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            headers = asyncio.run(_prepare(base_url, transactions))
+            return asyncio.run(_run_load(base_url, headers, clients, duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--transactions", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        result = bench(mode, args.clients, args.duration, args.transactions)
+        print(
+            f"{mode:>5}: {result['rps']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+            f"({result['requests']} requests, {result['errors']} errors)"
+        )
+
+
+if __name__ == "__main__":
+    main()
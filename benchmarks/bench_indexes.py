@@ -0,0 +1,117 @@
+"""Compare transaction hot-path queries with and without composite indexes.
+
+Seeds a throwaway SQLite database, then prints the query plan and the median
+latency of each query before and after creating the indexes declared on
+``models.Transaction``.
+
+    python benchmarks/bench_indexes.py --rows 1000000 --users 1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "moolah_backend"))
+os.environ.setdefault("MOOLAH_SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, func, select, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import Base  # noqa: E402
+from seeding import seed_transactions  # noqa: E402
+
+T = models.Transaction
+
+
+def hot_queries(owner_id: int, category_id: int):
+    month_start = datetime(2022, 6, 1)
+    month_end = datetime(2022, 7, 1)
+    return {
+        "list_transactions": select(T)
+        .where(T.owner_id == owner_id, T.timestamp >= month_start)
+        .order_by(T.timestamp, T.id)
+        .limit(100),
+        "list_by_category": select(T)
+        .where(
+            T.owner_id == owner_id,
+            T.category_id == category_id,
+            T.timestamp >= month_start,
+            T.timestamp < month_end,
+        )
+        .order_by(T.timestamp, T.id),
+        "monthly_summary": select(T.month, func.sum(T.amount))
+        .where(T.owner_id == owner_id)
+        .group_by(T.month),
+        "month_spend": select(func.sum(T.amount)).where(
+            T.owner_id == owner_id,
+            T.timestamp >= month_start,
+            T.timestamp < month_end,
+            T.amount < 0,
+        ),
+        "delete_lookup": select(T).where(T.id == 12345, T.owner_id == owner_id),
+    }
+
+
+def measure(engine, queries, repeat: int):
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            compiled = stmt.compile(
+                dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+            )
+            plan = [
+                row[-1]
+                for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))
+            ]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(stmt).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--categories", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        indexes = list(T.__table__.indexes)
+        for index in indexes:
+            index.drop(bind=engine)
+
+        started = time.perf_counter()
+        seed_transactions(engine, args.rows, args.users, args.categories)
+        print(f"Seeded {args.rows} transactions in {time.perf_counter() - started:.1f}s")
+
+        queries = hot_queries(owner_id=args.users // 2, category_id=1)
+        before = measure(engine, queries, args.repeat)
+        for index in indexes:
+            index.create(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = measure(engine, queries, args.repeat)
+        engine.dispose()
+
+    for name in queries:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f"\n{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms")
+        print(f"  before: {'; '.join(plan_before)}")
+        print(f"  after:  {'; '.join(plan_after)}")
+
+
+if __name__ == "__main__":
+    main()
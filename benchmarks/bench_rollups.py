@@ -0,0 +1,92 @@
+"""Compare analytics served from raw transactions and from the rollups.
+
+Seeds a throwaway SQLite database, builds the day and month rollups with the
+compaction job, then reports the median latency of each ``/summary`` query
+shape computed both ways for the busiest owner.
+
+    python benchmarks/bench_rollups.py --rows 10000000 --users 100
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "moolah_backend"))
+os.environ.setdefault("MOOLAH_SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud, rollups  # noqa: E402
+from app.database import Base  # noqa: E402
+from seeding import seed_transactions  # noqa: E402
+
+QUERIES = {
+    "all-time total": (None, False, None, None),
+    "monthly": ("month", False, None, None),
+    "by category": (None, True, None, None),
+    "month x category": ("month", True, None, None),
+    "weekly, last year": ("week", False, datetime(2024, 1, 1), datetime(2025, 1, 1)),
+    "daily, one month": ("day", True, datetime(2024, 6, 1), datetime(2024, 7, 1)),
+}
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        # Owner 1, whose queries are timed, holds a tenth of all rows
+        seed_transactions(
+            engine,
+            args.rows,
+            args.users,
+            args.categories,
+            hot_owner_share=0.1,
+            uncategorized=True,
+        )
+        print(f"Seeded {args.rows} transactions in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            rollups.rebuild(conn)
+        print(f"Built rollups in {time.perf_counter() - started:.1f}s\n")
+
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            print(f"{'query':<20} {'raw ms':>10} {'rollup ms':>10}")
+            for name, params in QUERIES.items():
+                raw = median_ms(
+                    lambda: crud.summary_from_transactions(db, 1, *params),
+                    args.repeat,
+                )
+                rolled = median_ms(
+                    lambda: crud.summary_from_rollups(db, 1, *params), args.repeat
+                )
+                print(f"{name:<20} {raw:>10.2f} {rolled:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Compare the NumPy trend engine with the same metrics computed in SQL.
+
+Seeds a throwaway SQLite database and, for the busiest owner, times monthly
+spend per category with a moving average and month-over-month change over
+the last ``--months`` months: once loading columns into NumPy arrays
+(``app.trends``) and once with a ``GROUP BY`` plus window functions.
+
+    python benchmarks/bench_trends.py --rows 1000000 --months 24
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "moolah_backend"))
+os.environ.setdefault("MOOLAH_SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import trends  # noqa: E402
+from app.database import Base  # noqa: E402
+from seeding import seed_transactions  # noqa: E402
+
+NOW = datetime(2024, 12, 15)
+
+SQL_TRENDS = text(
+    """
+    WITH monthly AS (
+        SELECT month, COALESCE(category_id, 0) AS category, -SUM(amount) AS spent
+        FROM transactions
+        WHERE owner_id = :owner AND amount < 0 AND timestamp >= :start
+        GROUP BY month, COALESCE(category_id, 0)
+    )
+    SELECT month, category, spent,
+           AVG(spent) OVER (
+               PARTITION BY category ORDER BY month
+               ROWS BETWEEN :preceding PRECEDING AND CURRENT ROW
+           ) AS moving_average,
+           spent - LAG(spent) OVER (PARTITION BY category ORDER BY month)
+               AS change
+    FROM monthly
+    ORDER BY category, month
+    """
+)
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=16)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    first = trends.month_index(NOW) - args.months + 1
+    start = datetime(1970 + first // 12, first % 12 + 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        # Owner 1, whose trends are timed, holds a tenth of all rows
+        seed_transactions(
+            engine,
+            args.rows,
+            args.users,
+            args.categories,
+            end=NOW,
+            amounts=(-200, 150),
+            hot_owner_share=0.1,
+            uncategorized=True,
+        )
+        print(f"Seeded {args.rows} transactions in {time.perf_counter() - started:.1f}s")
+
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+
+            def numpy_engine():
+                cols = trends.load_columns(db, 1, start=start)
+                trends.spending_trends(
+                    cols, first, args.months, args.window, by_category=True
+                )
+                trends.month_forecast(
+                    trends.load_columns(db, 1, start=datetime(2024, 12, 1)),
+                    "2024-12",
+                    NOW,
+                )
+
+            def pure_sql():
+                db.execute(
+                    SQL_TRENDS,
+                    {"owner": 1, "start": start, "preceding": args.window - 1},
+                ).all()
+
+            started = time.perf_counter()
+            cols = trends.load_columns(db, 1, start=start)
+            load_ms = (time.perf_counter() - started) * 1000
+            compute_ms = median_ms(
+                lambda: trends.spending_trends(
+                    cols, first, args.months, args.window, by_category=True
+                ),
+                args.repeat,
+            )
+            print(f"rows loaded for owner 1: {len(cols.amount)}")
+            print(f"numpy load:            {load_ms:10.2f} ms")
+            print(f"numpy compute:         {compute_ms:10.2f} ms")
+            print(f"numpy end to end:      {median_ms(numpy_engine, args.repeat):10.2f} ms")
+            print(f"pure SQL:              {median_ms(pure_sql, args.repeat):10.2f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
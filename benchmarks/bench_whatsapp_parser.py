@@ -0,0 +1,118 @@
+"""Measure WhatsApp command parsing and persistence throughput.
+
+Seeds a throwaway SQLite database with users that have a phone number and a
+set of categories, then reports messages/s for parsing alone and for the full
+webhook storage path (``crud.create_whatsapp_messages``), which stores the
+messages and records the parsed commands as transactions.
+
+    python benchmarks/bench_whatsapp_parser.py --messages 100000 --batch 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "moolah_backend"))
+os.environ.setdefault("MOOLAH_SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud, models, schemas, whatsapp_parser  # noqa: E402
+from app.database import Base  # noqa: E402
+
+CATEGORIES = ["comida", "transporte", "super", "salud", "ocio", "hogar"]
+TEMPLATES = [
+    "gasto {amount} {category}",
+    "Gasté ${amount} en {category}",
+    "pague {amount},50 {category}",
+    "ingreso {amount}",
+    "hola, ¿cómo va?",
+]
+
+
+def seed(engine, users: int):
+    with engine.begin() as conn:
+        conn.execute(
+            models.User.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "email": f"user{i}@example.com",
+                    "phone_number": f"54911{i:06d}",
+                    "points": 0,
+                }
+                for i in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            models.Category.__table__.insert(),
+            [{"name": name.title()} for name in CATEGORIES],
+        )
+
+
+def make_messages(count: int, users: int) -> list[schemas.WhatsAppMessageCreate]:
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    return [
+        schemas.WhatsAppMessageCreate(
+            id=f"wamid.BENCH{i}",
+            body=rng.choice(TEMPLATES).format(
+                amount=rng.randint(1, 500), category=rng.choice(CATEGORIES)
+            ),
+            timestamp=start + timedelta(minutes=i),
+            **{"from": f"54911{rng.randint(1, users):06d}"},
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.users)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        seed(engine, args.users)
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        with Session() as db:
+            categories = crud.get_category_lookup(db)
+        started = time.perf_counter()
+        commands = sum(
+            whatsapp_parser.parse_command(message.body, categories) is not None
+            for message in messages
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"parse only: {args.messages / elapsed:,.0f} messages/s "
+            f"({commands} commands)"
+        )
+
+        started = time.perf_counter()
+        with Session() as db:
+            for offset in range(0, len(messages), args.batch):
+                crud.create_whatsapp_messages(
+                    db, messages[offset : offset + args.batch]
+                )
+            created = db.scalar(select(func.count(models.Transaction.id)))
+        elapsed = time.perf_counter() - started
+        print(
+            f"parse + persist (batch {args.batch}): "
+            f"{args.messages / elapsed:,.0f} messages/s ({created} transactions)"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
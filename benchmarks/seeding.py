@@ -0,0 +1,72 @@
+"""Synthetic transactions for the query benchmarks.
+
+Unlike ``seed_db.seed_bulk``, which builds realistic users with budgets,
+salaries and rewards, this inserts nothing but users, categories and raw
+transactions with a controllable distribution, as fast as Core allows.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from app import models
+
+
+def seed_transactions(
+    engine,
+    rows: int,
+    users: int,
+    categories: int,
+    *,
+    start: datetime = datetime(2020, 1, 1),
+    end: datetime = datetime(2024, 12, 30),
+    amounts: tuple[float, float] = (-200, 200),
+    hot_owner_share: float = 0.0,
+    uncategorized: bool = False,
+    batch: int = 50_000,
+):
+    """Insert ``rows`` transactions spread uniformly between ``start`` and ``end``.
+
+    Owner ``1`` receives ``hot_owner_share`` of the rows and the rest are
+    spread over the other users. With ``uncategorized`` some rows get no
+    category. The same arguments always produce the same data.
+    """
+    rng = random.Random(42)
+    span = int((end - start).total_seconds())
+    first_owner = 2 if hot_owner_share else 1
+
+    def owner_id():
+        if hot_owner_share and rng.random() < hot_owner_share:
+            return 1
+        return rng.randint(first_owner, users)
+
+    def category_id():
+        if uncategorized:
+            return rng.randint(0, categories) or None
+        return rng.randint(1, categories)
+
+    with engine.begin() as conn:
+        conn.execute(
+            models.User.__table__.insert(),
+            [{"id": i, "email": f"user{i}@example.com"} for i in range(1, users + 1)],
+        )
+        conn.execute(
+            models.Category.__table__.insert(),
+            [{"id": i, "name": f"cat{i}"} for i in range(1, categories + 1)],
+        )
+        for offset in range(0, rows, batch):
+            conn.execute(
+                models.Transaction.__table__.insert(),
+                [
+                    {
+                        "amount": round(rng.uniform(*amounts), 2),
+                        "timestamp": ts,
+                        "month": models.month_bucket(ts),
+                        "owner_id": owner_id(),
+                        "category_id": category_id(),
+                    }
+                    for ts in (
+                        start + timedelta(seconds=rng.randrange(span))
+                        for _ in range(min(batch, rows - offset))
+                    )
+                ],
+            )
@@ -0,0 +1,101 @@
+"""Process-local caches shared by the request handlers."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .monitoring import CACHE_REQUESTS
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, name: str = "default"):
+        self.name = name
+        self._hit_metric = CACHE_REQUESTS.labels(name, "hit")
+        self._miss_metric = CACHE_REQUESTS.labels(name, "miss")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                self._miss_metric.inc()
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            self._hit_metric.inc()
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def invalidate(self):
+        """Drop every entry but keep the hit and miss counters."""
+        with self._lock:
+            self._data.clear()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+# Authenticated principals keyed by the token subject (the user's email).
+# Entries are dropped whenever points, admin or active status change in this
+# process; other workers see such changes once the TTL expires.
+principal_cache = TTLCache(
+    name="principal",
+    maxsize=int(os.getenv("MOOLAH_PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("MOOLAH_PRINCIPAL_CACHE_TTL", "30")),
+)
+
+
+# ``{normalized name: id}`` of every category, used to parse WhatsApp
+# commands. Category writes in this process clear it right away.
+category_cache = TTLCache(
+    maxsize=1,
+    ttl=float(os.getenv("MOOLAH_CATEGORY_CACHE_TTL", "300")),
+    name="category",
+)
+
+
+# Analytics results keyed by user id. Each entry is ``(versions, results)``
+# where ``results`` maps query parameters to rows, so a whole analytics screen
+# is one lookup. ``versions`` are the collection versions the rows were
+# computed from; writes in any worker bump them and the entry is recomputed.
+summary_cache = TTLCache(
+    name="summary",
+    maxsize=int(os.getenv("MOOLAH_SUMMARY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("MOOLAH_SUMMARY_CACHE_TTL", "300")),
+)
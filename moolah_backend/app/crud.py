@@ -1,15 +1,36 @@
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy import Date, case, cast, func, insert, select, and_, or_
 from decimal import Decimal
 from fastapi import HTTPException
-from passlib.context import CryptContext
 from jose import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+import base64
+import hashlib
+import hmac
+import json
 import logging
+import math
 import os
-
-from . import models, schemas
+import secrets
+
+from . import (
+    events,
+    hashing,
+    models,
+    rollups,
+    schemas,
+    trends,
+    upserts,
+    whatsapp_parser,
+)
+from .cache import category_cache, principal_cache, summary_cache
+from .monitoring import (
+    BUDGET_REJECTIONS,
+    REWARDS_GRANTED,
+    TRANSACTIONS_CREATED,
+    WEBHOOK_MESSAGES,
+)
 
 SECRET_KEY = os.getenv("MOOLAH_SECRET_KEY")
 if not SECRET_KEY:
@@ -17,7 +38,15 @@ if not SECRET_KEY:
     logging.error(message)
     raise RuntimeError(message)
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(
+    os.getenv("MOOLAH_ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("MOOLAH_REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+PHONE_CODE_DIGITS = 6
+PHONE_CODE_TTL = timedelta(
+    minutes=int(os.getenv("MOOLAH_PHONE_CODE_TTL_MINUTES", "10"))
+)
+PHONE_CODE_ATTEMPTS = 5
 
 # Points required to reach each level
 LEVEL_THRESHOLDS = [
@@ -26,15 +55,9 @@ LEVEL_THRESHOLDS = [
     ("Gold", 1000),
 ]
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing.hash_sync(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -48,12 +71,50 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
+def create_token_pair(user) -> dict:
+    """Issue an access token and a long-lived refresh token for ``user``.
+
+    The refresh token carries ``"type": "refresh"`` so it cannot be used as a
+    bearer token, and exchanging it at ``/token/refresh`` skips bcrypt.
+    """
+    claims = {"sub": user.email, "uid": user.id}
+    return {
+        "access_token": create_access_token(
+            claims, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        ),
+        "refresh_token": create_access_token(
+            {**claims, "type": "refresh"},
+            timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        ),
+        "token_type": "bearer",
+    }
+
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def get_user_with_relations(db: Session, user_id: int, relations):
+    """Load a user with the requested relationships eagerly.
+
+    Each relationship is fetched with its own ``SELECT ... IN`` query rather
+    than one lazy load per attribute access.
+    """
+    options = [selectinload(getattr(models.User, name)) for name in relations]
+    return (
+        db.query(models.User)
+        .options(*options)
+        .filter(models.User.id == user_id)
+        .execution_options(populate_existing=True)
+        .first()
+    )
+
+
+def create_user(
+    db: Session, user: schemas.UserCreate, *, hashed_password: str | None = None
+):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -69,21 +130,237 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if not user:
-        return False
-    if not verify_password(password, user.hashed_password):
-        return False
-    return user
+def get_user_by_phone(db: Session, phone_number: str):
+    return (
+        db.query(models.User).filter(models.User.phone_number == phone_number).first()
+    )
+
+
+def start_phone_verification(db: Session, user_id: int, phone_number: str):
+    """Store ``phone_number`` as pending and return ``(code, verification)``.
+
+    The number is only linked by :func:`confirm_phone_number` once the user
+    enters the code, which the caller sends to that number. Requesting a new
+    code replaces any pending one.
+    """
+    owner = get_user_by_phone(db, phone_number)
+    if owner is not None and owner.id != user_id:
+        raise HTTPException(status_code=400, detail="Phone number already registered")
+    code = f"{secrets.randbelow(10**PHONE_CODE_DIGITS):0{PHONE_CODE_DIGITS}d}"
+    verification = db.get(models.PhoneVerification, user_id)
+    if verification is None:
+        verification = models.PhoneVerification(user_id=user_id)
+        db.add(verification)
+    verification.phone_number = phone_number
+    verification.code_hash = _phone_code_hash(user_id, phone_number, code)
+    verification.expires_at = datetime.utcnow() + PHONE_CODE_TTL
+    verification.attempts = 0
+    db.commit()
+    return code, schemas.PhoneVerification.model_validate(verification)
+
+
+def confirm_phone_number(db: Session, user_id: int, code: str):
+    """Link the pending phone number if ``code`` matches the one sent to it."""
+    verification = db.get(models.PhoneVerification, user_id)
+    if verification is None or verification.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=400, detail="No pending phone verification")
+    if verification.attempts >= PHONE_CODE_ATTEMPTS:
+        db.delete(verification)
+        db.commit()
+        raise HTTPException(status_code=400, detail="Too many attempts")
+    expected = _phone_code_hash(user_id, verification.phone_number, code.strip())
+    if not hmac.compare_digest(expected, verification.code_hash):
+        verification.attempts += 1
+        db.commit()
+        raise HTTPException(status_code=400, detail="Invalid verification code")
+    db_user = db.get(models.User, user_id)
+    db_user.phone_number = verification.phone_number
+    db.delete(verification)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Phone number already registered")
+    db.refresh(db_user)
+    invalidate_principal(db_user)
+    return db_user
+
+
+def _phone_code_hash(user_id: int, phone_number: str, code: str) -> str:
+    message = f"{user_id}:{phone_number}:{code}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def update_user(db: Session, user_id: int, user: schemas.UserUpdate):
+    db_user = db.get(models.User, user_id)
+    for key, value in user.model_dump(exclude_unset=True).items():
+        setattr(db_user, key, value)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Phone number already registered")
+    db.refresh(db_user)
+    invalidate_principal(db_user)
+    return db_user
+
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    """Store a rehashed password, e.g. after the bcrypt cost was raised."""
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.hashed_password: hashed_password}
+    )
+    db.commit()
+
+
+def invalidate_principal(user: models.User):
+    """Drop the cached principal after points, admin or active status change."""
+    principal_cache.pop(user.email)
+
+
+def invalidate_summaries(user_id: int):
+    """Drop the cached analytics of ``user_id`` after a transaction write."""
+    summary_cache.pop(user_id)
+
+
+def month_range(month: str) -> tuple[datetime, datetime]:
+    """Turn ``"YYYY-MM"`` into the half-open ``[start, end)`` timestamp range.
+
+    Filtering on the raw ``timestamp`` column keeps the predicate sargable, so
+    the ``(owner_id, timestamp)`` index can serve it as a range scan.
+    """
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be in YYYY-MM format")
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def get_month_spent(db: Session, user_id: int, month: str) -> Decimal:
+    """Total expenses recorded for ``user_id`` in ``month`` (``YYYY-MM``).
+
+    Read from the month rollup, so budget checks do not have to scan the
+    owner's history.
+    """
+    expense = (
+        db.query(func.sum(models.MonthlyRollup.expense))
+        .filter(
+            models.MonthlyRollup.owner_id == user_id,
+            models.MonthlyRollup.month == month,
+        )
+        .scalar()
+    )
+    return -Decimal(expense or 0)
+
+
+def rebuild_rollups(db: Session, *, fix: bool = True):
+    """Recompute the day and month rollups from raw transactions.
+
+    Returns the rows whose stored ``(income, expense, count)`` differs from
+    the recomputed one, ignoring empty rows left by deletes. When ``fix`` is
+    true both tables are rebuilt, which also drops those empty rows.
+    """
+    mismatches = []
+    for model, period_col, stmt in rollups.sources(db):
+        expected = {
+            (owner_id, period, category_id): (Decimal(income), Decimal(expense), count)
+            for owner_id, period, category_id, income, expense, count in db.execute(
+                stmt
+            )
+        }
+        stored = {
+            (row.owner_id, getattr(row, period_col.key), row.category_id): (
+                Decimal(row.income),
+                Decimal(row.expense),
+                row.count,
+            )
+            for row in db.query(model).filter(model.count != 0)
+        }
+        for key in sorted(expected.keys() | stored.keys()):
+            exp = expected.get(key, (Decimal("0"), Decimal("0"), 0))
+            got = stored.get(key, (Decimal("0"), Decimal("0"), 0))
+            if exp != got:
+                owner_id, period, category_id = key
+                mismatches.append(
+                    {
+                        "table": model.__tablename__,
+                        "owner_id": owner_id,
+                        "period": period,
+                        "category_id": category_id,
+                        "expected": exp,
+                        "stored": got,
+                    }
+                )
+
+    if fix:
+        rollups.rebuild(db)
+        db.commit()
+    return mismatches
+
+
+SHARED_OWNER = 0
+
+
+def bump_versions(db: Session, collection: str, owner_ids):
+    """Increment the collection version of each owner in the current transaction.
+
+    Call before committing a write so the new version becomes visible
+    together with the rows it describes.
+    """
+    upserts.increment(
+        db,
+        models.CollectionVersion.__table__,
+        [
+            {"owner_id": owner_id, "collection": collection, "version": 1}
+            for owner_id in sorted(set(owner_ids))
+        ],
+        keys=("owner_id", "collection"),
+        columns=("version",),
+    )
+
+
+def get_collection_version(db: Session, owner_id: int, collection: str) -> int:
+    return (
+        db.scalar(
+            select(models.CollectionVersion.version).where(
+                models.CollectionVersion.owner_id == owner_id,
+                models.CollectionVersion.collection == collection,
+            )
+        )
+        or 0
+    )
 
 
 def _check_and_create_rewards(db: Session, user: models.User):
     existing = {reward.level for reward in user.rewards}
+    granted = []
     for level, points_required in LEVEL_THRESHOLDS:
         if user.points >= points_required and level not in existing:
             reward = models.Reward(level=level, points=user.points, owner_id=user.id)
             db.add(reward)
+            granted.append(reward)
+    if granted:
+        bump_versions(db, "rewards", [user.id])
+    return granted
+
+
+def _publish(user_id: int, event_type: str, schema, obj):
+    """Notify the user's event stream; call only after the commit succeeded."""
+    events.publish(
+        events.user_channel(user_id),
+        event_type,
+        schema.model_validate(obj).model_dump(mode="json"),
+    )
+
+
+def _publish_rewards(rewards):
+    for reward in rewards:
+        REWARDS_GRANTED.labels(reward.level).inc()
+        _publish(reward.owner_id, "reward.granted", schemas.Reward, reward)
 
 
 def create_transaction(
@@ -99,66 +376,342 @@ def create_transaction(
     )
     user = db.get(models.User, user_id)
 
-    month_key = db_tx.timestamp.strftime("%Y-%m")
+    month_key = models.month_bucket(db_tx.timestamp)
     budget = (
         db.query(models.Budget)
         .filter(models.Budget.owner_id == user_id, models.Budget.month == month_key)
         .first()
     )
     if budget and db_tx.amount < 0:
-        dialect = db.bind.dialect.name
-        if dialect == "sqlite":
-            month_expr = func.strftime("%Y-%m", models.Transaction.timestamp)
-        else:
-            month_expr = func.to_char(
-                func.date_trunc("month", models.Transaction.timestamp),
-                "YYYY-MM",
-            )
-
-        spent = (
-            db.query(func.sum(models.Transaction.amount))
-            .filter(
-                models.Transaction.owner_id == user_id,
-                month_expr == month_key,
-                models.Transaction.amount < 0,
-            )
-            .scalar()
-            or Decimal("0")
-        )
-        spent = abs(spent) + abs(db_tx.amount)
+        spent = get_month_spent(db, user_id, month_key) + abs(db_tx.amount)
         if spent > budget.limit:
+            BUDGET_REJECTIONS.inc()
             raise HTTPException(status_code=400, detail="Budget exceeded")
 
     db.add(db_tx)
     # Gamification: earn points for each transaction
     user.points += int(abs(db_tx.amount))
 
-    _check_and_create_rewards(db, user)
+    granted = _check_and_create_rewards(db, user)
+    bump_versions(db, "transactions", [user_id])
 
     db.commit()
     db.refresh(db_tx)
     db.refresh(user)
+    invalidate_principal(user)
+    invalidate_summaries(user_id)
+    TRANSACTIONS_CREATED.labels("api").inc()
+    _publish(user_id, "transaction.created", schemas.Transaction, db_tx)
+    _publish_rewards(granted)
 
     return db_tx
 
 
-def get_transactions(
+def bulk_create_transactions(
     db: Session,
+    transactions: list[schemas.TransactionImport],
+    user_id: int,
+):
+    """Import many transactions with one insert and one points update.
+
+    Budgets and spend totals are read once per affected month. Expenses that
+    would push a month over its budget are rejected individually while the
+    rest of the batch is stored. Returns one result dict per input row, in
+    order.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "amount": tx.amount,
+            "category_id": tx.category_id,
+            "timestamp": tx.timestamp or now,
+            "owner_id": user_id,
+        }
+        for tx in transactions
+    ]
+    return _insert_transaction_rows(db, rows, source="bulk")
+
+
+def _insert_transaction_rows(db: Session, rows: list[dict], *, source: str):
+    """Validate and insert transaction rows of one or more owners at once.
+
+    Every lookup (categories, budgets, spend, owners) is a single query for
+    the whole batch and everything is committed together, so the cost per row
+    stays flat however many owners the rows belong to.
+    """
+    for row in rows:
+        row["month"] = models.month_bucket(row["timestamp"])
+    results = [{"index": i, "status": "created"} for i in range(len(rows))]
+
+    category_ids = {row["category_id"] for row in rows if row["category_id"]}
+    known_categories = set()
+    if category_ids:
+        known_categories = set(
+            db.scalars(
+                select(models.Category.id).where(models.Category.id.in_(category_ids))
+            )
+        )
+
+    owner_ids = {row["owner_id"] for row in rows}
+    months = {row["month"] for row in rows}
+    limits = {
+        (owner_id, month): limit
+        for owner_id, month, limit in db.query(
+            models.Budget.owner_id, models.Budget.month, models.Budget.limit
+        ).filter(
+            models.Budget.owner_id.in_(owner_ids), models.Budget.month.in_(months)
+        )
+    }
+    spent = {}
+    if limits:
+        rollup = models.MonthlyRollup
+        spent = {
+            (owner_id, month): -Decimal(expense or 0)
+            for owner_id, month, expense in db.query(
+                rollup.owner_id, rollup.month, func.sum(rollup.expense)
+            )
+            .filter(
+                rollup.owner_id.in_({key[0] for key in limits}),
+                rollup.month.in_({key[1] for key in limits}),
+            )
+            .group_by(rollup.owner_id, rollup.month)
+        }
+
+    accepted = []
+    for result, row in zip(results, rows):
+        if row["category_id"] and row["category_id"] not in known_categories:
+            result.update(status="rejected", error="Category not found")
+            continue
+        key = (row["owner_id"], row["month"])
+        if key in limits and row["amount"] < 0:
+            month_spent = spent.get(key, Decimal("0")) + abs(row["amount"])
+            if month_spent > limits[key]:
+                BUDGET_REJECTIONS.inc()
+                result.update(status="rejected", error="Budget exceeded")
+                continue
+            spent[key] = month_spent
+        accepted.append((result, row))
+
+    if not accepted:
+        return results
+
+    ids = db.scalars(
+        insert(models.Transaction).returning(
+            models.Transaction.id, sort_by_parameter_order=True
+        ),
+        [row for _, row in accepted],
+    ).all()
+    for (result, _), tx_id in zip(accepted, ids):
+        result["id"] = tx_id
+
+    # Core inserts bypass the flush hook that maintains the rollups
+    rollups.record(
+        db,
+        [
+            (row["owner_id"], row["timestamp"], row["category_id"], row["amount"])
+            for _, row in accepted
+        ],
+    )
+
+    created_ids: dict[int, list[int]] = {}
+    points: dict[int, int] = {}
+    for result, row in accepted:
+        owner_id = row["owner_id"]
+        created_ids.setdefault(owner_id, []).append(result["id"])
+        points[owner_id] = points.get(owner_id, 0) + int(abs(row["amount"]))
+    users = db.scalars(
+        select(models.User)
+        .options(selectinload(models.User.rewards))
+        .where(models.User.id.in_(points.keys()))
+    ).all()
+    granted = []
+    for user in users:
+        user.points += points[user.id]
+        granted.extend(_check_and_create_rewards(db, user))
+
+    bump_versions(db, "transactions", created_ids)
+    # Read before the commit expires the users, which would reload each one
+    emails = {user.id: user.email for user in users}
+    db.commit()
+    TRANSACTIONS_CREATED.labels(source).inc(len(accepted))
+    for user_id, email in emails.items():
+        principal_cache.pop(email)
+        invalidate_summaries(user_id)
+        events.publish(
+            events.user_channel(user_id),
+            "transaction.bulk_created",
+            {"ids": created_ids[user_id]},
+        )
+    _publish_rewards(granted)
+    return results
+
+
+def encode_cursor(timestamp: datetime, transaction_id: int) -> str:
+    """Build an opaque pagination cursor for a ``(timestamp, id)`` position."""
+    raw = json.dumps([timestamp.isoformat(), transaction_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, tx_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(ts), int(tx_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _transactions_filter(
     user_id: int,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
     category_id: int | None = None,
+    after: tuple[datetime, int] | None = None,
 ):
-    query = db.query(models.Transaction).filter(models.Transaction.owner_id == user_id)
+    conditions = [models.Transaction.owner_id == user_id]
     if start_date:
-        query = query.filter(models.Transaction.timestamp >= start_date)
+        conditions.append(models.Transaction.timestamp >= start_date)
     if end_date:
-        query = query.filter(models.Transaction.timestamp <= end_date)
+        conditions.append(models.Transaction.timestamp <= end_date)
     if category_id:
-        query = query.filter(models.Transaction.category_id == category_id)
+        conditions.append(models.Transaction.category_id == category_id)
+    if after:
+        # Keyset condition: (timestamp, id) > (after_ts, after_id)
+        after_ts, after_id = after
+        conditions.append(
+            or_(
+                models.Transaction.timestamp > after_ts,
+                and_(
+                    models.Transaction.timestamp == after_ts,
+                    models.Transaction.id > after_id,
+                ),
+            )
+        )
+    return conditions
+
+
+def get_transactions(
+    db: Session,
+    user_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    category_id: int | None = None,
+    *,
+    limit: int | None = None,
+    cursor: str | None = None,
+):
+    after = decode_cursor(cursor) if cursor else None
+    query = (
+        db.query(models.Transaction)
+        .filter(
+            *_transactions_filter(user_id, start_date, end_date, category_id, after)
+        )
+        .order_by(models.Transaction.timestamp, models.Transaction.id)
+    )
+    if limit:
+        query = query.limit(limit)
     return query.all()
 
 
+def get_transactions_page(
+    db: Session,
+    user_id: int,
+    limit: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    category_id: int | None = None,
+    cursor: str | None = None,
+):
+    """Return one keyset page of transactions and the cursor for the next one.
+
+    One extra row is fetched to find out whether another page exists, so the
+    last page is reported with ``None`` instead of an empty follow-up request.
+    """
+    rows = get_transactions(
+        db,
+        user_id,
+        start_date,
+        end_date,
+        category_id,
+        limit=limit + 1,
+        cursor=cursor,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
+
+
+def iter_transactions(
+    db: Session,
+    user_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    category_id: int | None = None,
+    *,
+    cursor: str | None = None,
+    batch_size: int = 1000,
+):
+    """Yield transaction rows from a streamed result in ``batch_size`` chunks.
+
+    Plain column rows are returned instead of ORM objects so memory use does
+    not depend on the size of the ledger.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    stmt = (
+        select(
+            models.Transaction.id,
+            models.Transaction.amount,
+            models.Transaction.category_id,
+            models.Transaction.timestamp,
+            models.Transaction.owner_id,
+        )
+        .where(
+            *_transactions_filter(user_id, start_date, end_date, category_id, after)
+        )
+        .order_by(models.Transaction.timestamp, models.Transaction.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = db.execute(stmt)
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def iter_transaction_export(
+    db: Session,
+    user_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    category_id: int | None = None,
+    *,
+    batch_size: int = 5000,
+):
+    """Yield lists of export rows, ``batch_size`` at a time.
+
+    Rows are ``(id, timestamp, amount, category_id, category name)`` read
+    from a streamed (server-side where the driver supports it) cursor, so
+    only one batch is held in memory.
+    """
+    tx = models.Transaction
+    stmt = (
+        select(tx.id, tx.timestamp, tx.amount, tx.category_id, models.Category.name)
+        .outerjoin(models.Category, models.Category.id == tx.category_id)
+        .where(*_transactions_filter(user_id, start_date, end_date, category_id))
+        .order_by(tx.timestamp, tx.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = db.execute(stmt)
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
 def update_transaction(
     db: Session,
     transaction_id: int,
@@ -179,49 +732,40 @@ def update_transaction(
     user = db.get(models.User, user_id)
 
     old_amount = db_tx.amount
+    old_timestamp = db_tx.timestamp
     for key, value in transaction.model_dump(exclude_unset=True).items():
         setattr(db_tx, key, value)
 
-    month_key = db_tx.timestamp.strftime("%Y-%m")
+    month_key = models.month_bucket(db_tx.timestamp)
     budget = (
         db.query(models.Budget)
         .filter(models.Budget.owner_id == user_id, models.Budget.month == month_key)
         .first()
     )
     if budget and db_tx.amount < 0:
-        dialect = db.bind.dialect.name
-        if dialect == "sqlite":
-            month_expr = func.strftime("%Y-%m", models.Transaction.timestamp)
-        else:
-            month_expr = func.to_char(
-                func.date_trunc("month", models.Transaction.timestamp),
-                "YYYY-MM",
-            )
-
-        spent = (
-            db.query(func.sum(models.Transaction.amount))
-            .filter(
-                models.Transaction.owner_id == user_id,
-                month_expr == month_key,
-                models.Transaction.amount < 0,
-                models.Transaction.id != db_tx.id,
-            )
-            .scalar()
-            or Decimal("0")
-        )
-        spent = abs(spent) + abs(db_tx.amount)
+        spent = get_month_spent(db, user_id, month_key)
+        if old_amount < 0 and models.month_bucket(old_timestamp) == month_key:
+            # The stored total still includes this transaction's old amount
+            spent -= abs(old_amount)
+        spent += abs(db_tx.amount)
         if spent > budget.limit:
             db.rollback()
+            BUDGET_REJECTIONS.inc()
             raise HTTPException(status_code=400, detail="Budget exceeded")
 
     user.points -= int(abs(old_amount))
     user.points += int(abs(db_tx.amount))
 
-    _check_and_create_rewards(db, user)
+    granted = _check_and_create_rewards(db, user)
+    bump_versions(db, "transactions", [user_id])
 
     db.commit()
     db.refresh(db_tx)
     db.refresh(user)
+    invalidate_principal(user)
+    invalidate_summaries(user_id)
+    _publish(user_id, "transaction.updated", schemas.Transaction, db_tx)
+    _publish_rewards(granted)
 
     return db_tx
 
@@ -238,12 +782,18 @@ def delete_transaction(db: Session, transaction_id: int, user_id: int):
     if not db_tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
     db.delete(db_tx)
+    bump_versions(db, "transactions", [user_id])
     db.commit()
+    invalidate_summaries(user_id)
+    events.publish(
+        events.user_channel(user_id), "transaction.deleted", {"id": transaction_id}
+    )
 
 
 def create_goal(db: Session, goal: schemas.GoalCreate, user_id: int):
     db_goal = models.Goal(**goal.model_dump(), owner_id=user_id)
     db.add(db_goal)
+    bump_versions(db, "goals", [user_id])
     db.commit()
     db.refresh(db_goal)
     return db_goal
@@ -263,6 +813,7 @@ def update_goal(db: Session, goal_id: int, goal: schemas.GoalUpdate, user_id: in
         raise HTTPException(status_code=404, detail="Goal not found")
     for key, value in goal.model_dump(exclude_unset=True).items():
         setattr(db_goal, key, value)
+    bump_versions(db, "goals", [user_id])
     db.commit()
     db.refresh(db_goal)
     return db_goal
@@ -282,11 +833,14 @@ def set_goal_achieved(db: Session, goal_id: int, user_id: int):
         db_goal.achieved = True
         user.points += int(db_goal.target_amount)
 
-    _check_and_create_rewards(db, user)
+    granted = _check_and_create_rewards(db, user)
+    bump_versions(db, "goals", [user_id])
 
     db.commit()
     db.refresh(db_goal)
     db.refresh(user)
+    invalidate_principal(user)
+    _publish_rewards(granted)
 
     return db_goal, user
 
@@ -300,6 +854,7 @@ def delete_goal(db: Session, goal_id: int, user_id: int):
     if not db_goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     db.delete(db_goal)
+    bump_versions(db, "goals", [user_id])
     db.commit()
 
 
@@ -307,10 +862,12 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     db_category = models.Category(**category.model_dump())
     db.add(db_category)
     try:
+        bump_versions(db, "categories", [SHARED_OWNER])
         db.commit()
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Category already exists")
+    category_cache.pop("lookup")
     db.refresh(db_category)
     return db_category
 
@@ -319,13 +876,31 @@ def get_categories(db: Session):
     return db.query(models.Category).all()
 
 
+def get_category_lookup(db: Session) -> dict[str, int]:
+    """Return ``{normalized name: id}`` for all categories, cached in memory."""
+    lookup = category_cache.get("lookup")
+    if lookup is None:
+        lookup = {
+            whatsapp_parser.normalize(name): category_id
+            for category_id, name in db.execute(
+                select(models.Category.id, models.Category.name)
+            )
+        }
+        category_cache.set("lookup", lookup)
+    return lookup
+
+
 def update_category(db: Session, category_id: int, category: schemas.CategoryUpdate):
     db_cat = db.query(models.Category).filter(models.Category.id == category_id).first()
     if not db_cat:
         raise HTTPException(status_code=404, detail="Category not found")
     for key, value in category.model_dump(exclude_unset=True).items():
         setattr(db_cat, key, value)
+    bump_versions(db, "categories", [SHARED_OWNER])
     db.commit()
+    category_cache.pop("lookup")
+    # Cached summaries are keyed by category name
+    summary_cache.invalidate()
     db.refresh(db_cat)
     return db_cat
 
@@ -335,18 +910,23 @@ def delete_category(db: Session, category_id: int):
     if not db_cat:
         raise HTTPException(status_code=404, detail="Category not found")
     db.delete(db_cat)
+    bump_versions(db, "categories", [SHARED_OWNER])
     db.commit()
+    category_cache.pop("lookup")
+    summary_cache.invalidate()
 
 
 def create_budget(db: Session, budget: schemas.BudgetCreate, user_id: int):
     db_budget = models.Budget(**budget.model_dump(), owner_id=user_id)
     db.add(db_budget)
     try:
+        bump_versions(db, "budgets", [user_id])
         db.commit()
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Budget already exists")
     db.refresh(db_budget)
+    _publish(user_id, "budget.created", schemas.Budget, db_budget)
     return db_budget
 
 
@@ -367,11 +947,13 @@ def update_budget(
     for key, value in budget.model_dump(exclude_unset=True).items():
         setattr(db_budget, key, value)
     try:
+        bump_versions(db, "budgets", [user_id])
         db.commit()
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Budget already exists")
     db.refresh(db_budget)
+    _publish(user_id, "budget.updated", schemas.Budget, db_budget)
     return db_budget
 
 
@@ -384,23 +966,167 @@ def delete_budget(db: Session, budget_id: int, user_id: int):
     if not db_budget:
         raise HTTPException(status_code=404, detail="Budget not found")
     db.delete(db_budget)
+    bump_versions(db, "budgets", [user_id])
     db.commit()
+    events.publish(events.user_channel(user_id), "budget.deleted", {"id": budget_id})
 
 
 def get_rewards(db: Session, user_id: int):
     return db.query(models.Reward).filter(models.Reward.owner_id == user_id).all()
 
 
+def get_reward_progress(db: Session, user_id: int):
+    """Return ``(version, points, rewards)`` of the user from a single query.
+
+    Points are read from the database rather than the cached principal, which
+    other workers may hold for a while after a transaction, and the
+    ``rewards`` version comes from the same snapshot as the rows.
+    """
+    cv = models.CollectionVersion
+    version = (
+        select(cv.version)
+        .where(cv.owner_id == models.User.id, cv.collection == "rewards")
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(func.coalesce(version, 0), models.User.points, models.Reward)
+        .select_from(models.User)
+        .outerjoin(models.Reward, models.Reward.owner_id == models.User.id)
+        .where(models.User.id == user_id)
+        .order_by(models.Reward.id)
+    ).all()
+    version, points = rows[0][:2]
+    return version, points, [row[2] for row in rows if row[2] is not None]
+
+
+SUMMARY_GRANULARITIES = ("day", "week", "month")
+
+
+def _period_column(db: Session, granularity: str):
+    """``YYYY-MM`` for months, otherwise the ``YYYY-MM-DD`` the period starts."""
+    timestamp = models.Transaction.timestamp
+    if granularity == "month":
+        return models.Transaction.month
+    if db.bind.dialect.name == "sqlite":
+        if granularity == "week":
+            # Monday of the ISO week
+            return func.date(timestamp, "weekday 0", "-6 days")
+        return func.date(timestamp)
+    if granularity == "week":
+        timestamp = func.date_trunc("week", timestamp)
+    return func.to_char(timestamp, "YYYY-MM-DD")
+
+
 def get_summary(
     db: Session,
     user_id: int,
     group_by_month: bool = False,
     group_by_category: bool = False,
+    month: str | None = None,
+    *,
+    granularity: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
 ):
-    query = db.query(func.sum(models.Transaction.amount).label("total"))
+    """Sum the user's transactions, optionally per period and/or category.
+
+    ``granularity`` is one of ``SUMMARY_GRANULARITIES`` (``group_by_month``
+    is shorthand for ``"month"``); combined with ``group_by_category`` it
+    gives a cross-tab. ``start`` is inclusive, ``end`` exclusive and
+    ``month`` is shorthand for that month's range. Each row has ``total``,
+    ``income`` and ``expense`` plus ``period`` and ``category`` labels for
+    the grouped dimensions.
+
+    Ranges aligned to days are answered from the day and month rollups, so
+    the cost does not grow with the number of transactions. Results are
+    also cached per user until the next transaction write.
+    """
+    if group_by_month:
+        granularity = granularity or "month"
+    if granularity is not None and granularity not in SUMMARY_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Invalid granularity")
+    if month:
+        start, end = month_range(month)
+
+    if _is_day_start(start) and _is_day_start(end):
+        compute = summary_from_rollups
+    else:
+        compute = summary_from_transactions
+    return _cached_analytics(
+        db,
+        user_id,
+        ("summary", granularity, group_by_category, start, end),
+        lambda: compute(db, user_id, granularity, group_by_category, start, end),
+    )
+
+
+def _analytics_versions(db: Session, user_id: int) -> tuple:
+    """Versions of every collection the user's analytics are computed from."""
+    cv = models.CollectionVersion
+    return tuple(
+        db.execute(
+            select(cv.owner_id, cv.collection, cv.version)
+            .where(
+                or_(
+                    and_(
+                        cv.owner_id == user_id,
+                        cv.collection.in_(("transactions", "budgets")),
+                    ),
+                    and_(cv.owner_id == SHARED_OWNER, cv.collection == "categories"),
+                )
+            )
+            .order_by(cv.owner_id, cv.collection)
+        ).all()
+    )
+
+
+def _cached_analytics(db: Session, user_id: int, key, compute):
+    """Return ``compute()`` memoised in the user's ``summary_cache`` entry.
+
+    The entry is tagged with the collection versions it was computed from,
+    so a write committed by any worker bumps a version and makes it miss.
+    """
+    versions = _analytics_versions(db, user_id)
+    cached = summary_cache.get(user_id)
+    if cached is None or cached[0] != versions:
+        # A write committed while computing bumps a version again, so a
+        # result computed from newer data is never served under older ones
+        cached = (versions, {})
+        summary_cache.set(user_id, cached)
+    elif key in cached[1]:
+        return cached[1][key]
+    result = compute()
+    cached[1][key] = result
+    return result
+
+
+def _is_day_start(value: datetime | None) -> bool:
+    return value is None or value == datetime.combine(value.date(), time.min)
+
+
+def summary_from_transactions(
+    db: Session,
+    user_id: int,
+    granularity: str | None,
+    group_by_category: bool,
+    start: datetime | None,
+    end: datetime | None,
+):
+    """Aggregate raw transactions; used for ranges not aligned to days."""
+    amount = models.Transaction.amount
+    query = db.query(
+        func.sum(amount).label("total"),
+        func.sum(case((amount > 0, amount), else_=0)).label("income"),
+        func.sum(case((amount < 0, amount), else_=0)).label("expense"),
+    )
 
     group_fields = []
 
+    if granularity:
+        period_col = _period_column(db, granularity)
+        query = query.add_columns(period_col.label("period"))
+        group_fields.append(period_col)
+
     if group_by_category:
         category_col = models.Category.name
         query = query.add_columns(category_col.label("category")).join(
@@ -410,37 +1136,355 @@ def get_summary(
         )
         group_fields.append(category_col)
 
-    if group_by_month:
-        dialect = db.bind.dialect.name
-        if dialect == "sqlite":
-            month_expr = func.strftime("%Y-%m", models.Transaction.timestamp)
-        else:
-            month_expr = func.to_char(
-                func.date_trunc("month", models.Transaction.timestamp),
-                "YYYY-MM",
-            )
-        query = query.add_columns(month_expr.label("month"))
-        group_fields.append(month_expr)
-
     query = query.filter(models.Transaction.owner_id == user_id)
+    if start:
+        query = query.filter(models.Transaction.timestamp >= start)
+    if end:
+        query = query.filter(models.Transaction.timestamp < end)
 
     if group_fields:
-        query = query.group_by(*group_fields)
+        query = query.group_by(*group_fields).order_by(*group_fields)
     return query.all()
 
 
-def create_whatsapp_message(db: Session, message: schemas.WhatsAppMessageCreate):
-    db_msg = models.WhatsAppMessage(
-        wa_id=message.wa_id,
-        from_number=message.from_number,
-        body=message.body,
-        timestamp=message.timestamp,
+def summary_from_rollups(
+    db: Session,
+    user_id: int,
+    granularity: str | None,
+    group_by_category: bool,
+    start: datetime | None,
+    end: datetime | None,
+):
+    """Same rows as ``summary_from_transactions`` read from the rollups.
+
+    The month rollup serves monthly and all-time totals over month-aligned
+    ranges, the day rollup everything else. ``start`` and ``end`` must fall
+    on midnight.
+    """
+    month_aligned = all(value is None or value.day == 1 for value in (start, end))
+    if granularity in (None, "month") and month_aligned:
+        model = models.MonthlyRollup
+        bucket_col, bucket = model.month, models.month_bucket
+        period_col = model.month
+    else:
+        model = models.DailyRollup
+        bucket_col, bucket = model.day, models.day_bucket
+        period_col = _rollup_day_period(db, granularity)
+
+    query = db.query(
+        func.sum(model.income + model.expense).label("total"),
+        func.sum(model.income).label("income"),
+        func.sum(model.expense).label("expense"),
     )
-    db.add(db_msg)
-    db.commit()
-    db.refresh(db_msg)
-    return db_msg
 
+    group_fields = []
+
+    if granularity:
+        query = query.add_columns(period_col.label("period"))
+        group_fields.append(period_col)
+
+    if group_by_category:
+        category_col = models.Category.name
+        query = query.add_columns(category_col.label("category")).join(
+            models.Category,
+            model.category_id == models.Category.id,
+            isouter=True,
+        )
+        group_fields.append(category_col)
+
+    query = query.filter(model.owner_id == user_id)
+    if start:
+        query = query.filter(bucket_col >= bucket(start))
+    if end:
+        query = query.filter(bucket_col < bucket(end))
+
+    if group_fields:
+        # Rows whose transactions were all deleted stay until compaction
+        query = (
+            query.group_by(*group_fields)
+            .having(func.sum(model.count) > 0)
+            .order_by(*group_fields)
+        )
+    return query.all()
+
+
+def _rollup_day_period(db: Session, granularity: str | None):
+    day = models.DailyRollup.day
+    if granularity == "month":
+        return func.substr(day, 1, 7)
+    if granularity != "week":
+        return day
+    if db.bind.dialect.name == "sqlite":
+        return func.date(day, "weekday 0", "-6 days")
+    return func.to_char(func.date_trunc("week", cast(day, Date)), "YYYY-MM-DD")
+
+
+def _category_names(db: Session) -> dict[int, str]:
+    names = dict(db.execute(select(models.Category.id, models.Category.name)).all())
+    names[0] = "Uncategorized"
+    return names
+
+
+def _optional_float(value, digits: int = 2):
+    return None if math.isnan(value) else round(float(value), digits)
+
+
+def get_spending_trends(
+    db: Session,
+    user_id: int,
+    months: int = 12,
+    window: int = 3,
+    by_category: bool = False,
+    *,
+    now: datetime | None = None,
+):
+    """Monthly spend over the last ``months`` months (current one included)
+    with a ``window``-month moving average and month-over-month change."""
+    now = now or datetime.utcnow()
+    first = trends.month_index(now) - months + 1
+    start = datetime(1970 + first // 12, first % 12 + 1, 1)
+
+    def compute():
+        cols = trends.load_columns(db, user_id, start=start)
+        points = trends.spending_trends(cols, first, months, window, by_category)
+        names = _category_names(db) if by_category else {}
+        for point in points:
+            category_id = point.pop("category_id")
+            if by_category:
+                point["category"] = names.get(category_id, "Uncategorized")
+            point["spent"] = trends.cents(point["spent"])
+            point["moving_average"] = trends.cents(point["moving_average"])
+            if not math.isnan(point["change"]):
+                point["change"] = trends.cents(point["change"])
+            else:
+                point["change"] = None
+            point["change_pct"] = _optional_float(point["change_pct"])
+        return points
+
+    return _cached_analytics(
+        db, user_id, ("trends", first, months, window, by_category), compute
+    )
+
+
+def get_month_forecast(
+    db: Session, user_id: int, month: str | None = None, *, now: datetime | None = None
+):
+    """Project month-end spend per category and compare it with the budget.
+
+    Cached per hour, since the projection only drifts slowly with the clock.
+    """
+    now = now or datetime.utcnow()
+    month = month or models.month_bucket(now)
+    start, end = month_range(month)
+
+    def compute():
+        cols = trends.load_columns(db, user_id, start=start, end=end)
+        forecast = trends.month_forecast(cols, month, now)
+        names = _category_names(db)
+        budget = (
+            db.query(models.Budget.limit)
+            .filter(models.Budget.owner_id == user_id, models.Budget.month == month)
+            .scalar()
+        )
+        projected = trends.cents(forecast["projected"])
+        forecast.update(
+            spent=trends.cents(forecast["spent"]),
+            projected=projected,
+            budget=budget,
+            projected_over_budget=None if budget is None else projected > budget,
+            categories=[
+                {
+                    "category": names.get(item["category_id"], "Uncategorized"),
+                    "spent": trends.cents(item["spent"]),
+                    "projected": trends.cents(item["projected"]),
+                }
+                for item in forecast["categories"]
+            ],
+        )
+        return forecast
+
+    return _cached_analytics(
+        db, user_id, ("forecast", month, now.strftime("%Y-%m-%d %H")), compute
+    )
+
+
+def get_reports(db: Session):
+    return db.scalars(select(models.Report).order_by(models.Report.name)).all()
+
+
+def get_report(db: Session, name: str):
+    return db.scalar(select(models.Report).where(models.Report.name == name))
 
-def get_whatsapp_messages(db: Session):
-    return db.query(models.WhatsAppMessage).all()
+
+WHATSAPP_INSERT_CHUNK = 500
+
+
+def _insert_whatsapp_rows(db: Session, rows: list[dict]):
+    msg = models.WhatsAppMessage
+    return upserts.insert_missing(
+        db,
+        msg.__table__,
+        rows,
+        keys=("wa_id",),
+        returning=(msg.id, msg.wa_id, msg.from_number, msg.body, msg.timestamp),
+        chunk=WHATSAPP_INSERT_CHUNK,
+    )
+
+
+def create_whatsapp_messages(
+    db: Session, messages: list[schemas.WhatsAppMessageCreate]
+) -> tuple[int, int]:
+    """Store a batch of webhook messages, skipping already known ``wa_id``s.
+
+    Uses ``INSERT ... ON CONFLICT (wa_id) DO NOTHING`` (see ``upserts``) so
+    redeliveries and duplicates inside the batch cost no extra round trips.
+    Newly stored messages are then parsed into transactions in the same
+    database transaction, so a redelivered command is recorded exactly once.
+    A command the database refuses (e.g. an out-of-range value) costs only
+    its own transaction: the messages are stored again and the commands are
+    recorded one message at a time. Returns the number of inserted and
+    skipped messages.
+    """
+    if not messages:
+        return 0, 0
+    rows = [
+        {
+            "wa_id": message.wa_id,
+            "from_number": message.from_number,
+            "body": message.body,
+            "timestamp": message.timestamp,
+        }
+        for message in messages
+    ]
+    stored = _insert_whatsapp_rows(db, rows)
+    owners = _phone_owners(db, {row.from_number for row in stored})
+    # Not committed yet: the transactions commit together with the messages,
+    # so if the database fails nothing is stored and a redelivery is
+    # processed again instead of being skipped as a duplicate
+    try:
+        created = create_transactions_from_messages(db, stored, owners)
+        db.commit()
+    except (DataError, ArithmeticError):
+        db.rollback()
+        logging.exception("Recording WhatsApp commands one message at a time")
+        stored = _insert_whatsapp_rows(db, rows)
+        db.commit()
+        created = 0
+        for row in stored:
+            try:
+                created += create_transactions_from_messages(db, [row], owners)
+                db.commit()
+            except (DataError, ArithmeticError):
+                db.rollback()
+                logging.exception(
+                    "Could not record the command of WhatsApp message %s", row.wa_id
+                )
+    for row in stored:
+        # Only the user who verified the sender's number may see the message
+        if row.from_number not in owners:
+            continue
+        events.publish(
+            events.user_channel(owners[row.from_number]),
+            "whatsapp.message",
+            {
+                "id": row.id,
+                "wa_id": row.wa_id,
+                "from": row.from_number,
+                "body": row.body,
+                "timestamp": row.timestamp.isoformat(),
+            },
+        )
+    WEBHOOK_MESSAGES.labels("inserted").inc(len(stored))
+    WEBHOOK_MESSAGES.labels("duplicate").inc(len(rows) - len(stored))
+    if created:
+        logging.info("Created %s transactions from WhatsApp messages", created)
+    return len(stored), len(rows) - len(stored)
+
+
+def _phone_owners(db: Session, numbers) -> dict[str, int]:
+    """Map each of ``numbers`` linked to a user to that user's id."""
+    if not numbers:
+        return {}
+    return dict(
+        db.execute(
+            select(models.User.phone_number, models.User.id).where(
+                models.User.phone_number.in_(numbers)
+            )
+        ).all()
+    )
+
+
+def create_transactions_from_messages(
+    db: Session, messages, owners: dict[str, int] | None = None
+) -> int:
+    """Parse message bodies and record the commands of registered senders.
+
+    ``messages`` are rows with ``from_number``, ``body`` and ``timestamp``.
+    Bodies are parsed in memory against the cached category lookup; senders
+    are resolved with one query, unless the caller already did it and passes
+    ``owners``, and the commands of every owner are inserted and committed
+    together. Returns the number of transactions created.
+    """
+    categories = get_category_lookup(db)
+    parsed = []
+    for message in messages:
+        command = whatsapp_parser.parse_command(message.body or "", categories)
+        if command is not None:
+            parsed.append((message, command))
+    if not parsed:
+        return 0
+
+    if owners is None:
+        owners = _phone_owners(db, {message.from_number for message, _ in parsed})
+    rows = [
+        {
+            "amount": command.amount,
+            "category_id": command.category_id,
+            "timestamp": message.timestamp,
+            "owner_id": owners[message.from_number],
+        }
+        for message, command in parsed
+        if message.from_number in owners
+    ]
+    if not rows:
+        return 0
+    results = _insert_transaction_rows(db, rows, source="whatsapp")
+    return sum(result["status"] == "created" for result in results)
+
+
+def get_whatsapp_messages(
+    db: Session,
+    from_number: str | None = None,
+    since: datetime | None = None,
+    after_id: int | None = None,
+    limit: int | None = None,
+    *,
+    owner_id: int | None = None,
+):
+    """Return stored messages ordered by id.
+
+    ``after_id`` is the keyset cursor for incremental sync: clients pass the
+    last id they have seen and only receive newer messages. Ids grow with
+    arrival, unlike timestamps, so a late redelivery is still picked up.
+    With ``owner_id`` only messages sent from that user's verified number are
+    returned, read in the same query so an unlinked number is never served.
+    """
+    msg = models.WhatsAppMessage
+    stmt = select(msg.id, msg.wa_id, msg.from_number, msg.body, msg.timestamp)
+    if owner_id is not None:
+        phone = (
+            select(models.User.phone_number)
+            .where(models.User.id == owner_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(msg.from_number == phone)
+    if from_number:
+        stmt = stmt.where(msg.from_number == from_number)
+    if since:
+        stmt = stmt.where(msg.timestamp > since)
+    if after_id:
+        stmt = stmt.where(msg.id > after_id)
+    stmt = stmt.order_by(msg.id)
+    if limit:
+        stmt = stmt.limit(limit)
+    return db.execute(stmt).all()
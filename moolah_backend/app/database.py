@@ -1,24 +1,230 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from .monitoring import DB_POOL_CHECKED_OUT, DB_POOL_WAIT_SECONDS
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./moolah.db")
+# Serve requests through AsyncSession (aiosqlite / asyncpg) instead of the
+# blocking session running in the threadpool.
+ASYNC_DB = os.getenv("MOOLAH_ASYNC_DB", "").lower() in ("1", "true", "yes")
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (
+    ":memory:" in SQLALCHEMY_DATABASE_URL
+    or SQLALCHEMY_DATABASE_URL.rstrip("/") in ("sqlite:", "sqlite+pysqlite:")
+)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+POOL_SIZE = int(os.getenv("MOOLAH_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("MOOLAH_DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("MOOLAH_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("MOOLAH_DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = _env_bool("MOOLAH_DB_POOL_PRE_PING", not IS_SQLITE)
+
+SQLITE_JOURNAL_MODE = os.getenv("MOOLAH_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("MOOLAH_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("MOOLAH_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+class _WaitTimingMixin:
+    """Record how long callers wait for a pooled connection.
+
+    ``_do_get`` is where ``QueuePool`` blocks when every connection is checked
+    out (and where new connections are opened), so timing it measures pool
+    contention.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            DB_POOL_WAIT_SECONDS.observe(waited)
+            with self.wait_lock:
+                self.wait_count += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+
+
+class TimedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
 
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+
+class TimedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options(*, use_async: bool = False) -> dict:
+    if IS_SQLITE_MEMORY:
+        return {}
+    return {
+        "poolclass": TimedAsyncQueuePool if use_async else TimedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not IS_SQLITE_MEMORY:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         connect_args={"check_same_thread": False},
+        **_engine_options(),
     )
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
 else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def _track_pool_usage(sync_engine):
+    event.listen(sync_engine, "checkout", _on_checkout)
+    event.listen(sync_engine, "checkin", _on_checkin)
+
+
+_track_pool_usage(engine)
+
 Base = declarative_base()
 
 
-def get_db():
+def async_database_url(url: str) -> str:
+    """Map a sync database URL to its async driver equivalent."""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if scheme in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    raise ValueError(f"No async driver configured for '{scheme}' databases")
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        async_database_url(SQLALCHEMY_DATABASE_URL),
+        **_engine_options(use_async=True),
+    )
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    _track_pool_usage(async_engine.sync_engine)
+    # Objects must stay readable after commit without an implicit lazy refresh,
+    # which AsyncSession cannot perform outside ``run_sync``.
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if ASYNC_DB else get_sync_db
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Run a ``crud`` function in a fresh session outside of a request."""
+    if ASYNC_DB:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    def _call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(_call)
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a ``crud`` function against either kind of session.
+
+    ``crud`` is written against the sync ``Session`` API. With an
+    ``AsyncSession`` it runs through ``run_sync`` on the async connection;
+    otherwise it runs in the threadpool so the event loop is never blocked.
+    """
+    if ASYNC_DB:
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, _WaitTimingMixin):
+        with pool.wait_lock:
+            stats.update(
+                wait_count=pool.wait_count,
+                wait_time_total=pool.wait_time_total,
+                wait_time_max=pool.wait_time_max,
+            )
+    return stats
+
+
+def pool_stats() -> dict:
+    """Connection pool usage for the sync and (if enabled) async engines."""
+    stats = {"sync": _pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = _pool_stats(async_engine.sync_engine.pool)
+    return stats
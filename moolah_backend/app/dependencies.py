@@ -3,27 +3,60 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
-from .database import get_db
+from .cache import principal_cache
+from .database import get_db, run_db
 from . import crud, schemas
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(token: str, token_type: str = "access") -> dict:
     try:
         payload = jwt.decode(token, crud.SECRET_KEY, algorithms=[crud.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
     except JWTError:
-        raise credentials_exception
-    user = crud.get_user_by_email(db, email=token_data.email)
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    # Access tokens predate the claim, so a missing type means "access"
+    if payload.get("type", "access") != token_type:
+        raise _credentials_exception()
+    return payload
+
+
+async def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> schemas.UserProfile:
+    """Resolve the token to a cached, detached snapshot of the user."""
+    token_data = schemas.TokenData(email=_decode_token(token)["sub"])
+    principal = principal_cache.get(token_data.email)
+    if principal is not None:
+        return principal
+    user = await run_db(db, crud.get_user_by_email, email=token_data.email)
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    principal = schemas.UserProfile.model_validate(user)
+    principal_cache.set(token_data.email, principal)
+    return principal
+
+
+async def get_current_user_id(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> int:
+    """Return the authenticated user's id straight from the token.
+
+    Tokens issued before the ``uid`` claim existed fall back to
+    :func:`get_current_user`.
+    """
+    payload = _decode_token(token)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        return user_id
+    return (await get_current_user(db, token)).id
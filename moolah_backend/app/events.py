@@ -0,0 +1,146 @@
+"""Publish/subscribe fan-out of committed changes to connected clients.
+
+``crud`` publishes an event after each successful commit. The broker carries
+events between processes; the hub fans them out to the local subscribers
+(one per open ``/events`` stream), each with its own bounded buffer so a slow
+client can never hold up the publisher.
+
+The default ``LocalBroker`` only reaches subscribers of the same process. To
+share events between several workers set ``MOOLAH_EVENT_BROKER`` to
+``"package.module:Factory"``, a callable taking the hub and returning a
+:class:`Broker` (for example one backed by Redis pub/sub or PostgreSQL
+``LISTEN``/``NOTIFY``) that hands every received event to
+``hub.dispatch_threadsafe``.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, channels, maxsize: int):
+        self.channels = tuple(channels)
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def push(self, event: dict):
+        if self._queue.full():
+            # Drop the oldest event rather than block the publisher
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """Next event, or ``None`` if nothing arrived within ``timeout``."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self.published = 0
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._dropped_closed = 0
+
+    def subscribe(self, channels) -> Subscription:
+        """Register a subscriber; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(channels, self.buffer_size)
+        for channel in subscription.channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._dropped_closed += subscription.dropped
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def dispatch(self, channel: str, event: dict):
+        self.published += 1
+        for subscription in list(self._subscribers.get(channel, ())):
+            subscription.push(event)
+
+    def dispatch_threadsafe(self, channel: str, event: dict):
+        """Deliver from any thread, e.g. a threadpool worker running ``crud``."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or channel not in self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(channel, event)
+        else:
+            loop.call_soon_threadsafe(self.dispatch, channel, event)
+
+    def stats(self) -> dict:
+        subscriptions = {s for subs in self._subscribers.values() for s in subs}
+        return {
+            "subscribers": len(subscriptions),
+            "channels": len(self._subscribers),
+            "published": self.published,
+            "dropped": self._dropped_closed
+            + sum(s.dropped for s in subscriptions),
+        }
+
+
+class Broker(ABC):
+    """Carries events between processes. Subclasses must implement publish."""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    @abstractmethod
+    def publish(self, channel: str, event: dict):
+        """Deliver ``event`` to the subscribers of ``channel`` in every worker."""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """In-process stand-in: events only reach this worker's subscribers."""
+
+    def publish(self, channel: str, event: dict):
+        self.hub.dispatch_threadsafe(channel, event)
+
+
+def _load_broker(hub: EventHub) -> Broker:
+    path = os.getenv("MOOLAH_EVENT_BROKER")
+    if not path:
+        return LocalBroker(hub)
+    module_name, _, attr = path.partition(":")
+    factory = getattr(importlib.import_module(module_name), attr)
+    return factory(hub)
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+hub = EventHub(buffer_size=int(os.getenv("MOOLAH_EVENT_BUFFER_SIZE", "100")))
+broker = _load_broker(hub)
+
+
+def publish(channel: str, event_type: str, data) -> None:
+    """Publish a committed change; never lets a broker error fail the write."""
+    try:
+        broker.publish(channel, {"type": event_type, "data": data})
+    except Exception:
+        logger.exception("Failed to publish %s event", event_type)
@@ -0,0 +1,126 @@
+"""Encode streamed transaction batches as CSV, NDJSON or Parquet.
+
+Every encoder consumes the batches produced by
+``crud.iter_transaction_export`` and yields ``bytes`` as soon as each batch
+is encoded, so an export never holds more than one batch in memory. CSV and
+NDJSON may additionally be gzip-compressed on the fly with
+:func:`gzip_chunks`; Parquet compresses its column chunks itself.
+
+Parquet support needs the optional ``pyarrow`` package.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+COLUMNS = ("id", "timestamp", "amount", "category_id", "category")
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        for tx_id, timestamp, amount, category_id, category in batch:
+            writer.writerow(
+                (tx_id, timestamp.isoformat(), amount, category_id, category)
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps(
+                {
+                    "id": tx_id,
+                    "timestamp": timestamp.isoformat(),
+                    "amount": float(amount) if amount is not None else None,
+                    "category_id": category_id,
+                    "category": category,
+                }
+            )
+            + "\n"
+            for tx_id, timestamp, amount, category_id, category in batch
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what Parquet writes between two drains."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_chunks(batches):
+    """Write one Parquet row group per batch, yielding the bytes written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("us")),
+            ("amount", pa.decimal128(10, 2)),
+            ("category_id", pa.int64()),
+            ("category", pa.string()),
+        ]
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(column) for column in zip(*batch)], schema=schema
+                )
+            )
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+FORMATS = {
+    "csv": (csv_chunks, "text/csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "parquet": (parquet_chunks, "application/vnd.apache.parquet"),
+}
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Gzip a stream of ``bytes`` chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,143 @@
+"""Password hashing off the request threads.
+
+bcrypt is deliberately slow (100-300 ms per hash at the default cost), so
+login and registration storms would otherwise hold every threadpool worker
+and starve unrelated endpoints. Hashes are computed in a small dedicated
+process pool instead. At most ``workers + queue_size`` hashes may be in
+flight; further requests fail fast with :class:`HashingBusyError` and waits
+longer than ``timeout`` raise :class:`HashingTimeoutError`.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("MOOLAH_BCRYPT_ROUNDS", "12"))
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def hash_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_and_update_sync(
+    password: str, hashed_password: str, rounds: int = BCRYPT_ROUNDS
+) -> tuple[bool, str | None]:
+    """Check ``password`` and return a new hash if the stored one is outdated.
+
+    A hash needs updating when it was made with a different bcrypt cost than
+    ``rounds``, so raising ``MOOLAH_BCRYPT_ROUNDS`` upgrades users as they log
+    in.
+    """
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class HashingTimeoutError(Exception):
+    """Raised when a hash does not complete within the pool timeout."""
+
+
+class HashingPool:
+    """Bounded front end to a process pool running the bcrypt functions.
+
+    With ``workers=0`` hashes run in the event loop's default thread pool,
+    which keeps the queue bound and timeout without extra processes.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 100,
+        timeout: float = 10.0,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.rounds = rounds
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"completed": 0, "rejected": 0, "timeouts": 0}
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs server threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= max(self.workers, 1) + self.queue_size:
+                self._stats["rejected"] += 1
+                raise HashingBusyError()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), fn, *args)
+            try:
+                result = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise HashingTimeoutError()
+            with self._lock:
+                self._stats["completed"] += 1
+            return result
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_sync, password, self.rounds)
+
+    async def verify(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """Return whether ``password`` matches and, if so, an upgraded hash."""
+        return await self._run(
+            verify_and_update_sync, password, hashed_password, self.rounds
+        )
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": self._pending,
+                "rounds": self.rounds,
+                **self._stats,
+            }
+
+
+hashing_pool = HashingPool(
+    workers=int(
+        os.getenv("MOOLAH_HASH_WORKERS", str(min(2, os.cpu_count() or 1)))
+    ),
+    queue_size=int(os.getenv("MOOLAH_HASH_QUEUE_SIZE", "100")),
+    timeout=float(os.getenv("MOOLAH_HASH_TIMEOUT", "10")),
+)
@@ -0,0 +1,331 @@
+"""Per-request SQL accounting, ``Server-Timing`` headers and profiling.
+
+:class:`InstrumentationMiddleware` opens a :class:`RequestStats` for every
+HTTP request in a context variable. SQLAlchemy hooks installed by
+:func:`instrument_engine` add each statement's duration and row count to
+whatever request is current, including statements run from the threadpool
+or through ``AsyncSession.run_sync``, since both inherit the context.
+
+Responses carry ``Server-Timing: db;dur=..., app;dur=...``. Requests whose
+first body chunk took longer than ``SLOW_REQUEST_MS`` are logged with the
+statements they ran, which makes lazy loads visible. Admins may send
+``X-Profile: 1`` to get a sampled profile of the request instead of its body.
+
+The same hooks feed the request and SQL latency metrics in ``monitoring``.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from . import crud
+from .cache import principal_cache
+from .database import run_in_session
+from .dependencies import _decode_token
+from .monitoring import (
+    DB_QUERY_SECONDS,
+    HTTP_IN_PROGRESS,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS,
+)
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("MOOLAH_SLOW_REQUEST_MS", "500"))
+# Statements kept per request for the slow request log
+STATEMENT_LIMIT = int(os.getenv("MOOLAH_SQL_LOG_LIMIT", "50"))
+PROFILE_HEADER = "x-profile"
+PROFILE_INTERVAL = float(os.getenv("MOOLAH_PROFILE_INTERVAL_MS", "1")) / 1000
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    statements: list = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, statement: str, duration: float, rows: int):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            self.rows += rows
+            if len(self.statements) < STATEMENT_LIMIT:
+                self.statements.append((duration, " ".join(statement.split())))
+
+    def add_rows(self, rows: int):
+        with self._lock:
+            self.rows += rows
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_SECONDS.observe(duration)
+    stats = _current.get()
+    if stats is None:
+        return
+    # DBAPI rowcount is only meaningful for DML; loaded rows come from _on_load
+    rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+    stats.record(statement, duration, rows)
+
+
+def _handle_error(context):
+    # after_cursor_execute does not run for a failed statement; drop its start
+    # time so pooled connections do not accumulate them
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def _on_load(instance, context):
+    stats = _current.get()
+    if stats is not None:
+        stats.add_rows(1)
+
+
+def instrument_engine(engine):
+    """Attach the statement hooks to a sync ``Engine``."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def instrument_models(base):
+    """Count ORM objects loaded per request for every model of ``base``."""
+    if not event.contains(base, "load", _on_load):
+        event.listen(base, "load", _on_load, propagate=True)
+
+
+class SamplingProfiler:
+    """Sample the stacks of every thread at a fixed interval.
+
+    Sampling all threads captures work that the request hands to the
+    threadpool, at the price of also seeing concurrent requests. Idle threads
+    (waiting on a lock, queue or selector) are skipped.
+    """
+
+    _IDLE_FILES = {"threading.py", "queue.py", "selectors.py"}
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if (
+                    thread_id == me
+                    or os.path.basename(frame.f_code.co_filename) in self._IDLE_FILES
+                ):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                        f":{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, limit: int = 40) -> str:
+        total, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            for name in set(stack):
+                total[name] += count
+            own[stack[-1]] += count
+        lines = [
+            f"{self._elapsed * 1000:.1f} ms, {self.samples} samples "
+            f"every {self.interval * 1000:g} ms",
+            "",
+            f"{'total':>7} {'self':>7}  function",
+        ]
+        for name, count in total.most_common(limit):
+            lines.append(f"{count:>7} {own[name]:>7}  {name}")
+        lines += ["", "# folded stacks (flamegraph.pl / speedscope)"]
+        for stack, count in self.stacks.most_common():
+            lines.append(f"{';'.join(stack)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+async def _is_admin(headers: dict) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        email = _decode_token(token)["sub"]
+    except HTTPException:
+        return False
+    principal = principal_cache.get(email)
+    if principal is None:
+        principal = await run_in_session(crud.get_user_by_email, email)
+    return bool(principal is not None and principal.is_admin)
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware, so streamed responses are not buffered.
+
+    A request is measured up to its first body chunk. For ordinary responses
+    that is the whole body; streams (``/events``, NDJSON listings, exports)
+    stay open for as long as the client reads them, which says nothing about
+    how fast they were served, so they are neither logged as slow nor
+    counted as in progress afterwards.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        if headers.get(PROFILE_HEADER) == "1" and await _is_admin(headers):
+            return await self._profile(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 0
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            # The router stores the matched route in the scope; label by its
+            # template so ids in paths do not create new series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route).observe(elapsed)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status or 500)).inc()
+            self._log_if_slow(scope, status, stats, elapsed)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.body":
+                finish()
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                timing = (
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} '
+                    f'queries, {stats.rows} rows", app;dur={elapsed * 1000:.2f}'
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                    ],
+                }
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Failed before sending a body
+            finish()
+            _current.reset(token)
+
+    def _log_if_slow(self, scope, status, stats: RequestStats, elapsed: float):
+        if elapsed * 1000 < SLOW_REQUEST_MS:
+            return
+        statements = "".join(
+            f"\n  {duration * 1000:8.2f} ms  {statement[:300]}"
+            for duration, statement in stats.statements
+        )
+        if stats.queries > len(stats.statements):
+            statements += f"\n  ... {stats.queries - len(stats.statements)} more"
+        logger.warning(
+            "Slow request %s %s -> %s in %.1f ms: %d queries, %.1f ms in DB, "
+            "%d rows%s",
+            scope["method"],
+            scope["path"],
+            status,
+            elapsed * 1000,
+            stats.queries,
+            stats.db_time * 1000,
+            stats.rows,
+            statements,
+        )
+
+    async def _profile(self, scope, receive, send):
+        """Run the request under the sampler and answer with the profile."""
+        status = 0
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+            _current.reset(token)
+        body = (
+            f"{scope['method']} {scope['path']} -> {status}: {stats.queries} "
+            f"queries, {stats.db_time * 1000:.1f} ms in DB, {stats.rows} rows\n"
+            + profiler.report()
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profiled-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
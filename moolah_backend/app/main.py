@@ -1,6 +1,14 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from .database import Base, engine
+from . import events as event_bus
+from . import instrumentation, monitoring
+from .database import Base, async_engine, engine
+from .hashing import hashing_pool
+from .migrations import run_migrations
+from .reports import report_scheduler
+from .webhook_queue import QUEUE_ENABLED, webhook_queue
 from .routers import (
     auth,
     users,
@@ -11,11 +19,38 @@ from .routers import (
     rewards,
     analytics,
     whatsapp,
+    metrics,
+    events,
+    admin,
+    export,
 )
 
-Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+instrumentation.instrument_engine(engine)
+if async_engine is not None:
+    instrumentation.instrument_engine(async_engine.sync_engine)
+instrumentation.instrument_models(Base)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await event_bus.broker.start()
+    if QUEUE_ENABLED:
+        await webhook_queue.start()
+    await report_scheduler.start()
+    yield
+    await report_scheduler.stop()
+    if QUEUE_ENABLED:
+        # Drain accepted payloads before the worker exits
+        await webhook_queue.stop()
+    await event_bus.broker.stop()
+    hashing_pool.shutdown()
+    monitoring.mark_process_dead()
+
 
-app = FastAPI(title="Moolah API")
+app = FastAPI(title="Moolah API", lifespan=lifespan)
+app.add_middleware(instrumentation.InstrumentationMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -26,3 +61,7 @@ app.include_router(budgets.router)
 app.include_router(rewards.router)
 app.include_router(analytics.router)
 app.include_router(whatsapp.router)
+app.include_router(metrics.router)
+app.include_router(events.router)
+app.include_router(admin.router)
+app.include_router(export.router)
@@ -0,0 +1,181 @@
+"""Minimal versioned schema migrations.
+
+Each migration is a function taking a connection and is applied once, in
+order, inside its own transaction. The applied version is stored in the
+``schema_version`` table. Migrations must be idempotent because the baseline
+step creates every table from the current models, including anything later
+migrations would add to an existing database.
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select, text
+
+from . import models, rollups
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key of the PostgreSQL advisory lock serializing migration runs
+LOCK_KEY = 0x6D6F6F6C
+# How long a worker waits for another one's migration on SQLite
+LOCK_TIMEOUT_MS = int(os.getenv("MOOLAH_MIGRATION_LOCK_TIMEOUT_MS", "600000"))
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+def _baseline(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+def _create_indexes(conn, model, *names):
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _transaction_hot_path_indexes(conn):
+    _create_indexes(
+        conn,
+        models.Transaction,
+        "ix_transactions_owner_timestamp",
+        "ix_transactions_owner_category_timestamp",
+    )
+
+
+def _transaction_month_bucket(conn):
+    columns = {col["name"] for col in inspect(conn).get_columns("transactions")}
+    if "month" not in columns:
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN month VARCHAR(7)"))
+    if conn.dialect.name == "sqlite":
+        bucket = "strftime('%Y-%m', timestamp)"
+    else:
+        bucket = "to_char(timestamp, 'YYYY-MM')"
+    conn.execute(
+        text(f"UPDATE transactions SET month = {bucket} WHERE month IS NULL")
+    )
+    _create_indexes(conn, models.Transaction, "ix_transactions_owner_month")
+
+
+def _whatsapp_sender_index(conn):
+    _create_indexes(
+        conn, models.WhatsAppMessage, "ix_whatsapp_messages_from_id"
+    )
+
+
+def _user_phone_number(conn):
+    columns = {col["name"] for col in inspect(conn).get_columns("users")}
+    if "phone_number" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN phone_number VARCHAR"))
+    _create_indexes(conn, models.User, "ix_users_phone_number")
+    # Numbers are only linked once confirmed through a pending verification
+    models.PhoneVerification.__table__.create(bind=conn, checkfirst=True)
+
+
+def _analytics_rollups(conn):
+    for model in (models.DailyRollup, models.MonthlyRollup):
+        model.__table__.create(bind=conn, checkfirst=True)
+    rollups.rebuild(conn)
+
+
+def _report_cache(conn):
+    models.Report.__table__.create(bind=conn, checkfirst=True)
+
+
+def _collection_versions(conn):
+    models.CollectionVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    _baseline,
+    _transaction_hot_path_indexes,
+    _transaction_month_bucket,
+    _whatsapp_sender_index,
+    _user_phone_number,
+    _analytics_rollups,
+    _report_cache,
+    _collection_versions,
+]
+
+
+def _current_version(conn) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        _version_metadata.create_all(bind=conn)
+    version = conn.execute(select(schema_version.c.version)).scalar()
+    if version is None:
+        conn.execute(schema_version.insert().values(version=0))
+        return 0
+    return version
+
+
+@contextmanager
+def _sqlite_write_lock(conn):
+    """A transaction holding SQLite's write lock from its first statement.
+
+    The driver's own ``BEGIN`` is deferred, so two processes could both read
+    an old version before either writes; ``BEGIN IMMEDIATE`` makes the
+    second one wait until the first commits.
+    """
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+
+def _apply_pending(conn, transaction) -> int:
+    version = 0
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        with transaction():
+            # Read under the lock: another process may have applied it while
+            # this one was waiting
+            version = _current_version(conn)
+            if number <= version:
+                continue
+            logger.info("Applying migration %s: %s", number, migration.__name__)
+            migration(conn)
+            conn.execute(schema_version.update().values(version=number))
+            version = number
+    return version
+
+
+def run_migrations(engine) -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    ``main`` calls this in every worker at import, so concurrent runs are
+    serialized: PostgreSQL through a session advisory lock held for the whole
+    run, SQLite by taking the write lock at the start of each migration's
+    transaction. Workers that had to wait find the migrations applied.
+    """
+    with engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            # Hand transaction control to ``BEGIN IMMEDIATE``, and wait for
+            # a long migration in another worker instead of failing
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {LOCK_TIMEOUT_MS}")
+            try:
+                return _apply_pending(conn, lambda: _sqlite_write_lock(conn))
+            finally:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout = {timeout}")
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+            conn.commit()
+            try:
+                return _apply_pending(conn, conn.begin)
+            finally:
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY}
+                )
+                conn.commit()
+        return _apply_pending(conn, conn.begin)
@@ -5,9 +5,13 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     DateTime,
+    Float,
     Numeric,
+    Text,
     UniqueConstraint,
+    Index,
 )
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -23,6 +27,10 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     points = Column(Integer, default=0)
+    # WhatsApp sender id (digits only) whose messages are parsed into
+    # transactions for this user; only set once the user confirmed a code
+    # sent to it (see ``PhoneVerification``)
+    phone_number = Column(String, unique=True, index=True, nullable=True)
 
     transactions = relationship("Transaction", back_populates="owner")
     goals = relationship("Goal", back_populates="owner")
@@ -32,10 +40,22 @@ class User(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_owner_timestamp", "owner_id", "timestamp"),
+        Index(
+            "ix_transactions_owner_category_timestamp",
+            "owner_id",
+            "category_id",
+            "timestamp",
+        ),
+        Index("ix_transactions_owner_month", "owner_id", "month"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Numeric(10, 2))
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # "YYYY-MM" bucket of ``timestamp`` used for monthly grouping
+    month = Column(String(7))
     owner_id = Column(Integer, ForeignKey("users.id"))
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
 
@@ -43,6 +63,22 @@ class Transaction(Base):
     category = relationship("Category", back_populates="transactions")
 
 
+def month_bucket(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m")
+
+
+def day_bucket(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+
+@event.listens_for(Transaction, "before_insert")
+@event.listens_for(Transaction, "before_update")
+def _set_transaction_month(mapper, connection, target):
+    if target.timestamp is None:
+        target.timestamp = datetime.utcnow()
+    target.month = month_bucket(target.timestamp)
+
+
 class Goal(Base):
     __tablename__ = "goals"
 
@@ -90,9 +126,82 @@ class Reward(Base):
 
 class WhatsAppMessage(Base):
     __tablename__ = "whatsapp_messages"
+    __table_args__ = (
+        # Matches the per-sender ``after_id`` sync of ``GET /whatsapp/``
+        Index("ix_whatsapp_messages_from_id", "from_number", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     wa_id = Column(String, unique=True, index=True)
     from_number = Column(String)
     body = Column(String)
     timestamp = Column(DateTime)
+
+
+class _RollupColumns:
+    """Income, expense and row count of one owner and category in a period.
+
+    ``category_id`` is ``0`` for uncategorized transactions and the totals
+    never include zero-count rows left behind by deletes once compacted.
+    """
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, nullable=False, default=0)
+    income = Column(Numeric(14, 2), nullable=False, default=0)
+    expense = Column(Numeric(14, 2), nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DailyRollup(_RollupColumns, Base):
+    __tablename__ = "daily_rollup"
+    __table_args__ = (UniqueConstraint("owner_id", "day", "category_id"),)
+
+    day = Column(String(10), nullable=False)
+
+
+class MonthlyRollup(_RollupColumns, Base):
+    __tablename__ = "monthly_rollup"
+    __table_args__ = (UniqueConstraint("owner_id", "month", "category_id"),)
+
+    month = Column(String(7), nullable=False)
+
+
+class Report(Base):
+    """Precomputed admin report, refreshed on a schedule (see ``reports``)."""
+
+    __tablename__ = "reports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    # JSON document with the report rows
+    data = Column(Text, nullable=False)
+    generated_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False, default=0)
+
+
+class CollectionVersion(Base):
+    """Write counter of one owner's collection, used to build list ETags.
+
+    ``owner_id`` is ``0`` for collections shared by every user (categories).
+    A missing row means version ``0``.
+    """
+
+    __tablename__ = "collection_versions"
+
+    owner_id = Column(Integer, primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class PhoneVerification(Base):
+    """A phone number waiting for its owner to confirm the code sent to it."""
+
+    __tablename__ = "phone_verifications"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    phone_number = Column(String, nullable=False)
+    # HMAC of the code, never the code itself
+    code_hash = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,119 @@
+"""Prometheus metrics for HTTP traffic, the database, caches and the domain.
+
+Metric objects are module globals updated in place. Their hot-path cost is
+one lock and an increment. With several uvicorn workers, set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared by the workers
+before they start. ``prometheus_client`` then keeps every value in
+memory-mapped files there and :func:`render` aggregates them, so any worker
+can answer the scrape.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+METRICS_TOKEN = os.getenv("MOOLAH_METRICS_TOKEN")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "moolah_http_request_duration_seconds",
+    "HTTP request latency by route template, up to the first body chunk.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS = Counter(
+    "moolah_http_requests_total",
+    "HTTP responses by route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_IN_PROGRESS = Gauge(
+    "moolah_http_requests_in_progress",
+    "HTTP requests being served.",
+    multiprocess_mode="livesum",
+)
+DB_QUERY_SECONDS = Histogram(
+    "moolah_db_query_duration_seconds",
+    "SQL statement execution time.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "moolah_db_pool_checked_out",
+    "Database connections currently checked out of the pool.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "moolah_db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+CACHE_REQUESTS = Counter(
+    "moolah_cache_requests_total",
+    "In-process cache lookups by cache and result.",
+    ["cache", "result"],
+)
+TRANSACTIONS_CREATED = Counter(
+    "moolah_transactions_created_total",
+    "Transactions stored, by how they were created.",
+    ["source"],
+)
+BUDGET_REJECTIONS = Counter(
+    "moolah_budget_rejections_total",
+    "Expenses refused because they would exceed the month's budget.",
+)
+REWARDS_GRANTED = Counter(
+    "moolah_rewards_granted_total",
+    "Rewards granted, by level.",
+    ["level"],
+)
+WEBHOOK_MESSAGES = Counter(
+    "moolah_webhook_messages_total",
+    "WhatsApp webhook messages received, by outcome.",
+    ["result"],
+)
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "moolah_webhook_queue_depth",
+    "Webhook payloads waiting in the queue.",
+    multiprocess_mode="livesum",
+)
+WEBHOOK_QUEUE_PAYLOADS = Counter(
+    "moolah_webhook_queue_payloads_total",
+    "Webhook payloads offered to the queue, by outcome.",
+    ["result"],
+)
+WEBHOOK_QUEUE_BATCHES = Counter(
+    "moolah_webhook_queue_batches_total",
+    "Batches written by the webhook queue workers, by outcome.",
+    ["result"],
+)
+WEBHOOK_QUEUE_MESSAGES = Counter(
+    "moolah_webhook_queue_messages_total",
+    "Webhook messages stored by the queue workers.",
+)
+WEBHOOK_QUEUE_LAG_SECONDS = Histogram(
+    "moolah_webhook_queue_lag_seconds",
+    "Time from enqueueing a batch's oldest payload to storing the batch.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+def render() -> tuple[bytes, str]:
+    """The current metrics in the Prometheus text format and its media type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared multiprocess files."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,226 @@
+"""Platform-wide admin reports, precomputed on a schedule.
+
+Each report aggregates every user's data, which as a single query would hold
+a read transaction open over whole tables. Reports are instead built over
+consecutive owner-id ranges of ``REPORT_CHUNK_SIZE`` users, each in its own
+short transaction, and the partial results are merged in Python. Sources are
+the rollup tables rather than raw transactions wherever possible.
+
+The merged result is stored as JSON in ``models.Report``; admin endpoints only
+read that table. :class:`ReportScheduler` refreshes reports older than
+``REPORT_INTERVAL`` seconds in the background.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import run_in_session
+
+logger = logging.getLogger(__name__)
+
+REPORT_INTERVAL = float(os.getenv("MOOLAH_REPORT_INTERVAL", "3600"))
+REPORT_CHUNK_SIZE = int(os.getenv("MOOLAH_REPORT_CHUNK_SIZE", "1000"))
+
+
+def owner_chunks(db: Session, chunk_size: int = REPORT_CHUNK_SIZE):
+    """Yield inclusive ``(first, last)`` owner-id ranges covering all users.
+
+    The read transaction is ended after each chunk so a report over many
+    users never blocks writers for longer than one chunk takes.
+    """
+    max_id = db.scalar(select(func.max(models.User.id))) or 0
+    for first in range(1, max_id + 1, chunk_size):
+        yield first, first + chunk_size - 1
+        db.rollback()
+
+
+def spend_by_category(db: Session, chunk_size: int = REPORT_CHUNK_SIZE) -> list:
+    """Income, expense and transaction count of every category, all users."""
+    rollup = models.MonthlyRollup
+    totals = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for first, last in owner_chunks(db, chunk_size):
+        rows = db.execute(
+            select(
+                rollup.category_id,
+                func.sum(rollup.income),
+                func.sum(rollup.expense),
+                func.sum(rollup.count),
+            )
+            .where(rollup.owner_id.between(first, last))
+            .group_by(rollup.category_id)
+        )
+        for category_id, income, expense, count in rows:
+            total = totals[category_id]
+            total[0] += Decimal(income)
+            total[1] += Decimal(expense)
+            total[2] += count
+    names = dict(db.execute(select(models.Category.id, models.Category.name)).all())
+    report = [
+        {
+            "category": names.get(category_id, "Uncategorized"),
+            "income": income,
+            "expense": expense,
+            "transactions": count,
+        }
+        for category_id, (income, expense, count) in totals.items()
+        if count
+    ]
+    report.sort(key=lambda row: (row["expense"], row["category"]))
+    return report
+
+
+def active_users_by_month(
+    db: Session, chunk_size: int = REPORT_CHUNK_SIZE
+) -> list:
+    """Number of users with at least one transaction in each month.
+
+    Chunks partition the owners, so per-chunk distinct counts add up.
+    """
+    rollup = models.MonthlyRollup
+    active = defaultdict(int)
+    for first, last in owner_chunks(db, chunk_size):
+        rows = db.execute(
+            select(rollup.month, func.count(func.distinct(rollup.owner_id)))
+            .where(rollup.owner_id.between(first, last), rollup.count > 0)
+            .group_by(rollup.month)
+        )
+        for month, users in rows:
+            active[month] += users
+    return [
+        {"month": month, "active_users": users}
+        for month, users in sorted(active.items())
+    ]
+
+
+def reward_levels(db: Session, chunk_size: int = REPORT_CHUNK_SIZE) -> list:
+    """Number of users whose highest reward is each level, plus those with none."""
+    levels = [level for level, _ in crud.LEVEL_THRESHOLDS]
+    reward = models.Reward
+    rank = func.max(
+        case(
+            *((reward.level == level, index) for index, level in enumerate(levels, 1)),
+            else_=0,
+        )
+    )
+    counts = [0] * (len(levels) + 1)
+    for first, last in owner_chunks(db, chunk_size):
+        users = db.scalar(
+            select(func.count(models.User.id)).where(
+                models.User.id.between(first, last)
+            )
+        )
+        highest = (
+            select(rank.label("rank"))
+            .where(reward.owner_id.between(first, last))
+            .group_by(reward.owner_id)
+            .subquery()
+        )
+        rewarded = 0
+        for index, count in db.execute(
+            select(highest.c.rank, func.count()).group_by(highest.c.rank)
+        ):
+            counts[index] += count
+            rewarded += count
+        counts[0] += users - rewarded
+    return [{"level": None, "users": counts[0]}] + [
+        {"level": level, "users": count}
+        for level, count in zip(levels, counts[1:])
+    ]
+
+
+REPORTS = {
+    "spend_by_category": spend_by_category,
+    "active_users_by_month": active_users_by_month,
+    "reward_levels": reward_levels,
+}
+
+
+def _to_json(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def refresh(
+    db: Session,
+    names=None,
+    *,
+    max_age: float | None = None,
+    chunk_size: int = REPORT_CHUNK_SIZE,
+) -> list[str]:
+    """Rebuild reports and store them, returning the names refreshed.
+
+    With ``max_age`` reports generated less than that many seconds ago are
+    kept, so several workers sharing a schedule do not redo each other's
+    work.
+    """
+    refreshed = []
+    for name in names or REPORTS:
+        stored = db.scalar(select(models.Report).where(models.Report.name == name))
+        if (
+            max_age is not None
+            and stored is not None
+            and (datetime.utcnow() - stored.generated_at).total_seconds() < max_age
+        ):
+            continue
+        started = time.perf_counter()
+        data = json.dumps(REPORTS[name](db, chunk_size), default=_to_json)
+        duration_ms = (time.perf_counter() - started) * 1000
+        stored = db.scalar(select(models.Report).where(models.Report.name == name))
+        if stored is None:
+            stored = models.Report(name=name)
+            db.add(stored)
+        stored.data = data
+        stored.generated_at = datetime.utcnow()
+        stored.duration_ms = duration_ms
+        db.commit()
+        refreshed.append(name)
+    return refreshed
+
+
+class ReportScheduler:
+    """Background task refreshing stale reports every ``interval`` seconds."""
+
+    def __init__(self, interval: float = REPORT_INTERVAL):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                refreshed = await run_in_session(refresh, max_age=self.interval)
+                if refreshed:
+                    logger.info("Refreshed reports: %s", ", ".join(refreshed))
+            except Exception:
+                logger.exception("Report refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+report_scheduler = ReportScheduler()
@@ -0,0 +1,176 @@
+"""Day and month rollups of transactions per owner and category.
+
+``models.DailyRollup`` and ``models.MonthlyRollup`` hold the income, expense
+and row count of each owner and category per period so analytics read a
+number of rows bounded by the periods involved rather than by the number of
+transactions. The month rollup's ``expense`` also serves the budget checks.
+
+ORM writes keep them current through a ``before_flush`` hook, whatever code
+path changed the transaction; bulk Core inserts call :func:`record`
+explicitly. :func:`rebuild` recomputes both tables from raw transactions
+and is the nightly compaction step (see ``rebuild_aggregates.py``).
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session, attributes
+
+from . import models, upserts
+
+ROLLUPS = (
+    (models.DailyRollup, models.DailyRollup.day, models.day_bucket),
+    (models.MonthlyRollup, models.MonthlyRollup.month, models.month_bucket),
+)
+
+
+def record(db: Session, items, *, revert: bool = False):
+    """Add ``(owner_id, timestamp, category_id, amount)`` items to the rollups.
+
+    With ``revert`` the items are removed again. Each table gets one upsert
+    that increments existing rows in SQL, so concurrent writers neither
+    overwrite each other nor collide when creating a period's first row.
+    """
+    sign = -1 if revert else 1
+    for model, period_col, bucket in ROLLUPS:
+        deltas: dict[tuple[int, str, int], list] = {}
+        for owner_id, timestamp, category_id, amount in items:
+            if owner_id is None or amount is None:
+                continue
+            amount = Decimal(amount)
+            key = (owner_id, bucket(timestamp), category_id or 0)
+            delta = deltas.setdefault(key, [Decimal("0"), Decimal("0"), 0])
+            delta[0 if amount >= 0 else 1] += sign * amount
+            delta[2] += sign
+        rows = [
+            {
+                "owner_id": owner_id,
+                period_col.key: period,
+                "category_id": category_id,
+                "income": income,
+                "expense": expense,
+                "count": count,
+            }
+            for (owner_id, period, category_id), (income, expense, count) in (
+                deltas.items()
+            )
+        ]
+        upserts.increment(
+            db,
+            model.__table__,
+            rows,
+            keys=("owner_id", period_col.key, "category_id"),
+            columns=("income", "expense", "count"),
+        )
+
+
+_FIELDS = ("owner_id", "timestamp", "category_id", "amount")
+_MISSING = object()
+
+
+def _committed_values(session, obj):
+    """The values last flushed for ``obj``, reloading any not kept in history."""
+    values = []
+    for name in _FIELDS:
+        history = attributes.get_history(obj, name, attributes.PASSIVE_NO_INITIALIZE)
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        elif not history.added:
+            values.append(getattr(obj, name))
+        else:
+            # Assigned without the old value ever being loaded
+            values.append(_MISSING)
+    if _MISSING in values:
+        tx = models.Transaction
+        with session.no_autoflush:
+            stored = session.execute(
+                select(*(getattr(tx, name) for name in _FIELDS)).where(
+                    tx.id == obj.id
+                )
+            ).one()
+        values = [
+            old if value is _MISSING else value for value, old in zip(values, stored)
+        ]
+    return tuple(values)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_transaction_changes(session, flush_context, instances):
+    added, removed = [], []
+    tx = models.Transaction
+    for obj in session.new:
+        if isinstance(obj, tx):
+            if obj.timestamp is None:
+                obj.timestamp = datetime.utcnow()
+            added.append(tuple(getattr(obj, name) for name in _FIELDS))
+    for obj in session.dirty:
+        if not isinstance(obj, tx):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in _FIELDS):
+            continue
+        removed.append(_committed_values(session, obj))
+        added.append(tuple(getattr(obj, name) for name in _FIELDS))
+    for obj in session.deleted:
+        if isinstance(obj, tx):
+            removed.append(_committed_values(session, obj))
+    if removed:
+        record(session, removed, revert=True)
+    if added:
+        record(session, added)
+
+
+def _rollup_select(period_expr):
+    amount = models.Transaction.amount
+    category = func.coalesce(models.Transaction.category_id, 0)
+    return select(
+        models.Transaction.owner_id,
+        period_expr,
+        category,
+        func.coalesce(func.sum(case((amount >= 0, amount), else_=0)), 0),
+        func.coalesce(func.sum(case((amount < 0, amount), else_=0)), 0),
+        func.count(),
+    ).group_by(models.Transaction.owner_id, period_expr, category)
+
+
+def sources(conn):
+    """Yield ``(model, period column, select)`` recomputing each rollup."""
+    if isinstance(conn, Session):
+        dialect = conn.get_bind().dialect.name
+    else:
+        dialect = conn.dialect.name
+    timestamp = models.Transaction.timestamp
+    if dialect == "sqlite":
+        day = func.date(timestamp)
+    else:
+        day = func.to_char(timestamp, literal("YYYY-MM-DD"))
+    for model, period_col, _ in ROLLUPS:
+        period_expr = day if model is models.DailyRollup else models.Transaction.month
+        yield model, period_col, _rollup_select(period_expr)
+
+
+def rebuild(conn):
+    """Replace both rollup tables with totals recomputed from transactions.
+
+    Works on a ``Session`` or a ``Connection``; the caller commits. Dropping
+    and re-inserting also compacts away rows whose transactions were all
+    deleted.
+    """
+    for model, period_col, stmt in sources(conn):
+        conn.execute(delete(model))
+        conn.execute(
+            insert(model).from_select(
+                [
+                    model.owner_id,
+                    period_col,
+                    model.category_id,
+                    model.income,
+                    model.expense,
+                    model.count,
+                ],
+                stmt,
+            )
+        )
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import crud, reports, schemas
+from ..database import get_db, run_db
+from ..dependencies import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/admin/reports", response_model=list[schemas.ReportInfo])
+async def list_reports(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Reports available and when each was last generated."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return await run_db(db, crud.get_reports)
+
+
+@router.get("/admin/reports/{name}", response_model=schemas.Report)
+async def read_report(
+    name: str,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """The stored result of a report; it is refreshed on a schedule, not here."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    if name not in reports.REPORTS:
+        raise HTTPException(status_code=404, detail="Report not found")
+    report = await run_db(db, crud.get_report, name)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not generated yet")
+    return report
+
+
+@router.post("/admin/reports/refresh", response_model=list[schemas.ReportInfo])
+async def refresh_reports(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Regenerate every report now instead of waiting for the schedule."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    await run_db(db, reports.refresh)
+    return await run_db(db, crud.get_reports)
@@ -1,29 +1,120 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas
-from ..database import get_db
-from ..dependencies import get_current_user
+from ..database import get_db, run_db
+from ..dependencies import get_current_user_id
 
 router = APIRouter()
 
 
 @router.get("/summary/monthly", response_model=list[schemas.MonthlySummary])
-def monthly_summary(
+async def monthly_summary(
+    start: datetime | None = None,
+    end: datetime | None = None,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    results = crud.get_summary(db, user_id=current_user.id, group_by_month=True)
-    return [schemas.MonthlySummary(month=r.month, total=r.total) for r in results]
+    results = await run_db(
+        db,
+        crud.get_summary,
+        user_id=current_user_id,
+        group_by_month=True,
+        start=start,
+        end=end,
+    )
+    return [schemas.MonthlySummary(month=r.period, total=r.total) for r in results]
 
 
 @router.get("/summary/category", response_model=list[schemas.CategorySummary])
-def category_summary(
+async def category_summary(
+    month: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    results = crud.get_summary(db, user_id=current_user.id, group_by_category=True)
+    results = await run_db(
+        db,
+        crud.get_summary,
+        user_id=current_user_id,
+        group_by_category=True,
+        month=month,
+        start=start,
+        end=end,
+    )
     return [
         schemas.CategorySummary(category=r.category or "Uncategorized", total=r.total)
         for r in results
     ]
+
+
+@router.get(
+    "/summary",
+    response_model=list[schemas.SummaryRow],
+    response_model_exclude_none=True,
+)
+async def summary(
+    granularity: Literal["day", "week", "month"] | None = None,
+    by_category: bool = False,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Totals with income and expense split, per period and/or category.
+
+    ``granularity`` together with ``by_category=true`` returns a cross-tab
+    with one row per period and category.
+    """
+    results = await run_db(
+        db,
+        crud.get_summary,
+        user_id=current_user_id,
+        group_by_category=by_category,
+        granularity=granularity,
+        start=start,
+        end=end,
+    )
+    return [
+        schemas.SummaryRow(
+            period=r.period if granularity else None,
+            category=(r.category or "Uncategorized") if by_category else None,
+            total=r.total or 0,
+            income=r.income or 0,
+            expense=r.expense or 0,
+        )
+        for r in results
+    ]
+
+
+@router.get("/analytics/trends", response_model=list[schemas.TrendPoint])
+async def spending_trends(
+    months: int = Query(12, ge=1, le=120),
+    window: int = Query(3, ge=1, le=24),
+    by_category: bool = False,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Monthly spend with moving average and month-over-month change."""
+    return await run_db(
+        db,
+        crud.get_spending_trends,
+        current_user_id,
+        months=months,
+        window=window,
+        by_category=by_category,
+    )
+
+
+@router.get("/analytics/forecast", response_model=schemas.MonthForecast)
+async def month_forecast(
+    month: str | None = None,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Projected end-of-month spend per category against the month's budget."""
+    return await run_db(db, crud.get_month_forecast, current_user_id, month=month)
@@ -1,36 +1,73 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from datetime import timedelta
 
 from .. import crud, schemas
-from ..database import get_db
+from ..cache import principal_cache
+from ..database import get_db, run_db
+from ..dependencies import _credentials_exception, _decode_token
+from ..hashing import HashingBusyError, HashingTimeoutError, hashing_pool
 
 router = APIRouter()
 
 
+async def _run_hashing(coro):
+    """Await a hashing pool call, mapping overload to 503 Retry-After."""
+    try:
+        return await coro
+    except (HashingBusyError, HashingTimeoutError):
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication is busy, retry shortly",
+            headers={"Retry-After": "2"},
+        )
+
+
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_db(db, crud.get_user_by_email, email=form_data.username)
+    valid = False
+    if user:
+        valid, new_hash = await _run_hashing(
+            hashing_pool.verify(form_data.password, user.hashed_password)
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=crud.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = crud.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Snapshot before a rehash commit expires the instance
+    profile = schemas.UserProfile.model_validate(user)
+    if new_hash:
+        # The configured bcrypt cost changed since this hash was made
+        await run_db(db, crud.update_password_hash, profile.id, new_hash)
+    # A fresh login always resolves the principal from the database again
+    principal_cache.pop(profile.email)
+    return crud.create_token_pair(profile)
+
 
+@router.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    body: schemas.TokenRefresh, db: Session = Depends(get_db)
+):
+    """Exchange a refresh token for a new token pair without a password check."""
+    payload = _decode_token(body.refresh_token, token_type="refresh")
+    user = await run_db(db, crud.get_user_by_email, email=payload["sub"])
+    if user is None or not user.is_active:
+        raise _credentials_exception()
+    return crud.create_token_pair(user)
 
-@router.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+
+@router.post("/users/", response_model=schemas.UserProfile)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_db(db, crud.get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     # Always create regular users through this endpoint
     # Any supplied is_admin flag must be ignored
     user.is_admin = False
-    return crud.create_user(db=db, user=user)
+    hashed_password = await _run_hashing(hashing_pool.hash(user.password))
+    return await run_db(
+        db, crud.create_user, user=user, hashed_password=hashed_password
+    )
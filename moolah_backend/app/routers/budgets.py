@@ -1,46 +1,55 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas
-from ..database import get_db
-from ..dependencies import get_current_user
+from ..database import get_db, run_db
+from ..etags import not_modified
+from ..dependencies import get_current_user_id
 
 router = APIRouter()
 
 
 @router.post("/budgets/", response_model=schemas.Budget)
-def create_budget(
+async def create_budget(
     budget: schemas.BudgetCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.create_budget(db, budget, user_id=current_user.id)
+    return await run_db(db, crud.create_budget, budget, user_id=current_user_id)
 
 
 @router.get("/budgets/", response_model=list[schemas.Budget])
-def read_budgets(
+async def read_budgets(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.get_budgets(db, user_id=current_user.id)
+    if cached := await not_modified(
+        request, response, db, "budgets", current_user_id
+    ):
+        return cached
+    return await run_db(db, crud.get_budgets, user_id=current_user_id)
 
 
 @router.put("/budgets/{budget_id}", response_model=schemas.Budget)
-def update_budget(
+async def update_budget(
     budget_id: int,
     budget: schemas.BudgetUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.update_budget(db, budget_id, budget, user_id=current_user.id)
+    return await run_db(
+        db, crud.update_budget, budget_id, budget, user_id=current_user_id
+    )
 
 
 @router.delete("/budgets/{budget_id}")
-def delete_budget(
+async def delete_budget(
     budget_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    crud.delete_budget(db, budget_id, user_id=current_user.id)
+    await run_db(db, crud.delete_budget, budget_id, user_id=current_user_id)
     return {"detail": "Budget deleted"}
 
@@ -1,35 +1,43 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas
-from ..database import get_db
+from ..database import get_db, run_db
 from ..dependencies import get_current_user
+from ..etags import not_modified
 
 router = APIRouter()
 
 
 @router.post("/categories/", response_model=schemas.Category)
-def create_category(
+async def create_category(
     category: schemas.CategoryCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    return crud.create_category(db, category)
+    return await run_db(db, crud.create_category, category)
 
 
 @router.get("/categories/", response_model=list[schemas.Category])
-def read_categories(
+async def read_categories(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
 ):
-    return crud.get_categories(db)
+    # Categories are shared by every user, so they have a single version
+    if cached := await not_modified(
+        request, response, db, "categories", crud.SHARED_OWNER
+    ):
+        return cached
+    return await run_db(db, crud.get_categories)
 
 
 @router.put("/categories/{category_id}", response_model=schemas.Category)
-def update_category(
+async def update_category(
     category_id: int,
     category: schemas.CategoryUpdate,
     db: Session = Depends(get_db),
@@ -37,16 +45,16 @@ def update_category(
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    return crud.update_category(db, category_id, category)
+    return await run_db(db, crud.update_category, category_id, category)
 
 
 @router.delete("/categories/{category_id}")
-def delete_category(
+async def delete_category(
     category_id: int,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    crud.delete_category(db, category_id)
+    await run_db(db, crud.delete_category, category_id)
     return {"detail": "Category deleted"}
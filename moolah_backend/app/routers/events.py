@@ -0,0 +1,47 @@
+import json
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from .. import events
+from ..dependencies import get_current_user_id
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Server-Sent Events stream of the user's changes and chat messages.
+
+    Each event carries its type (``transaction.created``, ``budget.updated``,
+    ``reward.granted``, ``whatsapp.message`` ...) and a JSON ``data`` payload.
+    Only messages sent from the user's verified phone number are streamed.
+    """
+    subscription = events.hub.subscribe([events.user_channel(current_user_id)])
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                if event is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield (
+                    f"event: {event['type']}\n"
+                    f"data: {json.dumps(event['data'])}\n\n"
+                )
+        finally:
+            events.hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
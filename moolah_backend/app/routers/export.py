@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from .. import crud, export, schemas
+from ..database import SessionLocal
+from ..dependencies import get_current_user
+
+router = APIRouter()
+
+
+def _export_batches(user_id, start_date, end_date, category_id):
+    # Like the NDJSON listing, the stream outlives the request-scoped session
+    db = SessionLocal()
+    try:
+        yield from crud.iter_transaction_export(
+            db, user_id, start_date, end_date, category_id
+        )
+    finally:
+        db.close()
+
+
+@router.get("/export/transactions")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    category_id: int | None = None,
+    user_id: int | None = None,
+    accept_encoding: str | None = Header(None),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Download the full transaction history as CSV, NDJSON or Parquet.
+
+    The file is streamed batch by batch. CSV and NDJSON are gzip-encoded when
+    the client sends ``Accept-Encoding: gzip``. Admins may export another
+    user's history with ``user_id``.
+    """
+    if user_id is not None and user_id != current_user.id:
+        if not current_user.is_admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    else:
+        user_id = current_user.id
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet export requires pyarrow",
+        )
+
+    encode, media_type = export.FORMATS[format]
+    body = encode(_export_batches(user_id, start_date, end_date, category_id))
+    headers = {
+        "Content-Disposition": f'attachment; filename="transactions.{format}"'
+    }
+    if format != "parquet" and accept_encoding and "gzip" in accept_encoding:
+        body = export.gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
@@ -1,56 +1,67 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas
-from ..dependencies import get_current_user
-from ..database import get_db
+from ..dependencies import get_current_user_id
+from ..database import get_db, run_db
+from ..etags import not_modified
 
 router = APIRouter()
 
 
 @router.post("/goals/", response_model=schemas.Goal)
-def create_goal(
+async def create_goal(
     goal: schemas.GoalCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.create_goal(db, goal, user_id=current_user.id)
+    return await run_db(db, crud.create_goal, goal, user_id=current_user_id)
 
 
 @router.get("/goals/", response_model=list[schemas.Goal])
-def read_goals(
+async def read_goals(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.get_goals(db, user_id=current_user.id)
+    if cached := await not_modified(
+        request, response, db, "goals", current_user_id
+    ):
+        return cached
+    return await run_db(db, crud.get_goals, user_id=current_user_id)
 
 
 @router.put("/goals/{goal_id}", response_model=schemas.Goal)
-def update_goal(
+async def update_goal(
     goal_id: int,
     goal: schemas.GoalUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.update_goal(db, goal_id, goal, user_id=current_user.id)
+    return await run_db(
+        db, crud.update_goal, goal_id, goal, user_id=current_user_id
+    )
 
 
 @router.patch("/goals/{goal_id}/complete", response_model=schemas.UserProgress)
-def complete_goal(
+async def complete_goal(
     goal_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    crud_goal, user = crud.set_goal_achieved(db, goal_id, user_id=current_user.id)
-    rewards = crud.get_rewards(db, user_id=current_user.id)
+    crud_goal, user = await run_db(
+        db, crud.set_goal_achieved, goal_id, user_id=current_user_id
+    )
+    rewards = await run_db(db, crud.get_rewards, user_id=current_user_id)
     return schemas.UserProgress(points=user.points, rewards=rewards)
 
 
 @router.delete("/goals/{goal_id}")
-def delete_goal(
+async def delete_goal(
     goal_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    crud.delete_goal(db, goal_id, user_id=current_user.id)
+    await run_db(db, crud.delete_goal, goal_id, user_id=current_user_id)
     return {"detail": "Goal deleted"}
@@ -0,0 +1,71 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from .. import events, monitoring, schemas
+from ..cache import category_cache, principal_cache, summary_cache
+from ..database import pool_stats
+from ..hashing import hashing_pool
+from ..webhook_queue import webhook_queue
+from ..dependencies import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: str | None = Header(None)):
+    """Prometheus scrape endpoint, aggregated across workers.
+
+    Open unless ``MOOLAH_METRICS_TOKEN`` is set, in which case scrapers must
+    send it as a bearer token.
+    """
+    if monitoring.METRICS_TOKEN and not hmac.compare_digest(
+        authorization or "", f"Bearer {monitoring.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    body, media_type = monitoring.render()
+    return Response(content=body, media_type=media_type)
+
+
+@router.get("/metrics/cache")
+async def cache_metrics(current_user: schemas.User = Depends(get_current_user)):
+    """Hit and miss counters of the in-process caches."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return {
+        "principal": principal_cache.stats(),
+        "category": category_cache.stats(),
+        "summary": summary_cache.stats(),
+    }
+
+
+@router.get("/metrics/pool")
+async def pool_metrics(current_user: schemas.User = Depends(get_current_user)):
+    """Connection pool usage: checked out connections, overflow and wait time."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return pool_stats()
+
+
+@router.get("/metrics/queue")
+async def queue_metrics(current_user: schemas.User = Depends(get_current_user)):
+    """Depth, throughput and lag of the webhook processing queue."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return webhook_queue.stats()
+
+
+@router.get("/metrics/events")
+async def event_metrics(current_user: schemas.User = Depends(get_current_user)):
+    """Connected event stream subscribers and dropped events."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return events.hub.stats()
+
+
+@router.get("/metrics/hashing")
+async def hashing_metrics(current_user: schemas.User = Depends(get_current_user)):
+    """Pending, completed, rejected and timed out password hashes."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return hashing_pool.stats()
@@ -1,17 +1,27 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas
 from ..dependencies import get_current_user
-from ..database import get_db
+from ..database import get_db, run_db
+from ..etags import not_modified_at
 
 router = APIRouter()
 
 
 @router.get("/rewards/", response_model=schemas.UserProgress)
-def read_rewards(
+async def read_rewards(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
 ):
-    rewards = crud.get_rewards(db, user_id=current_user.id)
-    return schemas.UserProgress(points=current_user.points, rewards=rewards)
+    version, points, rewards = await run_db(
+        db, crud.get_reward_progress, current_user.id
+    )
+    # Points change with every transaction, not only when a reward is granted
+    if cached := not_modified_at(
+        request, response, "rewards", current_user.id, version, points
+    ):
+        return cached
+    return schemas.UserProgress(points=points, rewards=rewards)
@@ -1,55 +1,238 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from datetime import datetime
+import csv
+import io
+import itertools
+import json
+import re
 
 from .. import crud, schemas
-from ..dependencies import get_current_user
-from ..database import get_db
+from ..dependencies import get_current_user_id
+from ..database import SessionLocal, get_db, run_db
+from ..etags import not_modified
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_BULK_ROWS = 10000
+
+
+def _stream_transactions(user_id, start_date, end_date, category_id, cursor):
+    # The request-scoped session is closed before the body is sent, so the
+    # stream owns its own session for as long as it is being consumed.
+    db = SessionLocal()
+    try:
+        for row in crud.iter_transactions(
+            db,
+            user_id,
+            start_date,
+            end_date,
+            category_id,
+            cursor=cursor,
+        ):
+            yield schemas.Transaction.model_validate(row).model_dump_json() + "\n"
+    finally:
+        db.close()
+
 
 @router.post("/transactions/", response_model=schemas.Transaction)
-def create_transaction(
+async def create_transaction(
     transaction: schemas.TransactionCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.create_transaction(db, transaction, user_id=current_user.id)
+    return await run_db(
+        db, crud.create_transaction, transaction, user_id=current_user_id
+    )
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _iter_json_array(text: str):
+    """Yield the items of a JSON array one at a time, as they are decoded."""
+    decoder = json.JSONDecoder()
+
+    def skip(pos):
+        return _JSON_WHITESPACE.match(text, pos).end()
+
+    pos = skip(0)
+    if text[pos : pos + 1] != "[":
+        raise ValueError("not a JSON array")
+    pos = skip(pos + 1)
+    if text[pos : pos + 1] == "]":
+        pos += 1
+    else:
+        while True:
+            item, pos = decoder.raw_decode(text, pos)
+            yield item
+            pos = skip(pos)
+            separator = text[pos : pos + 1]
+            pos = skip(pos + 1)
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError("expected ',' or ']'")
+    if skip(pos) != len(text):
+        raise ValueError("trailing data after the array")
+
+
+def _iter_csv_rows(text: str):
+    for row in csv.DictReader(io.StringIO(text)):
+        # Empty CSV cells mean "not provided"
+        yield {key: value for key, value in row.items() if value not in ("", None)}
+
+
+def _parse_bulk_body(body: bytes, content_type: str) -> list:
+    """Decode the rows of a bulk import, refusing more than ``MAX_BULK_ROWS``.
+
+    Rows are decoded one at a time, so an oversized body is refused as soon
+    as the limit is passed instead of after decoding all of it.
+    """
+    csv_body = "csv" in content_type
+    try:
+        if csv_body:
+            rows = _iter_csv_rows(body.decode("utf-8-sig"))
+        else:
+            rows = _iter_json_array(body.decode(json.detect_encoding(body)))
+        parsed = list(itertools.islice(rows, MAX_BULK_ROWS + 1))
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        detail = "Invalid CSV body" if csv_body else "Body must be a JSON array or CSV"
+        raise HTTPException(status_code=400, detail=detail)
+    if len(parsed) > MAX_BULK_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per request"
+        )
+    return parsed
+
+
+@router.post("/transactions/bulk", response_model=schemas.BulkTransactionResponse)
+async def bulk_create_transactions(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Import a JSON array or a CSV file (``amount,category_id,timestamp``).
+
+    Every row gets a result: ``created`` with its id, ``invalid`` when it fails
+    validation or ``rejected`` when a budget or category check refuses it.
+    """
+    raw_rows = _parse_bulk_body(
+        await request.body(), request.headers.get("content-type", "")
+    )
+
+    results: list[dict] = []
+    valid: list[schemas.TransactionImport] = []
+    positions: list[int] = []
+    for index, raw in enumerate(raw_rows):
+        try:
+            valid.append(schemas.TransactionImport.model_validate(raw))
+        except ValidationError as exc:
+            error = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}"
+                for err in exc.errors()
+            )
+            results.append({"index": index, "status": "invalid", "error": error})
+            continue
+        positions.append(index)
+        results.append(None)
+
+    if valid:
+        created = await run_db(
+            db, crud.bulk_create_transactions, valid, user_id=current_user_id
+        )
+        for index, result in zip(positions, created):
+            results[index] = {**result, "index": index}
+
+    return {
+        "created": sum(r["status"] == "created" for r in results),
+        "rejected": sum(r["status"] != "created" for r in results),
+        "results": results,
+    }
 
 
 @router.get("/transactions/", response_model=list[schemas.Transaction])
-def read_transactions(
+async def read_transactions(
+    request: Request,
+    response: Response,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
     category_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    accept: str | None = Header(None),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.get_transactions(
+    """List transactions ordered by ``(timestamp, id)``.
+
+    With ``limit`` the result is paginated and the ``X-Next-Cursor`` header
+    carries the cursor for the following page. Sending
+    ``Accept: application/x-ndjson`` streams the whole ledger instead.
+    """
+    if cursor:
+        # Validate before a streaming response has started
+        crud.decode_cursor(cursor)
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(
+            _stream_transactions(
+                current_user_id, start_date, end_date, category_id, cursor
+            ),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+    if cached := await not_modified(
+        request, response, db, "transactions", current_user_id
+    ):
+        return cached
+    if limit is None:
+        return await run_db(
+            db,
+            crud.get_transactions,
+            user_id=current_user_id,
+            start_date=start_date,
+            end_date=end_date,
+            category_id=category_id,
+            cursor=cursor,
+        )
+    items, next_cursor = await run_db(
         db,
-        user_id=current_user.id,
+        crud.get_transactions_page,
+        user_id=current_user_id,
+        limit=limit,
         start_date=start_date,
         end_date=end_date,
         category_id=category_id,
+        cursor=cursor,
     )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 
 @router.put("/transactions/{transaction_id}", response_model=schemas.Transaction)
-def update_transaction(
+async def update_transaction(
     transaction_id: int,
     transaction: schemas.TransactionUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    return crud.update_transaction(db, transaction_id, transaction, user_id=current_user.id)
+    return await run_db(
+        db,
+        crud.update_transaction,
+        transaction_id,
+        transaction,
+        user_id=current_user_id,
+    )
 
 
 @router.delete("/transactions/{transaction_id}")
-def delete_transaction(
+async def delete_transaction(
     transaction_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    crud.delete_transaction(db, transaction_id, user_id=current_user.id)
+    await run_db(db, crud.delete_transaction, transaction_id, user_id=current_user_id)
     return {"detail": "Transaction deleted"}
@@ -1,10 +1,98 @@
-from fastapi import APIRouter, Depends
-from .. import schemas
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import crud, schemas, whatsapp_api
+from ..database import get_db, run_db
 from ..dependencies import get_current_user
 
 router = APIRouter()
 
+EXPANDABLE_RELATIONS = ("transactions", "goals", "budgets", "rewards")
+
+
+def _parse_expand(expand: list[str]) -> list[str]:
+    # Accept both ?expand=a&expand=b and ?expand=a,b
+    requested = []
+    for value in expand:
+        for name in value.split(","):
+            name = name.strip()
+            if not name or name in requested:
+                continue
+            if name not in EXPANDABLE_RELATIONS:
+                raise HTTPException(
+                    status_code=400, detail=f"Cannot expand '{name}'"
+                )
+            requested.append(name)
+    return requested
+
+
+@router.get(
+    "/users/me/",
+    response_model=schemas.User,
+    response_model_exclude_unset=True,
+)
+async def read_users_me(
+    expand: list[str] = Query([]),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Return the user profile and only the collections listed in ``expand``."""
+    relations = _parse_expand(expand)
+    profile = schemas.UserProfile.model_validate(current_user).model_dump()
+    if not relations:
+        return schemas.User(**profile)
+    user = await run_db(db, crud.get_user_with_relations, current_user.id, relations)
+    return schemas.User(
+        **profile, **{name: getattr(user, name) for name in relations}
+    )
+
+
+@router.patch("/users/me/", response_model=schemas.UserProfile)
+async def update_users_me(
+    user: schemas.UserUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Update profile fields; ``phone_number`` can only be cleared here."""
+    if user.phone_number is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Confirm new phone numbers through POST /users/me/phone",
+        )
+    return await run_db(db, crud.update_user, current_user.id, user)
+
+
+@router.post(
+    "/users/me/phone", status_code=202, response_model=schemas.PhoneVerification
+)
+async def request_phone_verification(
+    body: schemas.PhoneNumberCreate,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """Send a code to ``phone_number`` by WhatsApp to prove the user owns it.
+
+    Messages from the number are only turned into transactions once the code
+    has been confirmed at ``POST /users/me/phone/verify``.
+    """
+    code, verification = await run_db(
+        db, crud.start_phone_verification, current_user.id, body.phone_number
+    )
+    try:
+        await whatsapp_api.send_text(
+            body.phone_number, f"Tu código de verificación de Moolah es {code}"
+        )
+    except whatsapp_api.WhatsAppSendError:
+        raise HTTPException(
+            status_code=502, detail="Could not send the verification code"
+        )
+    return verification
+
 
-@router.get("/users/me/", response_model=schemas.User)
-def read_users_me(current_user: schemas.User = Depends(get_current_user)):
-    return current_user
+@router.post("/users/me/phone/verify", response_model=schemas.UserProfile)
+async def confirm_phone_number(
+    body: schemas.PhoneVerificationConfirm,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    return await run_db(db, crud.confirm_phone_number, current_user.id, body.code)
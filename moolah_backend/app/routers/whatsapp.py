@@ -1,57 +1,115 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
 import logging
 from datetime import datetime
 import os
 
-from .. import crud, schemas
-from ..database import get_db
+from .. import crud, schemas, whatsapp_api
+from ..database import get_db, run_db
 from ..dependencies import get_current_user
+from ..webhook_queue import QueueFullError, webhook_queue
 
 router = APIRouter()
 
 
 @router.get("/config")
-def get_config():
+async def get_config():
     phone_number_id = os.getenv("PHONE_NUMBER_ID", "")
     return {"phone_number_id": phone_number_id}
 
 
-@router.post("/whatsapp", status_code=204)
-def receive_whatsapp_webhook(
+def _extract_messages(
     webhook: schemas.WhatsAppWebhook,
-    db: Session = Depends(get_db),
-):
+) -> list[schemas.WhatsAppMessageCreate]:
+    messages = []
     for entry in webhook.entry:
         for change in entry.get("changes", []):
             value = change.get("value", {})
             for msg in value.get("messages", []):
                 body = msg.get("text", {}).get("body", "")
                 ts = datetime.fromtimestamp(int(msg.get("timestamp", "0")))
-                data = schemas.WhatsAppMessageCreate(
-                    id=msg.get("id"),
-                    body=body,
-                    timestamp=ts,
-                    **{"from": msg.get("from")},
-                )
-                try:
-                    crud.create_whatsapp_message(db, data)
-                except IntegrityError:
-                    db.rollback()
-                    logging.info(
-                        "Duplicate WhatsApp message ignored: %s", msg.get("id")
+                messages.append(
+                    schemas.WhatsAppMessageCreate(
+                        id=msg.get("id"),
+                        body=body,
+                        timestamp=ts,
+                        **{"from": msg.get("from")},
                     )
+                )
+    return messages
+
+
+@router.post("/whatsapp", status_code=204)
+async def receive_whatsapp_webhook(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    """Store delivered messages and record the commands they contain.
+
+    The body is parsed only after its ``X-Hub-Signature-256`` has been
+    verified against the app secret.
+    """
+    body = await request.body()
+    signature = request.headers.get(whatsapp_api.SIGNATURE_HEADER)
+    if not whatsapp_api.valid_signature(body, signature):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    try:
+        webhook = schemas.WhatsAppWebhook.model_validate_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
+    messages = _extract_messages(webhook)
+    if webhook_queue.running:
+        # Acknowledge right away; background workers store the batch
+        try:
+            await webhook_queue.put(messages)
+        except QueueFullError:
+            raise HTTPException(
+                status_code=503,
+                detail="Webhook queue is full",
+                headers={"Retry-After": "5"},
+            )
+        return None
+    inserted, skipped = await run_db(db, crud.create_whatsapp_messages, messages)
+    if skipped:
+        logging.info("Ignored %s duplicate WhatsApp messages", skipped)
+    response.headers["X-Messages-Inserted"] = str(inserted)
+    response.headers["X-Messages-Skipped"] = str(skipped)
     return None
 
 
 @router.get("/whatsapp/")
-def read_whatsapp_messages(
+async def read_whatsapp_messages(
+    response: Response,
+    from_number: str | None = None,
+    since: datetime | None = None,
+    after_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=1000),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
 ):
-    """Return messages stored from webhook."""
-    messages = crud.get_whatsapp_messages(db)
+    """Return messages stored from webhook.
+
+    Users only see messages sent from their own verified phone number; admins
+    see every sender and may pick one with ``from_number``. Pass the highest
+    ``id`` already received as ``after_id`` to fetch only newer messages.
+    With ``limit`` the ``X-Next-After-Id`` header is set while more messages
+    remain.
+    """
+    messages = await run_db(
+        db,
+        crud.get_whatsapp_messages,
+        from_number=from_number,
+        since=since,
+        after_id=after_id,
+        limit=limit + 1 if limit else None,
+        owner_id=None if current_user.is_admin else current_user.id,
+    )
+    if limit and len(messages) > limit:
+        messages = messages[:limit]
+        response.headers["X-Next-After-Id"] = str(messages[-1].id)
     return [
         {
             "id": msg.id,
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from decimal import Decimal
 from pydantic import (
     BaseModel,
@@ -10,7 +11,7 @@ from pydantic import (
     field_validator,
 )
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 
 
 class DecimalBaseModel(BaseModel):
@@ -25,8 +26,12 @@ class DecimalBaseModel(BaseModel):
         return value
 
 
+# Largest magnitude ``Numeric(10, 2)`` stores
+MAX_AMOUNT = Decimal("99999999.99")
+
+
 class TransactionBase(DecimalBaseModel):
-    amount: Decimal
+    amount: Decimal = Field(ge=-MAX_AMOUNT, le=MAX_AMOUNT)
     category_id: Optional[int] = None
 
 
@@ -34,8 +39,25 @@ class TransactionCreate(TransactionBase):
     pass
 
 
+class TransactionImport(TransactionBase):
+    timestamp: Optional[datetime] = None
+
+
+class BulkTransactionResult(DecimalBaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkTransactionResponse(DecimalBaseModel):
+    created: int
+    rejected: int
+    results: List[BulkTransactionResult]
+
+
 class TransactionUpdate(DecimalBaseModel):
-    amount: Optional[Decimal] = None
+    amount: Optional[Decimal] = Field(None, ge=-MAX_AMOUNT, le=MAX_AMOUNT)
     category_id: Optional[int] = None
 
 
@@ -70,16 +92,57 @@ class UserBase(DecimalBaseModel):
     email: EmailStr
 
 
+def _digits_only(value: Optional[str]) -> Optional[str]:
+    # WhatsApp reports senders as bare digits, e.g. "5491122334455"
+    if value is None:
+        return None
+    digits = "".join(ch for ch in value if ch.isdigit())
+    if not digits:
+        raise ValueError("phone_number must contain digits")
+    return digits
+
+
 class UserCreate(UserBase):
     password: str
     is_admin: bool = False
 
 
-class User(UserBase):
+class UserUpdate(DecimalBaseModel):
+    phone_number: Optional[str] = None
+
+    @field_validator("phone_number")
+    @classmethod
+    def normalize_phone_number(cls, v: Optional[str]):
+        return _digits_only(v)
+
+
+class PhoneNumberCreate(DecimalBaseModel):
+    phone_number: str
+
+    @field_validator("phone_number")
+    @classmethod
+    def normalize_phone_number(cls, v: str):
+        return _digits_only(v)
+
+
+class PhoneVerification(DecimalBaseModel):
+    phone_number: str
+    expires_at: datetime
+
+
+class PhoneVerificationConfirm(DecimalBaseModel):
+    code: str
+
+
+class UserProfile(UserBase):
     id: int
     is_active: bool
     is_admin: bool
     points: int
+    phone_number: Optional[str] = None
+
+
+class User(UserProfile):
     transactions: List[Transaction] = Field(default_factory=list)
     goals: List[Goal] = Field(default_factory=list)
     budgets: List["Budget"] = Field(default_factory=list)
@@ -90,6 +153,11 @@ class User(UserBase):
 class Token(DecimalBaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class TokenRefresh(DecimalBaseModel):
+    refresh_token: str
 
 
 class TokenData(DecimalBaseModel):
@@ -191,6 +259,55 @@ class CategorySummary(DecimalBaseModel):
     total: Decimal
 
 
+class SummaryRow(DecimalBaseModel):
+    period: Optional[str] = None
+    category: Optional[str] = None
+    total: Decimal
+    income: Decimal
+    expense: Decimal
+
+
+class TrendPoint(DecimalBaseModel):
+    month: str
+    category: Optional[str] = None
+    spent: Decimal
+    moving_average: Decimal
+    change: Optional[Decimal] = None
+    change_pct: Optional[float] = None
+
+
+class CategoryForecast(DecimalBaseModel):
+    category: str
+    spent: Decimal
+    projected: Decimal
+
+
+class MonthForecast(DecimalBaseModel):
+    month: str
+    days_elapsed: float
+    days_in_month: int
+    spent: Decimal
+    projected: Decimal
+    budget: Optional[Decimal] = None
+    projected_over_budget: Optional[bool] = None
+    categories: List[CategoryForecast]
+
+
+class ReportInfo(DecimalBaseModel):
+    name: str
+    generated_at: datetime
+    duration_ms: float
+
+
+class Report(ReportInfo):
+    data: Any
+
+    @field_validator("data", mode="before")
+    @classmethod
+    def _parse_json(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+
 class WhatsAppWebhook(DecimalBaseModel):
     entry: List[dict] = Field(default_factory=list)
 
@@ -0,0 +1,182 @@
+"""Vectorized spending trends and end-of-month forecasts.
+
+A user's transactions are loaded once as columnar NumPy arrays (amount in
+integer cents, timestamp as int64 epoch seconds, category id with ``0`` for
+uncategorized) and every metric is computed with array operations instead of
+iterating over ORM rows.
+"""
+
+from calendar import monthrange
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+SECONDS_PER_DAY = 86_400
+
+
+@dataclass
+class TransactionColumns:
+    amount: np.ndarray
+    timestamp: np.ndarray
+    category: np.ndarray
+
+    @property
+    def month(self) -> np.ndarray:
+        """Months since 1970-01 for each transaction."""
+        return (
+            self.timestamp.astype("datetime64[s]")
+            .astype("datetime64[M]")
+            .astype(np.int64)
+        )
+
+
+def load_columns(
+    db: Session,
+    user_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> TransactionColumns:
+    """Fetch the user's transactions in ``[start, end)`` as int64 columns.
+
+    Conversion to cents and epoch seconds happens in SQL so the driver only
+    hands back plain integers.
+    """
+    tx = models.Transaction
+    if db.get_bind().dialect.name == "sqlite":
+        epoch = cast(func.strftime("%s", tx.timestamp), BigInteger)
+    else:
+        epoch = cast(func.extract("epoch", tx.timestamp), BigInteger)
+    stmt = select(
+        cast(func.round(tx.amount * 100), BigInteger),
+        epoch,
+        func.coalesce(tx.category_id, 0),
+    ).where(tx.owner_id == user_id)
+    if start:
+        stmt = stmt.where(tx.timestamp >= start)
+    if end:
+        stmt = stmt.where(tx.timestamp < end)
+    # Plain integers need no result processing, so read the DBAPI cursor
+    # directly and flatten it; both are several times faster than Row objects
+    result = db.connection().execute(stmt)
+    try:
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 3)
+    return TransactionColumns(data[:, 0], data[:, 1], data[:, 2])
+
+
+def month_index(value: datetime) -> int:
+    return (value.year - 1970) * 12 + value.month - 1
+
+
+def month_label(index: int) -> str:
+    return str(np.datetime64(int(index), "M"))
+
+
+def cents(value) -> Decimal:
+    return Decimal(int(round(value))).scaleb(-2)
+
+
+def _spend_matrix(cols: TransactionColumns, first_month: int, months: int):
+    """Expenses per category and month as a ``(categories, months)`` array."""
+    expense = cols.amount < 0
+    offset = cols.month[expense] - first_month
+    in_range = (offset >= 0) & (offset < months)
+    offset = offset[in_range]
+    spent = -cols.amount[expense][in_range]
+    categories, row = np.unique(cols.category[expense][in_range], return_inverse=True)
+    matrix = np.bincount(
+        row * months + offset, weights=spent, minlength=len(categories) * months
+    ).reshape(len(categories), months)
+    return categories, matrix
+
+
+def spending_trends(
+    cols: TransactionColumns,
+    first_month: int,
+    months: int,
+    window: int = 3,
+    by_category: bool = False,
+) -> list[dict]:
+    """Monthly spend with a trailing moving average and month-over-month change.
+
+    Months without expenses count as zero. The moving average of the first
+    ``window - 1`` months is taken over the months available so far. Returns
+    one dict per month (and category when ``by_category``) with amounts in
+    cents and ``category_id`` set to ``None`` for the overall series.
+    """
+    categories, matrix = _spend_matrix(cols, first_month, months)
+    if not by_category:
+        matrix = matrix.sum(axis=0, keepdims=True)
+        categories = np.array([-1])
+    if not len(categories):
+        matrix = np.zeros((1, months))
+        categories = np.array([-1])
+
+    running = np.cumsum(matrix, axis=1)
+    lagged = np.zeros_like(running)
+    lagged[:, window:] = running[:, :-window]
+    periods = np.minimum(np.arange(1, months + 1), window)
+    moving_average = (running - lagged) / periods
+
+    change = np.full_like(matrix, np.nan)
+    change[:, 1:] = np.diff(matrix, axis=1)
+    previous = np.full_like(matrix, np.nan)
+    previous[:, 1:] = matrix[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.where(previous > 0, change / previous * 100, np.nan)
+
+    points = []
+    for row, category in enumerate(categories.tolist()):
+        for offset in range(months):
+            points.append(
+                {
+                    "month": month_label(first_month + offset),
+                    "category_id": None if category < 0 else category,
+                    "spent": matrix[row, offset],
+                    "moving_average": moving_average[row, offset],
+                    "change": change[row, offset],
+                    "change_pct": change_pct[row, offset],
+                }
+            )
+    return points
+
+
+def month_forecast(
+    cols: TransactionColumns, month: str, now: datetime
+) -> dict:
+    """Project each category's month-end spend from the pace so far.
+
+    ``cols`` must hold the transactions of ``month`` only. Spend is scaled by
+    the elapsed fraction of the month, so past months project to what was
+    actually spent and future months to zero.
+    """
+    year, number = map(int, month.split("-"))
+    days_in_month = monthrange(year, number)[1]
+    start = datetime(year, number, 1)
+    elapsed = (now - start).total_seconds() / (days_in_month * SECONDS_PER_DAY)
+    elapsed = min(max(elapsed, 0.0), 1.0)
+
+    expense = cols.amount < 0
+    categories, row = np.unique(cols.category[expense], return_inverse=True)
+    spent = np.bincount(row, weights=-cols.amount[expense], minlength=len(categories))
+    projected = spent / elapsed if elapsed else np.zeros_like(spent)
+    return {
+        "month": month,
+        "days_elapsed": round(elapsed * days_in_month, 2),
+        "days_in_month": days_in_month,
+        "spent": spent.sum(),
+        "projected": projected.sum(),
+        "categories": [
+            {"category_id": category, "spent": s, "projected": p}
+            for category, s, p in zip(categories.tolist(), spent, projected)
+        ],
+    }
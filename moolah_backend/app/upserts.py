@@ -0,0 +1,95 @@
+"""``INSERT ... ON CONFLICT`` for every supported database.
+
+SQLite and PostgreSQL run each helper as a single ``ON CONFLICT`` statement.
+Other databases fall back to a portable update-or-insert per row inside a
+savepoint, so a row inserted meanwhile by a concurrent transaction turns
+into a retry instead of an ``IntegrityError`` that aborts the whole write.
+"""
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db):
+    """The dialect's ``insert`` with ``on_conflict_*``, or ``None``."""
+    bind = db.get_bind() if isinstance(db, Session) else db
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _key_filter(table, keys, row):
+    return [table.c[key] == row[key] for key in keys]
+
+
+def increment(db, table, rows: list[dict], keys, columns):
+    """Insert ``rows``, adding their ``columns`` to rows that already exist.
+
+    ``keys`` name the unique constraint identifying a row. Works on a
+    ``Session`` or a ``Connection``; the caller commits.
+    """
+    if not rows:
+        return
+    insert_ = dialect_insert(db)
+    if insert_ is not None:
+        stmt = insert_(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys],
+            set_={name: table.c[name] + stmt.excluded[name] for name in columns},
+        )
+        db.execute(stmt, rows)
+        return
+    if isinstance(db, Session):
+        # A session savepoint would flush, which fails inside a flush hook
+        db = db.connection()
+    for row in rows:
+        where = _key_filter(table, keys, row)
+        add = update(table).where(*where).values(
+            {name: table.c[name] + row[name] for name in columns}
+        )
+        if db.execute(add).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(row))
+        except IntegrityError:
+            # Another transaction inserted the row after our update missed it
+            db.execute(add)
+
+
+def insert_missing(db, table, rows: list[dict], keys, returning, *, chunk=500):
+    """Insert the ``rows`` whose ``keys`` are not stored yet.
+
+    Returns the ``returning`` columns of the newly inserted rows only, so
+    duplicates, within the batch or already stored, are skipped silently.
+    """
+    insert_ = dialect_insert(db)
+    stored = []
+    if insert_ is not None:
+        for start in range(0, len(rows), chunk):
+            stmt = (
+                insert_(table)
+                .values(rows[start : start + chunk])
+                .on_conflict_do_nothing(index_elements=[table.c[k] for k in keys])
+                .returning(*returning)
+            )
+            stored.extend(db.execute(stmt).all())
+        return stored
+    if isinstance(db, Session):
+        db = db.connection()
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(row))
+        except IntegrityError:
+            continue
+        stored.append(
+            db.execute(select(*returning).where(*_key_filter(table, keys, row))).one()
+        )
+    return stored
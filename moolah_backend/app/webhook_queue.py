@@ -0,0 +1,259 @@
+"""Bounded in-process queue that decouples webhook ingestion from storage.
+
+The webhook handler only enqueues the parsed messages and answers at once;
+background workers drain the queue in batches and write them through
+``crud.create_whatsapp_messages``. With a spool path configured every payload
+is first written to a local SQLite file so that accepted messages survive a
+crash or restart and are replayed on the next start.
+
+``stats`` serves the counters to ``/metrics/queue``; the same figures are
+exported to Prometheus through ``monitoring``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, schemas
+from .database import run_in_session
+from .monitoring import (
+    WEBHOOK_QUEUE_BATCHES,
+    WEBHOOK_QUEUE_DEPTH,
+    WEBHOOK_QUEUE_LAG_SECONDS,
+    WEBHOOK_QUEUE_MESSAGES,
+    WEBHOOK_QUEUE_PAYLOADS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue stays full for longer than the enqueue timeout."""
+
+
+@dataclass
+class _Item:
+    messages: list
+    enqueued_at: float
+    spool_id: int | None = None
+    attempts: int = 0
+
+
+class _Spool:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_spool ("
+                "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, "
+                "enqueued_at REAL NOT NULL)"
+            )
+
+    def add(self, messages, enqueued_at: float) -> int:
+        payload = json.dumps(
+            [m.model_dump(mode="json", by_alias=True) for m in messages]
+        )
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO webhook_spool (payload, enqueued_at) VALUES (?, ?)",
+                (payload, enqueued_at),
+            )
+            return cursor.lastrowid
+
+    def remove(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM webhook_spool WHERE id = ?", [(i,) for i in ids]
+            )
+
+    def pending(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, enqueued_at FROM webhook_spool ORDER BY id"
+            ).fetchall()
+        for spool_id, payload, enqueued_at in rows:
+            messages = [
+                schemas.WhatsAppMessageCreate.model_validate(m)
+                for m in json.loads(payload)
+            ]
+            yield _Item(messages, enqueued_at, spool_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookQueue:
+    def __init__(
+        self,
+        handler,
+        *,
+        maxsize: int = 1000,
+        batch_size: int = 100,
+        workers: int = 1,
+        enqueue_timeout: float = 1.0,
+        max_attempts: int = 3,
+        spool_path: str | None = None,
+    ):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.spool_path = spool_path
+        self.running = False
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._spool: _Spool | None = None
+        self._stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "processed_messages": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dropped": 0,
+            "last_batch_lag": 0.0,
+            "max_batch_lag": 0.0,
+        }
+
+    async def start(self):
+        # The bound is enforced in ``put`` so that replayed and retried
+        # payloads, which were already acknowledged, can always be queued.
+        self._queue = asyncio.Queue()
+        if self.spool_path:
+            self._spool = _Spool(self.spool_path)
+            # Replay payloads accepted before the last shutdown or crash
+            for item in self._spool.pending():
+                self._queue.put_nowait(item)
+        WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        self.running = True
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop accepting payloads and drain what is queued, up to ``timeout``."""
+        self.running = False
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Webhook queue not drained, %s payloads left",
+                    self._queue.qsize(),
+                )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    async def put(self, messages):
+        """Accept a payload, waiting at most ``enqueue_timeout`` for room."""
+        if not self.running:
+            raise RuntimeError("Webhook queue is not running")
+        item = _Item(list(messages), time.time())
+        try:
+            await asyncio.wait_for(self._wait_for_room(), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            WEBHOOK_QUEUE_PAYLOADS.labels("rejected").inc()
+            raise QueueFullError()
+        if self._spool is not None:
+            item.spool_id = await run_in_threadpool(
+                self._spool.add, item.messages, item.enqueued_at
+            )
+        self._queue.put_nowait(item)
+        self._stats["enqueued"] += 1
+        WEBHOOK_QUEUE_PAYLOADS.labels("enqueued").inc()
+        WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def _wait_for_room(self):
+        while self._queue.qsize() >= self.maxsize:
+            await asyncio.sleep(0.01)
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch):
+        lag = time.time() - min(item.enqueued_at for item in batch)
+        messages = [m for item in batch for m in item.messages]
+        try:
+            await self.handler(messages)
+        except Exception:
+            logger.exception("Failed to store %s webhook messages", len(messages))
+            self._stats["failed_batches"] += 1
+            WEBHOOK_QUEUE_BATCHES.labels("failed").inc()
+            # Back off before retrying so a struggling database is not hammered
+            await asyncio.sleep(0.5 * 2 ** min(item.attempts for item in batch))
+            for item in batch:
+                item.attempts += 1
+                if item.attempts < self.max_attempts:
+                    self._queue.put_nowait(item)
+                else:
+                    # Still spooled (if a spool is configured) for a later replay
+                    self._stats["dropped"] += 1
+                    WEBHOOK_QUEUE_PAYLOADS.labels("dropped").inc()
+            WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+            return
+        if self._spool is not None:
+            ids = [item.spool_id for item in batch if item.spool_id is not None]
+            await run_in_threadpool(self._spool.remove, ids)
+        self._stats["batches"] += 1
+        self._stats["processed_messages"] += len(messages)
+        self._stats["last_batch_lag"] = lag
+        self._stats["max_batch_lag"] = max(self._stats["max_batch_lag"], lag)
+        WEBHOOK_QUEUE_BATCHES.labels("stored").inc()
+        WEBHOOK_QUEUE_MESSAGES.inc(len(messages))
+        WEBHOOK_QUEUE_LAG_SECONDS.observe(lag)
+
+    def stats(self) -> dict:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "running": self.running,
+            "depth": depth,
+            "maxsize": self.maxsize,
+            **self._stats,
+        }
+
+
+async def store_messages(messages):
+    inserted, skipped = await run_in_session(crud.create_whatsapp_messages, messages)
+    if skipped:
+        logger.info("Ignored %s duplicate WhatsApp messages", skipped)
+
+
+QUEUE_ENABLED = os.getenv("MOOLAH_WEBHOOK_QUEUE", "").lower() in ("1", "true", "yes")
+
+webhook_queue = WebhookQueue(
+    store_messages,
+    maxsize=int(os.getenv("MOOLAH_WEBHOOK_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("MOOLAH_WEBHOOK_BATCH_SIZE", "100")),
+    workers=int(os.getenv("MOOLAH_WEBHOOK_WORKERS", "1")),
+    enqueue_timeout=float(os.getenv("MOOLAH_WEBHOOK_ENQUEUE_TIMEOUT", "1")),
+    spool_path=os.getenv("MOOLAH_WEBHOOK_SPOOL") or None,
+)
@@ -0,0 +1,52 @@
+"""WhatsApp Cloud API: webhook signatures and outgoing messages.
+
+Meta signs every webhook delivery with the app secret in the
+``X-Hub-Signature-256`` header; deliveries without a valid signature are
+rejected, so nobody but WhatsApp can post messages on a user's behalf. If
+``WHATSAPP_APP_SECRET`` is not set every delivery is rejected.
+"""
+
+import hashlib
+import hmac
+import os
+
+import httpx
+
+API_BASE_URL = os.getenv("WHATSAPP_API_BASE_URL", "https://graph.facebook.com/v18.0")
+ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
+APP_SECRET = os.getenv("WHATSAPP_APP_SECRET")
+SIGNATURE_HEADER = "x-hub-signature-256"
+
+
+class WhatsAppSendError(Exception):
+    """Raised when a message could not be handed to the Cloud API."""
+
+
+def valid_signature(body: bytes, signature: str | None) -> bool:
+    """Check ``signature`` (``sha256=<hex>``) against the raw request body."""
+    if not APP_SECRET or not signature:
+        return False
+    expected = hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature)
+
+
+async def send_text(to: str, body: str):
+    phone_number_id = os.getenv("PHONE_NUMBER_ID")
+    if not ACCESS_TOKEN or not phone_number_id:
+        raise WhatsAppSendError("WhatsApp sending is not configured")
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            resp = await client.post(
+                f"{API_BASE_URL}/{phone_number_id}/messages",
+                headers={"Authorization": f"Bearer {ACCESS_TOKEN}"},
+                json={
+                    "messaging_product": "whatsapp",
+                    "to": to,
+                    "type": "text",
+                    "text": {"body": body},
+                },
+            )
+    except httpx.HTTPError as exc:
+        raise WhatsAppSendError(str(exc)) from exc
+    if resp.is_error:
+        raise WhatsAppSendError(f"Cloud API answered {resp.status_code}")
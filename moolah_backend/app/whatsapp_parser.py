@@ -0,0 +1,65 @@
+"""Turn WhatsApp texts such as ``"gasto 45 comida"`` into transactions.
+
+Message bodies are matched against patterns compiled once at import time.
+The optional trailing words are resolved against a ``{normalized name: id}``
+mapping of categories (see ``crud.get_category_lookup``), so parsing a batch
+does not touch the database.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+EXPENSE_KEYWORDS = ("gasto", "gaste", "pague", "compra", "compre", "egreso")
+INCOME_KEYWORDS = ("ingreso", "cobro", "cobre", "recibi", "sueldo")
+
+# At most 8 integer digits: amounts are stored as ``Numeric(10, 2)``, so a
+# longer number is not a command rather than a row the database refuses
+_AMOUNT = r"\$?\s*(?P<amount>\d{1,8}(?:[.,]\d{1,2})?)"
+_COMMAND_RE = re.compile(
+    rf"^(?P<keyword>[a-z]+)\s+{_AMOUNT}(?:\s+(?:en\s+|de\s+)?(?P<category>.+?))?\s*$"
+)
+_SPACES_RE = re.compile(r"\s+")
+_SIGNS = {
+    **{keyword: -1 for keyword in EXPENSE_KEYWORDS},
+    **{keyword: 1 for keyword in INCOME_KEYWORDS},
+}
+
+
+@dataclass(frozen=True)
+class ParsedCommand:
+    amount: Decimal
+    category_id: int | None = None
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _SPACES_RE.sub(" ", stripped).strip().lower()
+
+
+def parse_command(body: str, categories: dict[str, int]) -> ParsedCommand | None:
+    """Parse one message body, returning ``None`` if it is not a command.
+
+    Expenses are returned with a negative amount. A trailing word that does
+    not name a known category leaves the transaction uncategorized.
+    """
+    match = _COMMAND_RE.match(normalize(body))
+    if match is None:
+        return None
+    sign = _SIGNS.get(match["keyword"])
+    if sign is None:
+        return None
+    try:
+        amount = Decimal(match["amount"].replace(",", "."))
+    except InvalidOperation:
+        return None
+    if not amount:
+        return None
+    category = match["category"]
+    return ParsedCommand(
+        amount=sign * amount,
+        category_id=categories.get(category) if category else None,
+    )
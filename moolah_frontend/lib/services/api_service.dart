@@ -15,6 +15,7 @@ import '../models/rewards_data.dart';
 class ApiService {
   static String? _baseUrl;
   static const _storage = FlutterSecureStorage();
+  static Future<bool>? _refreshing;
 
   static Future<String> _getBaseUrl() async {
     _baseUrl ??= await Config.backendBaseUrl;
@@ -24,6 +25,13 @@ class ApiService {
   static Future<String?> _getToken() => _storage.read(key: 'token');
   static Future<void> _setToken(String token) => _storage.write(key: 'token', value: token);
 
+  static Future<void> _setTokens(Map<String, dynamic> data) async {
+    await _setToken(data['access_token']);
+    if (data['refresh_token'] != null) {
+      await _storage.write(key: 'refresh_token', value: data['refresh_token']);
+    }
+  }
+
   static String _parseError(http.Response response) {
     try {
       final data = jsonDecode(response.body);
@@ -34,9 +42,20 @@ class ApiService {
     return 'Error ${response.statusCode}';
   }
 
-  static Future<http.Response> _safeRequest(Future<http.Response> future) async {
+  /// Sends the request built by [send] with the stored access token. When it
+  /// is rejected with a 401 the session is renewed once through
+  /// [refreshSession] and the request is sent again with the new token.
+  static Future<http.Response> _safeRequest(
+    Future<http.Response> Function(String? token) send, {
+    bool authenticated = true,
+  }) async {
     try {
-      final response = await future;
+      var response = await send(await _getToken());
+      if (authenticated &&
+          response.statusCode == 401 &&
+          await _refreshOnce()) {
+        response = await send(await _getToken());
+      }
       if (response.statusCode >= 200 && response.statusCode < 300) {
         return response;
       }
@@ -46,23 +65,46 @@ class ApiService {
     }
   }
 
+  /// Requests that fail together share a single refresh.
+  static Future<bool> _refreshOnce() {
+    return _refreshing ??=
+        refreshSession().whenComplete(() => _refreshing = null);
+  }
+
   /// Authenticate a user against the backend and store the access token.
   static Future<void> login(String email, String password) async {
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.post(
-      Uri.parse('$baseUrl/token'),
-      headers: {'Content-Type': 'application/x-www-form-urlencoded'},
-      body: {'username': email, 'password': password},
-    ));
-    final data = jsonDecode(response.body);
-    await _setToken(data['access_token']);
+    final response = await _safeRequest(
+      (_) => http.post(
+        Uri.parse('$baseUrl/token'),
+        headers: {'Content-Type': 'application/x-www-form-urlencoded'},
+        body: {'username': email, 'password': password},
+      ),
+      authenticated: false,
+    );
+    await _setTokens(jsonDecode(response.body) as Map<String, dynamic>);
+  }
+
+  /// Renews the access token with the stored refresh token, avoiding a new
+  /// password login. Returns false when the user must log in again.
+  static Future<bool> refreshSession() async {
+    final refreshToken = await _storage.read(key: 'refresh_token');
+    if (refreshToken == null) return false;
+    final baseUrl = await _getBaseUrl();
+    final response = await http.post(
+      Uri.parse('$baseUrl/token/refresh'),
+      headers: {'Content-Type': 'application/json'},
+      body: jsonEncode({'refresh_token': refreshToken}),
+    );
+    if (response.statusCode != 200) return false;
+    await _setTokens(jsonDecode(response.body) as Map<String, dynamic>);
+    return true;
   }
 
   /// Returns configuration values provided by the backend.
   static Future<Map<String, dynamic>> getConfig() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/config'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -72,11 +114,14 @@ class ApiService {
   /// Registers a new user account.
   static Future<void> register(String email, String password) async {
     final baseUrl = await _getBaseUrl();
-    await _safeRequest(http.post(
-      Uri.parse('$baseUrl/users/'),
-      headers: {'Content-Type': 'application/json'},
-      body: jsonEncode({'email': email, 'password': password}),
-    ));
+    await _safeRequest(
+      (_) => http.post(
+        Uri.parse('$baseUrl/users/'),
+        headers: {'Content-Type': 'application/json'},
+        body: jsonEncode({'email': email, 'password': password}),
+      ),
+      authenticated: false,
+    );
   }
 
   /// Returns a list of transactions for the authenticated user.
@@ -85,7 +130,6 @@ class ApiService {
     DateTime? endDate,
     int? categoryId,
   }) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
 
     final params = <String, String>{};
@@ -101,7 +145,7 @@ class ApiService {
 
     final uri =
         Uri.parse('$baseUrl/transactions/').replace(queryParameters: params);
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       uri,
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -111,9 +155,8 @@ class ApiService {
 
   /// Retrieves the user's saving goals.
   static Future<List<Goal>> getGoals() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/goals/'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -123,9 +166,8 @@ class ApiService {
 
   /// Retrieves the list of available categories.
   static Future<List<Category>> getCategories() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/categories/'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -135,9 +177,8 @@ class ApiService {
 
   /// Retrieves budgets defined by the user.
   static Future<List<Budget>> getBudgets() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/budgets/'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -147,9 +188,8 @@ class ApiService {
 
   /// Returns reward information for the user.
   static Future<RewardsData> getRewards() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/rewards/'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -159,9 +199,8 @@ class ApiService {
 
   /// Monthly spending summary for the user.
   static Future<List<dynamic>> getMonthlySummary() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/summary/monthly'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -170,9 +209,8 @@ class ApiService {
 
   /// Spending summary grouped by category.
   static Future<List<dynamic>> getCategorySummary() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
+    final response = await _safeRequest((token) => http.get(
       Uri.parse('$baseUrl/summary/category'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -181,25 +219,26 @@ class ApiService {
 
   /// Information for the authenticated user including points and rewards.
   static Future<User> getUser() async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.get(
-      Uri.parse('$baseUrl/users/me/'),
+    final response = await _safeRequest((token) => http.get(
+      Uri.parse('$baseUrl/users/me/?expand=rewards'),
       headers: {'Authorization': 'Bearer $token'},
     ));
     final data = jsonDecode(response.body) as Map<String, dynamic>;
     return User.fromJson(data);
   }
 
-  /// Removes the stored authentication token.
-  static Future<void> logout() => _storage.delete(key: 'token');
+  /// Removes the stored tokens, so the session cannot be renewed either.
+  static Future<void> logout() async {
+    await _storage.delete(key: 'token');
+    await _storage.delete(key: 'refresh_token');
+  }
 
   // -------------------- Transactions --------------------
 
   static Future<Transaction> createTransaction(Transaction data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.post(
+    final response = await _safeRequest((token) => http.post(
       Uri.parse('$baseUrl/transactions/'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -213,9 +252,8 @@ class ApiService {
 
   static Future<Transaction> updateTransaction(
       int id, Transaction data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.put(
+    final response = await _safeRequest((token) => http.put(
       Uri.parse('$baseUrl/transactions/$id'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -228,9 +266,8 @@ class ApiService {
   }
 
   static Future<void> deleteTransaction(int id) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    await _safeRequest(http.delete(
+    await _safeRequest((token) => http.delete(
       Uri.parse('$baseUrl/transactions/$id'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -239,9 +276,8 @@ class ApiService {
   // -------------------- Goals --------------------
 
   static Future<Goal> createGoal(Goal data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.post(
+    final response = await _safeRequest((token) => http.post(
       Uri.parse('$baseUrl/goals/'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -254,9 +290,8 @@ class ApiService {
   }
 
   static Future<Goal> updateGoal(int id, Goal data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.put(
+    final response = await _safeRequest((token) => http.put(
       Uri.parse('$baseUrl/goals/$id'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -269,9 +304,8 @@ class ApiService {
   }
 
   static Future<Map<String, dynamic>> completeGoal(int id) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.patch(
+    final response = await _safeRequest((token) => http.patch(
       Uri.parse('$baseUrl/goals/$id/complete'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -279,9 +313,8 @@ class ApiService {
   }
 
   static Future<void> deleteGoal(int id) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    await _safeRequest(http.delete(
+    await _safeRequest((token) => http.delete(
       Uri.parse('$baseUrl/goals/$id'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -290,9 +323,8 @@ class ApiService {
   // -------------------- Categories --------------------
 
   static Future<Category> createCategory(Category data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.post(
+    final response = await _safeRequest((token) => http.post(
       Uri.parse('$baseUrl/categories/'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -305,9 +337,8 @@ class ApiService {
   }
 
   static Future<Category> updateCategory(int id, Category data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.put(
+    final response = await _safeRequest((token) => http.put(
       Uri.parse('$baseUrl/categories/$id'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -320,9 +351,8 @@ class ApiService {
   }
 
   static Future<void> deleteCategory(int id) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    await _safeRequest(http.delete(
+    await _safeRequest((token) => http.delete(
       Uri.parse('$baseUrl/categories/$id'),
       headers: {'Authorization': 'Bearer $token'},
     ));
@@ -331,9 +361,8 @@ class ApiService {
   // -------------------- Budgets --------------------
 
   static Future<Budget> createBudget(Budget data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.post(
+    final response = await _safeRequest((token) => http.post(
       Uri.parse('$baseUrl/budgets/'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -346,9 +375,8 @@ class ApiService {
   }
 
   static Future<Budget> updateBudget(int id, Budget data) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    final response = await _safeRequest(http.put(
+    final response = await _safeRequest((token) => http.put(
       Uri.parse('$baseUrl/budgets/$id'),
       headers: {
         'Authorization': 'Bearer $token',
@@ -361,9 +389,8 @@ class ApiService {
   }
 
   static Future<void> deleteBudget(int id) async {
-    final token = await _getToken();
     final baseUrl = await _getBaseUrl();
-    await _safeRequest(http.delete(
+    await _safeRequest((token) => http.delete(
       Uri.parse('$baseUrl/budgets/$id'),
       headers: {'Authorization': 'Bearer $token'},
     ));
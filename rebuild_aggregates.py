@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+# Allow imports from the backend package
+sys.path.append(str(Path(__file__).resolve().parent / "moolah_backend"))
+
+from app.database import engine, SessionLocal
+from app import crud
+from app.migrations import run_migrations
+
+
+def rebuild(verify_only: bool = False) -> int:
+    """Recompute the day and month rollups and report any drift.
+
+    Meant to run nightly: besides fixing drift, rebuilding the rollups
+    compacts away rows left empty by deleted transactions.
+
+    Parameters
+    ----------
+    verify_only: bool, optional
+        Only report differences without rewriting the rollup tables.
+
+    Returns the number of aggregate rows that did not match.
+    """
+    # Older databases lack the month bucket and the rollup tables
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        mismatches = crud.rebuild_rollups(db, fix=not verify_only)
+    finally:
+        db.close()
+
+    for row in mismatches:
+        print(
+            "{table} owner={owner_id} period={period} category={category_id}: "
+            "stored={stored} expected={expected}".format(**row)
+        )
+    action = "found" if verify_only else "fixed"
+    print(f"{len(mismatches)} mismatched aggregate rows {action}")
+    return len(mismatches)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the day and month rollups from transactions"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Only report mismatches, do not rewrite the aggregates",
+    )
+    args = parser.parse_args()
+    mismatched = rebuild(verify_only=args.verify)
+    sys.exit(1 if args.verify and mismatched else 0)
@@ -1,4 +1,8 @@
+import random
 import sys
+import time
+from calendar import monthrange
+from itertools import accumulate
 from pathlib import Path
 from typing import Optional
 
@@ -6,8 +10,9 @@ from typing import Optional
 sys.path.append(str(Path(__file__).resolve().parent / "moolah_backend"))
 
 from app.database import Base, engine, SessionLocal
-from app import crud, schemas
-from datetime import datetime
+from app import crud, hashing, models, rollups, schemas
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
 
 
 def month_iterator(start_year: int, start_month: int):
@@ -748,6 +753,172 @@ def seed(reset: bool = False):
         db.close()
 
 
+DEFAULT_CATEGORY_WEIGHTS = {
+    "Comida": 30,
+    "Transporte": 15,
+    "Hogar": 12,
+    "Servicios": 10,
+    "Entretenimiento": 8,
+    "Salud": 6,
+    "Ropa": 5,
+    "Tecnología": 4,
+    "Viajes": 4,
+    "Otros": 6,
+}
+
+
+def seed_bulk(
+    users: int = 1000,
+    months: int = 12,
+    transactions_per_month: int = 80,
+    category_weights: Optional[dict] = None,
+    *,
+    start: str = "2024-01",
+    password: str = "secret",
+    batch_size: int = 20_000,
+    random_seed: int = 0,
+    reset: bool = False,
+    bind=engine,
+) -> dict:
+    """Generate synthetic load-test data directly with Core inserts.
+
+    Creates ``users`` users (``load<id>@example.com``), each with a budget
+    and ``transactions_per_month`` transactions for ``months`` months from
+    ``start``. The first transaction of each month is the salary; the rest
+    are expenses spread over ``category_weights`` (category name to relative
+    weight; missing categories are created).
+
+    Unlike :func:`seed`, nothing goes through ``crud``. The password is
+    hashed once and shared by every user, rows are inserted in batches of
+    ``batch_size`` within a single transaction, and points and rewards are
+    accumulated in the same pass that generates the transactions. The
+    rollups are rebuilt with one ``INSERT ... SELECT`` at the end. Returns
+    the number of rows created per table.
+    """
+    if reset:
+        Base.metadata.drop_all(bind=bind)
+    Base.metadata.create_all(bind=bind)
+    weights = category_weights or DEFAULT_CATEGORY_WEIGHTS
+    rng = random.Random(random_seed)
+    hashed_password = hashing.hash_sync(password)
+    year, month = map(int, start.split("-"))
+    periods = []
+    for offset in range(months):
+        y, m = divmod(month - 1 + offset, 12)
+        first_day = datetime(year + y, m + 1, 1)
+        periods.append(
+            (
+                first_day,
+                models.month_bucket(first_day),
+                monthrange(first_day.year, first_day.month)[1] * 86_400,
+            )
+        )
+
+    counts = {"users": 0, "transactions": 0, "rewards": 0}
+    with bind.begin() as conn:
+        existing = dict(
+            conn.execute(select(models.Category.name, models.Category.id)).all()
+        )
+        missing = [name for name in weights if name not in existing]
+        if missing:
+            conn.execute(
+                insert(models.Category), [{"name": name} for name in missing]
+            )
+            existing = dict(
+                conn.execute(select(models.Category.name, models.Category.id)).all()
+            )
+        category_ids = [existing[name] for name in weights]
+        cum_weights = list(accumulate(weights.values()))
+        first_id = (conn.scalar(select(func.max(models.User.id))) or 0) + 1
+
+        user_rows, tx_rows, reward_rows, budget_rows = [], [], [], []
+
+        def flush():
+            for model, rows in (
+                (models.User, user_rows),
+                (models.Budget, budget_rows),
+                (models.Transaction, tx_rows),
+                (models.Reward, reward_rows),
+            ):
+                if rows:
+                    conn.execute(insert(model), rows)
+                    rows.clear()
+
+        for user_id in range(first_id, first_id + users):
+            points = 0
+            level = 0
+            for first_day, month_key, seconds in periods:
+                budget_rows.append(
+                    {"owner_id": user_id, "month": month_key, "limit": 100_000}
+                )
+                offsets = sorted(
+                    rng.randrange(seconds) for _ in range(transactions_per_month)
+                )
+                categories = rng.choices(
+                    category_ids, cum_weights=cum_weights, k=transactions_per_month
+                )
+                for index, offset in enumerate(offsets):
+                    timestamp = first_day + timedelta(seconds=offset)
+                    if index == 0:
+                        amount = rng.randrange(100_000, 500_000) / 100
+                        category_id = None
+                    else:
+                        amount = -rng.randrange(100, 20_000) / 100
+                        category_id = categories[index]
+                    tx_rows.append(
+                        {
+                            "owner_id": user_id,
+                            "amount": amount,
+                            "category_id": category_id,
+                            "timestamp": timestamp,
+                            "month": month_key,
+                        }
+                    )
+                    points += int(abs(amount))
+                    # Rewards as crud grants them, when the points cross a level
+                    while (
+                        level < len(crud.LEVEL_THRESHOLDS)
+                        and points >= crud.LEVEL_THRESHOLDS[level][1]
+                    ):
+                        reward_rows.append(
+                            {
+                                "owner_id": user_id,
+                                "level": crud.LEVEL_THRESHOLDS[level][0],
+                                "points": points,
+                                "timestamp": timestamp,
+                            }
+                        )
+                        level += 1
+            user_rows.append(
+                {
+                    "id": user_id,
+                    "email": f"load{user_id}@example.com",
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "is_admin": False,
+                    "points": points,
+                }
+            )
+            counts["users"] += 1
+            counts["transactions"] += len(periods) * transactions_per_month
+            counts["rewards"] += level
+            if len(tx_rows) >= batch_size:
+                flush()
+        flush()
+
+        rollups.rebuild(conn)
+    return counts
+
+
+def _parse_weights(text: str) -> dict:
+    """Parse ``"Comida=3,Transporte=1"`` into ``{"Comida": 3, "Transporte": 1}``."""
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -759,5 +930,34 @@ if __name__ == "__main__":
         action="store_true",
         help="Drop existing tables before seeding",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Generate synthetic load-test data instead of the demo data",
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--per-month", type=int, default=80)
+    parser.add_argument("--start", default="2024-01", help="First month, YYYY-MM")
+    parser.add_argument(
+        "--categories",
+        type=_parse_weights,
+        help='Category weights, e.g. "Comida=3,Transporte=1,Ocio=1"',
+    )
     args = parser.parse_args()
-    seed(reset=args.reset)
+    if args.bulk:
+        started = time.perf_counter()
+        created = seed_bulk(
+            args.users,
+            args.months,
+            args.per_month,
+            args.categories,
+            start=args.start,
+            reset=args.reset,
+        )
+        print(
+            ", ".join(f"{count} {table}" for table, count in created.items())
+            + f" in {time.perf_counter() - started:.1f}s"
+        )
+    else:
+        seed(reset=args.reset)
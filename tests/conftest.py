@@ -1,3 +1,7 @@
+import asyncio
+import hashlib
+import hmac
+import json
 import os
 import sys
 from pathlib import Path
@@ -7,14 +11,17 @@ from fastapi.testclient import TestClient
 
 # Ensure JWT signing key is present
 os.environ.setdefault("MOOLAH_SECRET_KEY", "test-secret")
+# WhatsApp webhook deliveries are signed with the app secret
+os.environ.setdefault("WHATSAPP_APP_SECRET", "test-app-secret")
 # Use a temporary SQLite database
 os.environ["DATABASE_URL"] = "sqlite:///./test.db"
 # Allow importing backend code
 sys.path.append(str(Path(__file__).resolve().parent.parent / "moolah_backend"))
 
 from app.main import app
-from app.database import Base, engine, SessionLocal
+from app.database import Base, engine, async_engine, SessionLocal
 from app import models
+from app.cache import category_cache, principal_cache, summary_cache
 
 
 @pytest.fixture
@@ -26,10 +33,17 @@ def client():
 def db_setup():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    category_cache.clear()
+    summary_cache.clear()
     yield
-    if os.path.exists("test.db"):
-        os.remove("test.db")
     engine.dispose()
+    if async_engine is not None:
+        asyncio.run(async_engine.dispose())
+    # SQLite runs in WAL mode, which keeps -wal/-shm files next to the db
+    for path in ("test.db", "test.db-wal", "test.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 
 @pytest.fixture
@@ -55,3 +69,22 @@ def auth_headers(client):
         return {"Authorization": f"Bearer {token}"}
 
     return _create_headers
+
+
+@pytest.fixture
+def post_webhook(client):
+    """Post a WhatsApp webhook payload signed like the Cloud API does."""
+
+    def _post(payload, secret=os.environ["WHATSAPP_APP_SECRET"]):
+        body = json.dumps(payload).encode()
+        digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return client.post(
+            "/whatsapp",
+            content=body,
+            headers={
+                "content-type": "application/json",
+                "x-hub-signature-256": f"sha256={digest}",
+            },
+        )
+
+    return _post
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from app.database import SessionLocal
@@ -60,3 +61,275 @@ def test_category_summary(client, db_setup, auth_headers):
         "Travel": 5.05,
         "Uncategorized": 7.7,
     }
+
+
+def test_category_summary_for_month(client, db_setup, auth_headers):
+    headers = auth_headers()
+
+    resp1 = client.post("/transactions/", json={"amount": -12.5}, headers=headers)
+    resp2 = client.post("/transactions/", json={"amount": -7.5}, headers=headers)
+    _set_timestamp(resp1.json()["id"], datetime(2023, 12, 31, 23, 59))
+    _set_timestamp(resp2.json()["id"], datetime(2024, 1, 1))
+
+    resp = client.get("/summary/category?month=2023-12", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json() == [{"category": "Uncategorized", "total": -12.5}]
+
+    resp = client.get("/summary/category?month=2023-13", headers=headers)
+    assert resp.status_code == 400
+
+
+def test_summary_cross_tab_granularity_and_cache(client, db_setup, auth_headers):
+    headers = auth_headers(is_admin=True)
+    food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+
+    rows = [
+        (-10, food["id"], datetime(2024, 3, 4, 9)),  # Monday
+        (-5, food["id"], datetime(2024, 3, 10, 20)),  # Sunday, same week
+        (100, None, datetime(2024, 3, 11)),  # next Monday
+        (-1, None, datetime(2024, 4, 1)),
+    ]
+    for amount, category_id, ts in rows:
+        tx = client.post(
+            "/transactions/",
+            json={"amount": amount, "category_id": category_id},
+            headers=headers,
+        ).json()
+        _set_timestamp(tx["id"], ts)
+
+    resp = client.get("/summary?granularity=month&by_category=true", headers=headers)
+    data = [
+        (r["period"], r["category"], r["total"], r["income"], r["expense"])
+        for r in resp.json()
+    ]
+    assert data == [
+        ("2024-03", "Uncategorized", 100.0, 100.0, 0.0),
+        ("2024-03", "Food", -15.0, 0.0, -15.0),
+        ("2024-04", "Uncategorized", -1.0, 0.0, -1.0),
+    ]
+
+    resp = client.get(
+        "/summary?granularity=week&end=2024-04-01T00:00:00", headers=headers
+    )
+    assert [(r["period"], r["total"]) for r in resp.json()] == [
+        ("2024-03-04", -15.0),
+        ("2024-03-11", 100.0),
+    ]
+
+    daily = "/summary?granularity=day&start=2024-03-10&end=2024-03-12"
+    resp = client.get(daily, headers=headers)
+    assert [(r["period"], r["total"]) for r in resp.json()] == [
+        ("2024-03-10", -5.0),
+        ("2024-03-11", 100.0),
+    ]
+
+    # Served from the per-user cache until the next transaction write
+    before = client.get("/metrics/cache", headers=headers).json()["summary"]
+    client.get(daily, headers=headers)
+    after = client.get("/metrics/cache", headers=headers).json()["summary"]
+    assert after["hits"] == before["hits"] + 1
+
+    client.post("/transactions/", json={"amount": 7}, headers=headers)
+    totals = client.get("/summary", headers=headers).json()
+    assert totals == [{"total": 91.0, "income": 107.0, "expense": -16.0}]
+
+
+def test_rollups_match_raw_transactions(client, db_setup, auth_headers):
+    from app import crud
+
+    headers = auth_headers(is_admin=True)
+    food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+    ids = [
+        client.post(
+            "/transactions/",
+            json={"amount": amount, "category_id": category_id},
+            headers=headers,
+        ).json()["id"]
+        for amount, category_id in [(-10, food["id"]), (40, None), (-3, None)]
+    ]
+    _set_timestamp(ids[0], datetime(2024, 2, 28, 23))
+    client.put(
+        f"/transactions/{ids[1]}",
+        json={"amount": 50, "category_id": food["id"]},
+        headers=headers,
+    )
+    client.delete(f"/transactions/{ids[2]}", headers=headers)
+    client.post(
+        "/transactions/bulk",
+        json=[{"amount": -7, "timestamp": "2024-03-01T08:00:00"}],
+        headers=headers,
+    )
+
+    db = SessionLocal()
+    user_id = db.query(models.User.id).filter_by(email="user@example.com").scalar()
+    for granularity in (None, "day", "week", "month"):
+        for by_category in (False, True):
+            for start, end in [
+                (None, None),
+                (datetime(2024, 2, 1), datetime(2024, 3, 1)),
+                (datetime(2024, 2, 28), None),
+            ]:
+                args = (db, user_id, granularity, by_category, start, end)
+                expected = crud.summary_from_transactions(*args)
+                assert expected
+                assert crud.summary_from_rollups(*args) == expected
+
+    assert crud.rebuild_rollups(db, fix=False) == []
+    # The deleted transaction leaves an empty row until compaction
+    assert db.query(models.DailyRollup).filter_by(count=0).count() == 1
+    crud.rebuild_rollups(db)
+    assert db.query(models.DailyRollup).filter_by(count=0).count() == 0
+    db.close()
+
+
+def test_spending_trends_and_forecast(client, db_setup, auth_headers):
+    from app import crud
+
+    headers = auth_headers(is_admin=True)
+    food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+    for amount, category_id, ts in [
+        (-10, food["id"], datetime(2024, 1, 5)),
+        (100, None, datetime(2024, 1, 6)),
+        (-30, None, datetime(2024, 3, 2)),
+        (-6, food["id"], datetime(2024, 3, 10)),
+    ]:
+        tx = client.post(
+            "/transactions/",
+            json={"amount": amount, "category_id": category_id},
+            headers=headers,
+        ).json()
+        _set_timestamp(tx["id"], ts)
+    client.post("/budgets/", json={"month": "2024-03", "limit": 50}, headers=headers)
+
+    db = SessionLocal()
+    user_id = db.query(models.User.id).filter_by(email="user@example.com").scalar()
+    points = crud.get_spending_trends(
+        db, user_id, months=3, window=2, now=datetime(2024, 3, 15)
+    )
+    assert [
+        (p["month"], float(p["spent"]), float(p["moving_average"]), p["change_pct"])
+        for p in points
+    ] == [
+        ("2024-01", 10.0, 10.0, None),
+        ("2024-02", 0.0, 5.0, -100.0),
+        ("2024-03", 36.0, 18.0, None),
+    ]
+    by_category = crud.get_spending_trends(
+        db, user_id, months=3, window=2, by_category=True, now=datetime(2024, 3, 15)
+    )
+    food_march = [
+        p for p in by_category if p["category"] == "Food" and p["month"] == "2024-03"
+    ]
+    assert float(food_march[0]["change"]) == 6.0  # February had no spend
+
+    forecast = crud.get_month_forecast(
+        db, user_id, "2024-03", now=datetime(2024, 3, 16)
+    )
+    db.close()
+    assert forecast["days_elapsed"] == 15
+    assert float(forecast["projected"]) == 74.4
+    assert forecast["projected_over_budget"] is True
+    assert {c["category"]: float(c["projected"]) for c in forecast["categories"]} == {
+        "Uncategorized": 62.0,
+        "Food": 12.4,
+    }
+
+    resp = client.get("/analytics/forecast?month=2024-03", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["spent"] == 36.0
+    resp = client.get("/analytics/trends?months=2&by_category=true", headers=headers)
+    assert resp.status_code == 200
+
+
+def test_admin_reports(client, db_setup, auth_headers):
+    admin = auth_headers(email="admin@example.com", is_admin=True)
+    user = auth_headers(email="user@example.com")
+    food = client.post("/categories/", json={"name": "Food"}, headers=admin).json()
+
+    jan = client.post(
+        "/transactions/", json={"amount": -10, "category_id": food["id"]}, headers=user
+    ).json()
+    _set_timestamp(jan["id"], datetime(2024, 1, 5))
+    for headers in (admin, user):
+        client.post(
+            "/transactions/",
+            json={"amount": -5.5, "category_id": food["id"]},
+            headers=headers,
+        )
+        tx = client.post("/transactions/", json={"amount": 20}, headers=headers)
+        _set_timestamp(tx.json()["id"], datetime(2024, 2, 1))
+    db = SessionLocal()
+    db.add(models.Reward(level="Bronze", points=100, owner_id=2))
+    db.add(models.Reward(level="Silver", points=500, owner_id=2))
+    db.commit()
+    db.close()
+
+    assert client.get("/admin/reports", headers=user).status_code == 403
+    resp = client.get("/admin/reports/reward_levels", headers=admin)
+    assert resp.status_code == 404
+    assert client.get("/admin/reports/unknown", headers=admin).status_code == 404
+
+    resp = client.post("/admin/reports/refresh", headers=admin)
+    assert resp.status_code == 200
+    assert [r["name"] for r in resp.json()] == [
+        "active_users_by_month",
+        "reward_levels",
+        "spend_by_category",
+    ]
+
+    reports = {
+        name: client.get(f"/admin/reports/{name}", headers=admin).json()["data"]
+        for name in ("spend_by_category", "active_users_by_month", "reward_levels")
+    }
+    assert reports["spend_by_category"] == [
+        {"category": "Food", "income": 0.0, "expense": -21.0, "transactions": 3},
+        {
+            "category": "Uncategorized",
+            "income": 40.0,
+            "expense": 0.0,
+            "transactions": 2,
+        },
+    ]
+    this_month = datetime.utcnow().strftime("%Y-%m")
+    assert reports["active_users_by_month"] == [
+        {"month": "2024-01", "active_users": 1},
+        {"month": "2024-02", "active_users": 2},
+        {"month": this_month, "active_users": 2},
+    ]
+    assert reports["reward_levels"] == [
+        {"level": None, "users": 1},
+        {"level": "Bronze", "users": 0},
+        {"level": "Silver", "users": 1},
+        {"level": "Gold", "users": 0},
+    ]
+
+    # One user per chunk merges to the same result
+    from app import reports as report_module
+
+    db = SessionLocal()
+    for name, build in report_module.REPORTS.items():
+        assert json.loads(json.dumps(build(db, 1), default=float)) == reports[name]
+    # Fresh reports are not rebuilt by the schedule
+    assert report_module.refresh(db, max_age=3600) == []
+    db.close()
+
+
+def test_summary_cache_sees_writes_from_other_workers(client, db_setup, auth_headers):
+    from app import crud
+
+    headers = auth_headers()
+    client.post("/transactions/", json={"amount": -10}, headers=headers)
+    resp = client.get("/summary?granularity=month", headers=headers)
+    assert [r["total"] for r in resp.json()] == [-10.0]
+
+    # Another worker's write: committed with its version bump, but this
+    # process' cache entry is never dropped
+    db = SessionLocal()
+    user_id = crud.get_user_by_email(db, "user@example.com").id
+    db.add(models.Transaction(amount=-5, owner_id=user_id))
+    crud.bump_versions(db, "transactions", [user_id])
+    db.commit()
+    db.close()
+
+    resp = client.get("/summary?granularity=month", headers=headers)
+    assert [r["total"] for r in resp.json()] == [-15.0]
@@ -1,3 +1,4 @@
+from app.database import engine
 
 
 def test_create_user_ignores_is_admin_flag(client, db_setup):
@@ -29,3 +30,102 @@ def test_token_wrong_credentials_returns_401(client, db_setup):
 def test_users_me_requires_authorization(client, db_setup):
     resp = client.get("/users/me/")
     assert resp.status_code == 401
+
+
+def test_principal_cache_hits_and_invalidation(client, db_setup, auth_headers):
+    headers = auth_headers()
+    admin_headers = auth_headers("admin@example.com", is_admin=True)
+
+    client.get("/users/me/", headers=headers)
+    client.get("/users/me/", headers=headers)
+    stats = client.get("/metrics/cache", headers=admin_headers).json()["principal"]
+    assert stats["misses"] == 2  # user and admin resolved once each
+    assert stats["hits"] == 1
+
+    # Points changes drop the cached principal
+    client.post("/transactions/", json={"amount": 25.0}, headers=headers)
+    assert client.get("/users/me/", headers=headers).json()["points"] == 25
+
+    resp = client.get("/metrics/cache", headers=headers)
+    assert resp.status_code == 403
+
+
+def test_pool_metrics_and_sqlite_pragmas(client, db_setup, auth_headers):
+    admin_headers = auth_headers("admin@example.com", is_admin=True)
+
+    resp = client.get("/metrics/pool", headers=admin_headers)
+    assert resp.status_code == 200
+    stats = resp.json()["sync"]
+    assert stats["checked_out"] >= 0
+    assert stats["wait_count"] > 0
+
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+    assert journal_mode == "wal"
+    assert busy_timeout == 5000
+
+
+def _login(client, email="user@example.com", password="secret"):
+    return client.post(
+        "/token",
+        data={"username": email, "password": password},
+        headers={"content-type": "application/x-www-form-urlencoded"},
+    )
+
+
+def test_refresh_token_issues_new_pair(client, db_setup):
+    client.post("/users/", json={"email": "user@example.com", "password": "secret"})
+    tokens = _login(client).json()
+    refresh_token = tokens["refresh_token"]
+
+    # A refresh token is not a bearer token and vice versa
+    resp = client.get(
+        "/users/me/", headers={"Authorization": f"Bearer {refresh_token}"}
+    )
+    assert resp.status_code == 401
+    resp = client.post(
+        "/token/refresh", json={"refresh_token": tokens["access_token"]}
+    )
+    assert resp.status_code == 401
+
+    resp = client.post("/token/refresh", json={"refresh_token": refresh_token})
+    assert resp.status_code == 200
+    access_token = resp.json()["access_token"]
+    me = client.get("/users/me/", headers={"Authorization": f"Bearer {access_token}"})
+    assert me.json()["email"] == "user@example.com"
+
+
+def test_login_rehashes_password_when_cost_changes(client, db_setup, monkeypatch):
+    from app import models
+    from app.database import SessionLocal
+    from app.hashing import hashing_pool
+
+    monkeypatch.setattr(hashing_pool, "rounds", 5)
+    client.post("/users/", json={"email": "user@example.com", "password": "secret"})
+    monkeypatch.setattr(hashing_pool, "rounds", 4)
+    assert _login(client).status_code == 200
+
+    db = SessionLocal()
+    user = db.query(models.User).filter_by(email="user@example.com").one()
+    assert user.hashed_password.startswith("$2b$04$")
+    db.close()
+    assert _login(client).status_code == 200
+
+
+def test_hashing_pool_rejects_when_full():
+    import asyncio
+
+    from app.hashing import HashingBusyError, HashingPool
+
+    pool = HashingPool(workers=0, queue_size=0, rounds=4)
+
+    async def scenario():
+        return await asyncio.gather(
+            pool.hash("a"), pool.hash("b"), return_exceptions=True
+        )
+
+    first, second = asyncio.run(scenario())
+    assert first.startswith("$2b$04$")
+    assert isinstance(second, HashingBusyError)
+    assert pool.stats()["rejected"] == 1
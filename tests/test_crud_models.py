@@ -183,3 +183,47 @@ def test_reward_after_goal_completion(client, db_setup, auth_headers):
     progress = client.get("/rewards/", headers=headers).json()
     assert progress["points"] == 120
     assert any(r["level"] == "Bronze" for r in progress["rewards"])
+
+
+def test_category_and_rewards_etags(client, db_setup, auth_headers):
+    admin_headers = auth_headers("admin@example.com", is_admin=True)
+    headers = auth_headers()
+
+    etag = client.get("/categories/", headers=headers).headers["etag"]
+    resp = client.get("/categories/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    # Categories are shared, so an admin's change reaches every user
+    client.post("/categories/", json={"name": "Food"}, headers=admin_headers)
+    resp = client.get("/categories/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert [c["name"] for c in resp.json()] == ["Food"]
+
+    etag = client.get("/rewards/", headers=headers).headers["etag"]
+    client.post("/transactions/", json={"amount": 10}, headers=headers)
+    # New points change the body before any reward is granted
+    resp = client.get("/rewards/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["points"] == 10
+    resp = client.get(
+        "/rewards/",
+        headers={**headers, "If-None-Match": f'"x", {resp.headers["etag"]}'},
+    )
+    assert resp.status_code == 304
+
+
+def test_rewards_read_points_past_the_principal_cache(client, db_setup, auth_headers):
+    from app import models
+    from app.database import SessionLocal
+
+    headers = auth_headers()
+    etag = client.get("/rewards/", headers=headers).headers["etag"]
+    # Another worker records points; this worker's cached principal is stale
+    db = SessionLocal()
+    db.query(models.User).update({models.User.points: 42})
+    db.commit()
+    db.close()
+
+    resp = client.get("/rewards/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["points"] == 42
+    assert resp.headers["etag"] != etag
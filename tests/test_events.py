@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime
+
+from app import crud, events, models, schemas
+from app.database import SessionLocal
+
+
+def test_hub_fans_out_with_bounded_buffers():
+    async def scenario():
+        hub = events.EventHub(buffer_size=2)
+        first = hub.subscribe(["user:1"])
+        second = hub.subscribe(["user:1", "user:3"])
+        for i in range(3):
+            hub.dispatch("user:1", {"type": "t", "data": i})
+        hub.dispatch("user:2", {"type": "t", "data": "other"})
+
+        received = [(await first.get(0.1))["data"] for _ in range(2)]
+        assert received == [1, 2]  # oldest event dropped for the slow reader
+        assert first.dropped == 1
+        assert await first.get(0.01) is None
+        assert hub.stats()["subscribers"] == 2
+
+        hub.unsubscribe(first)
+        hub.unsubscribe(second)
+        assert hub.stats() == {
+            "subscribers": 0,
+            "channels": 0,
+            "published": 4,
+            "dropped": 2,
+        }
+
+    asyncio.run(scenario())
+
+
+def test_committed_changes_are_published(db_setup):
+    db = SessionLocal()
+    user = models.User(email="events@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    def write():
+        session = SessionLocal()
+        try:
+            crud.create_budget(
+                session, schemas.BudgetCreate(month="2024-01", limit=10), user_id
+            )
+            crud.create_transaction(
+                session, schemas.TransactionCreate(amount=150), user_id
+            )
+        finally:
+            session.close()
+
+    async def scenario():
+        subscription = events.hub.subscribe([events.user_channel(user_id)])
+        try:
+            await asyncio.to_thread(write)
+            received = []
+            while (event := await subscription.get(0.5)) is not None:
+                received.append(event)
+            return received
+        finally:
+            events.hub.unsubscribe(subscription)
+
+    received = asyncio.run(scenario())
+    assert [e["type"] for e in received] == [
+        "budget.created",
+        "transaction.created",
+        "reward.granted",
+    ]
+    assert received[1]["data"]["amount"] == 150.0
+    assert received[2]["data"]["level"] == "Bronze"
+
+
+def test_whatsapp_messages_reach_only_the_sender(db_setup):
+    db = SessionLocal()
+    owner = models.User(email="owner@example.com", phone_number="1111")
+    other = models.User(email="other@example.com")
+    db.add_all([owner, other])
+    db.commit()
+    owner_id, other_id = owner.id, other.id
+    db.close()
+
+    def receive():
+        session = SessionLocal()
+        try:
+            crud.create_whatsapp_messages(
+                session,
+                [
+                    schemas.WhatsAppMessageCreate(
+                        id=f"wamid.EV{i}",
+                        body="hola",
+                        timestamp=datetime(2024, 1, 1),
+                        **{"from": sender},
+                    )
+                    for i, sender in enumerate(["1111", "2222"])
+                ],
+            )
+        finally:
+            session.close()
+
+    async def scenario():
+        mine = events.hub.subscribe([events.user_channel(owner_id)])
+        theirs = events.hub.subscribe([events.user_channel(other_id)])
+        try:
+            await asyncio.to_thread(receive)
+            received = []
+            while (event := await mine.get(0.5)) is not None:
+                received.append(event)
+            return received, await theirs.get(0.1)
+        finally:
+            events.hub.unsubscribe(mine)
+            events.hub.unsubscribe(theirs)
+
+    received, leaked = asyncio.run(scenario())
+    assert [(e["type"], e["data"]["from"]) for e in received] == [
+        ("whatsapp.message", "1111")
+    ]
+    assert leaked is None
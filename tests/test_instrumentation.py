@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import re
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from app import instrumentation, monitoring
+
+
+def _db_timing(resp):
+    match = re.search(
+        r'db;dur=([\d.]+);desc="(\d+) queries, (\d+) rows", app;dur=([\d.]+)',
+        resp.headers["server-timing"],
+    )
+    assert match is not None
+    return int(match[2]), int(match[3])
+
+
+def test_server_timing_counts_queries(client, db_setup, auth_headers):
+    headers = auth_headers()
+    for amount in (1, 2, 3):
+        client.post("/transactions/", json={"amount": amount}, headers=headers)
+
+    resp = client.get("/transactions/", headers=headers)
+    assert resp.status_code == 200
+    queries, rows = _db_timing(resp)
+    assert queries >= 1
+    assert rows == 3
+
+    # Queries of one request do not leak into the next: the user lookup, the
+    # collection version and the (empty) category list
+    resp = client.get("/categories/", headers=headers)
+    assert _db_timing(resp) == (3, 1)
+
+
+def test_slow_request_log_lists_statements(
+    client, db_setup, auth_headers, monkeypatch, caplog
+):
+    headers = auth_headers()
+    monkeypatch.setattr(instrumentation, "SLOW_REQUEST_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+        client.post("/transactions/", json={"amount": 5}, headers=headers)
+    record = caplog.records[-1].getMessage()
+    assert record.startswith("Slow request POST /transactions/ -> 200")
+    assert "INSERT INTO transactions" in record
+
+
+def test_profile_header_for_admins_only(client, db_setup, auth_headers):
+    admin = auth_headers(email="admin@example.com", is_admin=True)
+    user = auth_headers(email="user@example.com")
+
+    resp = client.get("/budgets/", headers={**user, "X-Profile": "1"})
+    assert resp.headers["content-type"].startswith("application/json")
+
+    resp = client.get("/budgets/", headers={**admin, "X-Profile": "1"})
+    assert resp.status_code == 200
+    assert resp.headers["x-profiled-status"] == "200"
+    assert resp.text.startswith("GET /budgets/ -> 200:")
+    assert "# folded stacks" in resp.text
+
+
+def _metric(client, name, **labels):
+    text = client.get("/metrics").text
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name == name and sample.labels == labels:
+                return sample.value
+    return 0.0
+
+
+def test_prometheus_metrics(client, db_setup, auth_headers):
+    headers = auth_headers()
+    month = datetime.utcnow().strftime("%Y-%m")
+    client.post("/budgets/", json={"month": month, "limit": 50}, headers=headers)
+    created = _metric(client, "moolah_transactions_created_total", source="api")
+    rejected = _metric(client, "moolah_budget_rejections_total")
+    requests = _metric(
+        client,
+        "moolah_http_requests_total",
+        method="GET",
+        route="/transactions/{transaction_id}",
+        status="405",
+    )
+
+    client.post("/transactions/", json={"amount": -20}, headers=headers)
+    client.post("/transactions/", json={"amount": -40}, headers=headers)
+    client.get("/transactions/1", headers=headers)
+
+    assert (
+        _metric(client, "moolah_transactions_created_total", source="api")
+        == created + 1
+    )
+    assert _metric(client, "moolah_budget_rejections_total") == rejected + 1
+    # Requests are labelled with the route template, not the raw path
+    assert (
+        _metric(
+            client,
+            "moolah_http_requests_total",
+            method="GET",
+            route="/transactions/{transaction_id}",
+            status="405",
+        )
+        == requests + 1
+    )
+    assert _metric(client, "moolah_db_query_duration_seconds_count") > 0
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    backend = Path(__file__).resolve().parent.parent / "moolah_backend"
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    increment = (
+        "from app import monitoring; "
+        "monitoring.TRANSACTIONS_CREATED.labels('api').inc(2)"
+    )
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, "-c", increment], cwd=backend, env=env, check=True
+        )
+    render = "from app import monitoring; print(monitoring.render()[0].decode())"
+    output = subprocess.run(
+        [sys.executable, "-c", render],
+        cwd=backend,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert 'moolah_transactions_created_total{source="api"} 4.0' in output
+
+
+def test_streams_are_timed_to_the_first_chunk(monkeypatch, caplog):
+    in_progress = []
+
+    async def stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"a", "more_body": True})
+        in_progress.append(monitoring.HTTP_IN_PROGRESS._value.get())
+        # A client reading slowly, like an open /events stream
+        await asyncio.sleep(0.2)
+        await send({"type": "http.response.body", "body": b""})
+
+    async def discard(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/stream", "headers": []}
+    before = monitoring.HTTP_IN_PROGRESS._value.get()
+    monkeypatch.setattr(instrumentation, "SLOW_REQUEST_MS", 100)
+    middleware = instrumentation.InstrumentationMiddleware(stream)
+    with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+        asyncio.run(middleware(scope, None, discard))
+
+    assert in_progress == [before]
+    assert monitoring.HTTP_IN_PROGRESS._value.get() == before
+    assert not [r for r in caplog.records if r.getMessage().startswith("Slow")]
+
+
+def test_failed_statements_do_not_leak_start_times():
+    engine = create_engine("sqlite://")
+    instrumentation.instrument_engine(engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("INSERT INTO t VALUES (1)")
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                conn.exec_driver_sql("INSERT INTO t VALUES (1)")
+        assert conn.info["query_started"] == []
+    engine.dispose()
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrations import MIGRATIONS, run_migrations
+
+
+def test_migrations_add_indexes_to_existing_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # Schema as created by earlier releases: no composite indexes
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE transactions (id INTEGER PRIMARY KEY, "
+                "amount NUMERIC(10, 2), timestamp DATETIME, owner_id INTEGER, "
+                "category_id INTEGER)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO transactions (amount, timestamp, owner_id) "
+                "VALUES (-5, '2023-03-04 10:00:00.000000', 1)"
+            )
+        )
+
+    assert run_migrations(engine) == len(MIGRATIONS)
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("transactions")}
+    assert "ix_transactions_owner_timestamp" in index_names
+    assert "ix_transactions_owner_category_timestamp" in index_names
+    assert "ix_transactions_owner_month" in index_names
+    with engine.connect() as conn:
+        month = conn.execute(text("SELECT month FROM transactions")).scalar()
+    assert month == "2023-03"
+    with engine.connect() as conn:
+        rollup = conn.execute(
+            text("SELECT day, expense, count FROM daily_rollup")
+        ).one()
+    assert tuple(rollup) == ("2023-03-04", -5, 1)
+    with engine.connect() as conn:
+        spend = conn.execute(
+            text("SELECT owner_id, month, expense FROM monthly_rollup")
+        ).one()
+    # Budget checks of upgraded databases see the existing expenses
+    assert tuple(spend) == (1, "2023-03", -5)
+    assert inspect(engine).has_table("users")
+    assert inspect(engine).has_table("phone_verifications")
+    wa_indexes = {
+        ix["name"] for ix in inspect(engine).get_indexes("whatsapp_messages")
+    }
+    assert "ix_whatsapp_messages_from_id" in wa_indexes
+
+    # Running again is a no-op
+    assert run_migrations(engine) == len(MIGRATIONS)
+    engine.dispose()
+
+
+def test_concurrent_workers_apply_migrations_once(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    # One engine per "worker", as separate uvicorn processes would have
+    engines = [create_engine(url) for _ in range(4)]
+    with engines[0].connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    with ThreadPoolExecutor(len(engines)) as pool:
+        versions = list(pool.map(run_migrations, engines))
+
+    assert versions == [len(MIGRATIONS)] * len(engines)
+    with engines[0].connect() as conn:
+        rows = conn.execute(text("SELECT version FROM schema_version")).all()
+    assert rows == [(len(MIGRATIONS),)]
+    for engine in engines:
+        engine.dispose()
@@ -1,4 +1,12 @@
+import io
+import json
 from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import crud, models
+from app.database import SessionLocal
 
 
 def test_over_limit_transaction_not_persisted(client, db_setup, auth_headers):
@@ -79,3 +87,265 @@ def test_points_after_edit(client, db_setup, auth_headers):
 
     progress = client.get("/rewards/", headers=headers).json()
     assert progress["points"] == 50
+
+
+def test_cursor_pagination(client, db_setup, auth_headers):
+    headers = auth_headers()
+
+    for amount in (1.0, 2.0, 3.0, 4.0, 5.0):
+        client.post("/transactions/", json={"amount": amount}, headers=headers)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/transactions/", params=params, headers=headers)
+        assert resp.status_code == 200
+        seen.extend(tx["amount"] for tx in resp.json())
+        pages += 1
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert seen == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+    bad = client.get("/transactions/", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert bad.status_code == 400
+
+
+def test_stream_transactions_ndjson(client, db_setup, auth_headers):
+    headers = auth_headers()
+
+    for amount in (10.5, -2.25):
+        client.post("/transactions/", json={"amount": amount}, headers=headers)
+
+    resp = client.get(
+        "/transactions/",
+        headers={**headers, "Accept": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["amount"] for row in rows] == [10.5, -2.25]
+
+
+def test_month_spend_from_rollup_consistent(client, db_setup, auth_headers):
+    headers = auth_headers()
+    month = datetime.utcnow().strftime("%Y-%m")
+    client.post("/budgets/", json={"month": month, "limit": 100.0}, headers=headers)
+
+    first = client.post("/transactions/", json={"amount": -40.0}, headers=headers)
+    second = client.post("/transactions/", json={"amount": -30.0}, headers=headers)
+    client.post("/transactions/", json={"amount": 500.0}, headers=headers)
+
+    # Freed budget from an edit and a delete is available again
+    client.put(
+        f"/transactions/{first.json()['id']}", json={"amount": -10.0}, headers=headers
+    )
+    client.delete(f"/transactions/{second.json()['id']}", headers=headers)
+    resp = client.post("/transactions/", json={"amount": -85.0}, headers=headers)
+    assert resp.status_code == 200
+    resp = client.post("/transactions/", json={"amount": -10.0}, headers=headers)
+    assert resp.status_code == 400
+
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.User.id).scalar()
+        assert crud.get_month_spent(db, user_id, month) == Decimal("95")
+        assert crud.rebuild_rollups(db, fix=False) == []
+
+        # ORM writes outside crud reach the budget check through the rollups
+        db.add(models.Transaction(amount=Decimal("-5"), owner_id=user_id))
+        db.commit()
+        assert crud.get_month_spent(db, user_id, month) == Decimal("100")
+
+        row = db.query(models.MonthlyRollup).first()
+        row.expense = Decimal("-1")
+        db.commit()
+        mismatches = crud.rebuild_rollups(db)
+        assert len(mismatches) == 1
+        assert mismatches[0]["expected"][1] == Decimal("-100")
+        assert crud.rebuild_rollups(db, fix=False) == []
+    finally:
+        db.close()
+
+
+def test_bulk_import_json_and_csv(client, db_setup, auth_headers):
+    headers = auth_headers()
+    client.post("/budgets/", json={"month": "2023-05", "limit": 100.0}, headers=headers)
+
+    resp = client.post(
+        "/transactions/bulk",
+        json=[
+            {"amount": -60, "timestamp": "2023-05-02T10:00:00"},
+            {"amount": -50, "timestamp": "2023-05-03T10:00:00"},
+            {"amount": "abc"},
+            {"amount": 200, "timestamp": "2023-06-01T00:00:00"},
+            {"amount": -5, "category_id": 999},
+        ],
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["created"] == 2
+    statuses = [(r["status"], r.get("error")) for r in data["results"]]
+    assert statuses[0] == ("created", None)
+    assert statuses[1] == ("rejected", "Budget exceeded")
+    assert statuses[2][0] == "invalid"
+    assert statuses[3] == ("created", None)
+    assert statuses[4] == ("rejected", "Category not found")
+
+    csv_body = "amount,category_id,timestamp\n-40,,2023-05-20T08:00:00\n-1,,2023-05-21\n"
+    resp = client.post(
+        "/transactions/bulk",
+        content=csv_body,
+        headers={**headers, "content-type": "text/csv"},
+    )
+    assert [r["status"] for r in resp.json()["results"]] == ["created", "rejected"]
+
+    progress = client.get("/rewards/", headers=headers).json()
+    assert progress["points"] == 300
+    assert [r["level"] for r in progress["rewards"]] == ["Bronze"]
+
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.User.id).scalar()
+        assert crud.get_month_spent(db, user_id, "2023-05") == Decimal("100")
+        assert crud.rebuild_rollups(db, fix=False) == []
+    finally:
+        db.close()
+
+
+def test_bulk_import_rejects_bad_bodies(client, db_setup, auth_headers, monkeypatch):
+    from app.routers import transactions
+
+    headers = auth_headers()
+    csv_headers = {**headers, "content-type": "text/csv"}
+    resp = client.post("/transactions/bulk", content=b"\xff\xfe-1", headers=csv_headers)
+    assert resp.status_code == 400
+    for body in (b'{"amount": 1}', b"[1, 2", b"[1] 2", b"[1 2]"):
+        resp = client.post("/transactions/bulk", content=body, headers=headers)
+        assert resp.status_code == 400
+
+    # An out-of-range amount only invalidates its own row
+    resp = client.post(
+        "/transactions/bulk",
+        json=[{"amount": 1}, {"amount": 10**20}, {"amount": 2}],
+        headers=headers,
+    )
+    assert [r["status"] for r in resp.json()["results"]] == [
+        "created",
+        "invalid",
+        "created",
+    ]
+
+    monkeypatch.setattr(transactions, "MAX_BULK_ROWS", 2)
+    resp = client.post("/transactions/bulk", json=[{"amount": 1}] * 3, headers=headers)
+    assert resp.status_code == 413
+    resp = client.post(
+        "/transactions/bulk", content="amount\n1\n2\n3\n", headers=csv_headers
+    )
+    assert resp.status_code == 413
+    resp = client.post("/transactions/bulk", json=[], headers=headers)
+    assert resp.json()["results"] == []
+
+
+def test_export_transactions(client, db_setup, auth_headers, monkeypatch):
+    admin = auth_headers(email="admin@example.com", is_admin=True)
+    headers = auth_headers()
+    food = client.post("/categories/", json={"name": "Food"}, headers=admin).json()
+    client.post(
+        "/transactions/",
+        json={"amount": -12.5, "category_id": food["id"]},
+        headers=headers,
+    )
+    client.post("/transactions/", json={"amount": 100}, headers=headers)
+    client.post("/transactions/", json={"amount": 7}, headers=admin)
+
+    resp = client.get(
+        "/export/transactions",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    lines = resp.text.splitlines()
+    assert lines[0] == "id,timestamp,amount,category_id,category"
+    assert [line.split(",")[2:] for line in lines[1:]] == [
+        ["-12.50", str(food["id"]), "Food"],
+        ["100.00", "", ""],
+    ]
+
+    # Small batches stream the same rows
+    monkeypatch.setattr(
+        crud.iter_transaction_export, "__kwdefaults__", {"batch_size": 1}
+    )
+    resp = client.get("/export/transactions?format=ndjson", headers=headers)
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [(r["amount"], r["category"]) for r in rows] == [
+        (-12.5, "Food"),
+        (100.0, None),
+    ]
+
+    resp = client.get("/export/transactions?user_id=2", headers=admin)
+    assert len(resp.text.splitlines()) == 3
+    resp = client.get("/export/transactions?user_id=1", headers=headers)
+    assert resp.status_code == 403
+    resp = client.get("/export/transactions?format=xml", headers=headers)
+    assert resp.status_code == 422
+
+
+def test_export_transactions_parquet(client, db_setup, auth_headers):
+    pq = pytest.importorskip("pyarrow.parquet")
+    headers = auth_headers()
+    for amount in (-3.25, 8):
+        client.post("/transactions/", json={"amount": amount}, headers=headers)
+
+    resp = client.get("/export/transactions?format=parquet", headers=headers)
+    assert resp.status_code == 200
+    table = pq.read_table(io.BytesIO(resp.content))
+    assert table.column_names == [
+        "id",
+        "timestamp",
+        "amount",
+        "category_id",
+        "category",
+    ]
+    assert table.column("amount").to_pylist() == [Decimal("-3.25"), Decimal("8.00")]
+
+
+def test_list_transactions_etag(client, db_setup, auth_headers):
+    headers = auth_headers()
+    other = auth_headers("other@example.com")
+    client.post("/transactions/", json={"amount": 10}, headers=headers)
+
+    resp = client.get("/transactions/", headers=headers)
+    etag = resp.headers["etag"]
+    assert resp.headers["cache-control"] == "private, no-cache"
+
+    resp = client.get("/transactions/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+    # The 304 only needs the version lookup, no transaction is loaded
+    assert 'desc="1 queries, 0 rows"' in resp.headers["server-timing"]
+
+    # Another page of the same collection has its own tag
+    resp = client.get(
+        "/transactions/?limit=1", headers={**headers, "If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+
+    # Other users' writes leave the tag alone, the owner's own writes change it
+    client.post("/transactions/", json={"amount": 5}, headers=other)
+    resp = client.get("/transactions/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    client.post("/transactions/", json={"amount": 5}, headers=headers)
+    resp = client.get("/transactions/", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert len(resp.json()) == 2
+    assert resp.headers["etag"] != etag
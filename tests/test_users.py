@@ -26,3 +26,23 @@ def test_get_current_user(client, db_setup):
     assert data["is_admin"] is False
     assert data["is_active"] is True
     assert data["points"] == 0
+
+
+def test_users_me_expand(client, db_setup, auth_headers):
+    headers = auth_headers()
+    client.post("/transactions/", json={"amount": 150.0}, headers=headers)
+
+    slim = client.get("/users/me/", headers=headers).json()
+    assert slim["points"] == 150
+    assert "transactions" not in slim
+    assert "rewards" not in slim
+
+    resp = client.get("/users/me/?expand=rewards,transactions", headers=headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [r["level"] for r in data["rewards"]] == ["Bronze"]
+    assert data["transactions"][0]["amount"] == 150.0
+    assert "goals" not in data
+
+    bad = client.get("/users/me/?expand=password", headers=headers)
+    assert bad.status_code == 400
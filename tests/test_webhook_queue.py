@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app import schemas
+from app.webhook_queue import QueueFullError, WebhookQueue
+
+
+def _message(wa_id: str) -> schemas.WhatsAppMessageCreate:
+    return schemas.WhatsAppMessageCreate(
+        id=wa_id, body="hola", timestamp=datetime(2024, 1, 1), **{"from": "1111"}
+    )
+
+
+def test_queue_drains_in_batches_on_stop():
+    batches = []
+
+    async def handler(messages):
+        batches.append([m.wa_id for m in messages])
+
+    async def scenario():
+        queue = WebhookQueue(handler, batch_size=10)
+        await queue.start()
+        for i in range(3):
+            await queue.put([_message(f"m{i}")])
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert [wa_id for batch in batches for wa_id in batch] == ["m0", "m1", "m2"]
+    assert stats["processed_messages"] == 3
+    assert stats["depth"] == 0
+
+
+def test_queue_applies_backpressure():
+    release = None
+
+    async def handler(messages):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = WebhookQueue(handler, maxsize=1, batch_size=1, enqueue_timeout=0.05)
+        await queue.start()
+        await queue.put([_message("a")])  # taken by the worker, which blocks
+        await asyncio.sleep(0.01)
+        await queue.put([_message("b")])  # fills the queue
+        with pytest.raises(QueueFullError):
+            await queue.put([_message("c")])
+        release.set()
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["processed_messages"] == 2
+
+
+def test_spooled_payloads_replayed_after_restart(tmp_path):
+    spool = str(tmp_path / "spool.db")
+    stored = []
+
+    async def stuck(messages):
+        await asyncio.sleep(3600)
+
+    async def handler(messages):
+        stored.extend(m.wa_id for m in messages)
+
+    async def scenario():
+        first = WebhookQueue(stuck, spool_path=spool)
+        await first.start()
+        await first.put([_message("x1"), _message("x2")])
+        await first.stop(timeout=0.05)
+
+        second = WebhookQueue(handler, spool_path=spool)
+        await second.start()
+        await second.stop()
+
+    asyncio.run(scenario())
+    assert stored == ["x1", "x2"]
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_queue_exports_prometheus_metrics():
+    release = None
+
+    async def handler(messages):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = WebhookQueue(handler, maxsize=1, batch_size=1, enqueue_timeout=0.05)
+        await queue.start()
+        await queue.put([_message("a")])
+        await asyncio.sleep(0.01)
+        await queue.put([_message("b"), _message("c")])
+        assert _sample("moolah_webhook_queue_depth") == 1
+        with pytest.raises(QueueFullError):
+            await queue.put([_message("d")])
+        release.set()
+        await queue.stop()
+
+    payloads = "moolah_webhook_queue_payloads_total"
+    before = {
+        "enqueued": _sample(payloads, result="enqueued"),
+        "rejected": _sample(payloads, result="rejected"),
+        "batches": _sample("moolah_webhook_queue_batches_total", result="stored"),
+        "messages": _sample("moolah_webhook_queue_messages_total"),
+        "lags": _sample("moolah_webhook_queue_lag_seconds_count"),
+    }
+    asyncio.run(scenario())
+    assert _sample(payloads, result="enqueued") == before["enqueued"] + 2
+    assert _sample(payloads, result="rejected") == before["rejected"] + 1
+    assert (
+        _sample("moolah_webhook_queue_batches_total", result="stored")
+        == before["batches"] + 2
+    )
+    assert _sample("moolah_webhook_queue_messages_total") == before["messages"] + 3
+    assert _sample("moolah_webhook_queue_lag_seconds_count") == before["lags"] + 2
+    assert _sample("moolah_webhook_queue_depth") == 0
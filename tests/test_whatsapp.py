@@ -1,6 +1,27 @@
 import os
 from datetime import datetime
 
+import pytest
+
+from app import whatsapp_api
+
+
+def _command_payload(wa_id, sender, body):
+    ts = str(int(datetime.now().timestamp()))
+    message = {'id': wa_id, 'from': sender, 'timestamp': ts, 'text': {'body': body}}
+    return {'entry': [{'changes': [{'value': {'messages': [message]}}]}]}
+
+
+def _link_phone(client, headers, monkeypatch, phone):
+    sent = []
+
+    async def send_text(to, body):
+        sent.append(body.split()[-1])
+
+    monkeypatch.setattr(whatsapp_api, 'send_text', send_text)
+    client.post('/users/me/phone', json={'phone_number': phone}, headers=headers)
+    return client.post('/users/me/phone/verify', json={'code': sent[-1]}, headers=headers)
+
 
 def test_get_config_returns_phone_number_id(client, db_setup, auth_headers):
     os.environ['PHONE_NUMBER_ID'] = '12345'
@@ -11,7 +32,7 @@ def test_get_config_returns_phone_number_id(client, db_setup, auth_headers):
     os.environ.pop('PHONE_NUMBER_ID')
 
 
-def test_store_and_retrieve_messages(client, db_setup, auth_headers):
+def test_store_and_retrieve_messages(client, db_setup, auth_headers, post_webhook):
     payload = {
         'entry': [
             {
@@ -33,10 +54,10 @@ def test_store_and_retrieve_messages(client, db_setup, auth_headers):
         ]
     }
 
-    resp = client.post('/whatsapp', json=payload)
+    resp = post_webhook(payload)
     assert resp.status_code == 204
 
-    headers = auth_headers()
+    headers = auth_headers(is_admin=True)
     list_resp = client.get('/whatsapp/', headers=headers)
     assert list_resp.status_code == 200
     data = list_resp.json()
@@ -45,7 +66,7 @@ def test_store_and_retrieve_messages(client, db_setup, auth_headers):
     assert data[0]['from'] == '1111'
 
 
-def test_duplicate_webhook_idempotent(client, db_setup, auth_headers):
+def test_duplicate_webhook_idempotent(client, db_setup, auth_headers, post_webhook):
     payload = {
         'entry': [
             {
@@ -67,13 +88,17 @@ def test_duplicate_webhook_idempotent(client, db_setup, auth_headers):
         ]
     }
 
-    first = client.post('/whatsapp', json=payload)
+    first = post_webhook(payload)
     assert first.status_code == 204
 
-    second = client.post('/whatsapp', json=payload)
+    assert first.headers['X-Messages-Inserted'] == '1'
+
+    second = post_webhook(payload)
     assert second.status_code == 204
+    assert second.headers['X-Messages-Inserted'] == '0'
+    assert second.headers['X-Messages-Skipped'] == '1'
 
-    headers = auth_headers()
+    headers = auth_headers(is_admin=True)
     resp = client.get('/whatsapp/', headers=headers)
     assert resp.status_code == 200
     data = resp.json()
@@ -87,3 +112,282 @@ def test_auth_token_reuse(client, db_setup, auth_headers):
     wa_resp = client.get('/whatsapp/', headers=headers)
     assert wa_resp.status_code == 200
     assert wa_resp.json() == []
+
+
+def test_batched_webhook_skips_duplicates_in_payload(client, db_setup, auth_headers, post_webhook):
+    ts = str(int(datetime.now().timestamp()))
+    messages = [
+        {'id': f'wamid.B{i % 3}', 'from': '3333', 'timestamp': ts, 'text': {'body': f'm{i}'}}
+        for i in range(5)
+    ]
+    payload = {'entry': [{'changes': [{'value': {'messages': messages}}]}]}
+
+    resp = post_webhook(payload)
+    assert resp.status_code == 204
+    assert resp.headers['X-Messages-Inserted'] == '3'
+    assert resp.headers['X-Messages-Skipped'] == '2'
+
+    headers = auth_headers(is_admin=True)
+    data = client.get('/whatsapp/', headers=headers).json()
+    assert sorted(m['wa_id'] for m in data) == ['wamid.B0', 'wamid.B1', 'wamid.B2']
+
+
+def test_incremental_and_filtered_fetch(client, db_setup, auth_headers, post_webhook):
+    base = int(datetime(2024, 1, 1).timestamp())
+    messages = [
+        {'id': f'wamid.S{i}', 'from': '4444' if i % 2 else '5555',
+         'timestamp': str(base + i), 'text': {'body': f'm{i}'}}
+        for i in range(5)
+    ]
+    post_webhook({'entry': [{'changes': [{'value': {'messages': messages}}]}]})
+    headers = auth_headers(is_admin=True)
+
+    page = client.get('/whatsapp/', params={'limit': 2}, headers=headers)
+    assert [m['body'] for m in page.json()] == ['m0', 'm1']
+    after_id = page.headers['X-Next-After-Id']
+
+    rest = client.get('/whatsapp/', params={'after_id': after_id}, headers=headers)
+    assert [m['body'] for m in rest.json()] == ['m2', 'm3', 'm4']
+    assert 'X-Next-After-Id' not in rest.headers
+
+    sender = client.get('/whatsapp/', params={'from_number': '4444'}, headers=headers)
+    assert [m['body'] for m in sender.json()] == ['m1', 'm3']
+
+    since = datetime.fromtimestamp(base + 2).isoformat()
+    recent = client.get('/whatsapp/', params={'since': since}, headers=headers)
+    assert [m['body'] for m in recent.json()] == ['m3', 'm4']
+
+
+def test_parse_command_variants():
+    from decimal import Decimal
+
+    from app.whatsapp_parser import parse_command
+
+    categories = {'comida': 1, 'transporte publico': 2}
+    assert parse_command('Gasto 45 comida', categories).amount == Decimal('-45')
+    assert parse_command('gasté $12,50 en comida', categories).category_id == 1
+    command = parse_command('ingreso 1000', categories)
+    assert (command.amount, command.category_id) == (Decimal('1000'), None)
+    assert parse_command('pagué 3  Transporte  Público', categories).category_id == 2
+    assert parse_command('gasto 5 cine', categories).category_id is None
+    assert parse_command('hola', categories) is None
+    assert parse_command('gasto comida', categories) is None
+    # Longer than Numeric(10, 2) can store
+    assert parse_command('ingreso 99999999999999999999', categories) is None
+    assert parse_command('ingreso 99999999,99', categories).amount == Decimal('99999999.99')
+
+
+
+def test_webhook_commands_create_transactions(
+    client, db_setup, auth_headers, post_webhook, monkeypatch
+):
+    headers = auth_headers()
+    admin_headers = auth_headers('admin@example.com', 'secret', True)
+    resp = _link_phone(client, headers, monkeypatch, '+54 9 11 2233')
+    assert resp.json()['phone_number'] == '549112233'
+    cat_id = client.post(
+        '/categories/', json={'name': 'Comida'}, headers=admin_headers
+    ).json()['id']
+
+    ts = str(int(datetime.now().timestamp()))
+    bodies = ['gasto 45 comida', 'ingreso 100', 'hola', 'gasto 10 comida']
+    messages = [
+        {
+            'id': f'wamid.CMD{i}',
+            'from': '549112233' if i < 3 else '999',
+            'timestamp': ts,
+            'text': {'body': body},
+        }
+        for i, body in enumerate(bodies)
+    ]
+    payload = {'entry': [{'changes': [{'value': {'messages': messages}}]}]}
+    assert post_webhook(payload).status_code == 204
+    # Redelivery must not record the commands twice
+    assert post_webhook(payload).status_code == 204
+
+    txs = client.get('/transactions/', headers=headers).json()
+    assert sorted((tx['amount'], tx['category_id']) for tx in txs) == [
+        (-45.0, cat_id),
+        (100.0, None),
+    ]
+
+
+def test_upserts_without_on_conflict(client, db_setup, auth_headers, monkeypatch, post_webhook):
+    from app import crud, upserts
+    from app.database import SessionLocal
+
+    # Databases without ON CONFLICT take the portable update-or-insert path
+    monkeypatch.setattr(upserts, 'dialect_insert', lambda db: None)
+    ts = str(int(datetime.now().timestamp()))
+    messages = [
+        {'id': f'wamid.P{i % 2}', 'from': '6666', 'timestamp': ts, 'text': {'body': 'x'}}
+        for i in range(3)
+    ]
+    payload = {'entry': [{'changes': [{'value': {'messages': messages}}]}]}
+    resp = post_webhook(payload)
+    assert resp.headers['X-Messages-Inserted'] == '2'
+    assert resp.headers['X-Messages-Skipped'] == '1'
+    resp = post_webhook(payload)
+    assert resp.headers['X-Messages-Inserted'] == '0'
+
+    headers = auth_headers()
+    for amount in (1, 2):
+        assert client.post('/transactions/', json={'amount': amount}, headers=headers).status_code == 200
+    db = SessionLocal()
+    try:
+        user_id = crud.get_user_by_email(db, 'user@example.com').id
+        assert crud.get_collection_version(db, user_id, 'transactions') == 2
+    finally:
+        db.close()
+
+
+def test_webhook_rejects_bad_signature(client, db_setup, auth_headers, post_webhook):
+    payload = _command_payload('wamid.SIG', '7777', 'hola')
+    assert client.post('/whatsapp', json=payload).status_code == 403
+    assert post_webhook(payload, secret='wrong').status_code == 403
+    # Signatures are checked before the body is even parsed
+    assert client.post('/whatsapp', content=b'not json').status_code == 403
+
+    headers = auth_headers()
+    assert client.get('/whatsapp/', headers=headers).json() == []
+
+
+def test_phone_number_requires_verification(client, db_setup, auth_headers, monkeypatch):
+    headers = auth_headers()
+    other = auth_headers('other@example.com')
+    resp = client.patch('/users/me/', json={'phone_number': '1234'}, headers=headers)
+    assert resp.status_code == 400
+
+    sent = []
+
+    async def send_text(to, body):
+        sent.append(body.split()[-1])
+
+    monkeypatch.setattr(whatsapp_api, 'send_text', send_text)
+    resp = client.post('/users/me/phone', json={'phone_number': '1234'}, headers=headers)
+    assert resp.status_code == 202
+    assert client.get('/users/me/', headers=headers).json()['phone_number'] is None
+
+    resp = client.post('/users/me/phone/verify', json={'code': 'wrong'}, headers=headers)
+    assert resp.status_code == 400
+    resp = client.post('/users/me/phone/verify', json={'code': sent[0]}, headers=headers)
+    assert resp.json()['phone_number'] == '1234'
+    # The code is single use
+    resp = client.post('/users/me/phone/verify', json={'code': sent[0]}, headers=headers)
+    assert resp.status_code == 400
+
+    resp = client.post('/users/me/phone', json={'phone_number': '1234'}, headers=other)
+    assert resp.status_code == 400
+
+    resp = client.patch('/users/me/', json={'phone_number': None}, headers=headers)
+    assert resp.json()['phone_number'] is None
+
+
+def test_phone_verification_send_failure(client, db_setup, auth_headers, monkeypatch):
+    async def send_text(to, body):
+        raise whatsapp_api.WhatsAppSendError('down')
+
+    monkeypatch.setattr(whatsapp_api, 'send_text', send_text)
+    headers = auth_headers()
+    resp = client.post('/users/me/phone', json={'phone_number': '1234'}, headers=headers)
+    assert resp.status_code == 502
+
+
+def test_failed_command_is_retried_on_redelivery(
+    client, db_setup, auth_headers, post_webhook, monkeypatch
+):
+    from app import crud
+
+    headers = auth_headers()
+    _link_phone(client, headers, monkeypatch, '8888')
+    payload = _command_payload('wamid.RETRY', '8888', 'gasto 20')
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('insert failed')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(crud, '_insert_transaction_rows', fail)
+        with pytest.raises(RuntimeError):
+            post_webhook(payload)
+
+    # Nothing was stored, so the redelivery is processed instead of skipped
+    resp = post_webhook(payload)
+    assert resp.headers['X-Messages-Inserted'] == '1'
+    txs = client.get('/transactions/', headers=headers).json()
+    assert [tx['amount'] for tx in txs] == [-20.0]
+
+
+def _commands_payload(sender, bodies, prefix):
+    ts = str(int(datetime.now().timestamp()))
+    messages = [
+        {'id': f'{prefix}{i}', 'from': sender, 'timestamp': ts, 'text': {'body': body}}
+        for i, body in enumerate(bodies)
+    ]
+    return {'entry': [{'changes': [{'value': {'messages': messages}}]}]}
+
+
+def test_poison_command_does_not_lose_the_payload(
+    client, db_setup, auth_headers, post_webhook, monkeypatch
+):
+    headers = auth_headers()
+    _link_phone(client, headers, monkeypatch, '9999')
+    bodies = ['gasto 5', 'ingreso 99999999999999999999', 'ingreso 7']
+    resp = post_webhook(_commands_payload('9999', bodies, 'wamid.POISON'))
+    assert resp.status_code == 204
+
+    stored = client.get('/whatsapp/', headers=headers).json()
+    assert [m['body'] for m in stored] == bodies
+    txs = client.get('/transactions/', headers=headers).json()
+    assert sorted(tx['amount'] for tx in txs) == [-5.0, 7.0]
+
+
+def test_refused_command_only_costs_its_own_transaction(
+    client, db_setup, auth_headers, post_webhook, monkeypatch
+):
+    from app import crud
+
+    headers = auth_headers()
+    _link_phone(client, headers, monkeypatch, '9998')
+    insert_rows = crud._insert_transaction_rows
+
+    def refuse_13(db, rows, **kwargs):
+        # Stands in for a value the database cannot store
+        if any(row['amount'] == 13 for row in rows):
+            raise OverflowError('out of range')
+        return insert_rows(db, rows, **kwargs)
+
+    monkeypatch.setattr(crud, '_insert_transaction_rows', refuse_13)
+    bodies = ['ingreso 2', 'ingreso 13', 'gasto 3']
+    resp = post_webhook(_commands_payload('9998', bodies, 'wamid.REFUSED'))
+    assert resp.headers['X-Messages-Inserted'] == '3'
+
+    assert len(client.get('/whatsapp/', headers=headers).json()) == 3
+    txs = client.get('/transactions/', headers=headers).json()
+    assert sorted(tx['amount'] for tx in txs) == [-3.0, 2.0]
+
+
+def test_users_only_read_their_own_messages(
+    client, db_setup, auth_headers, post_webhook, monkeypatch
+):
+    owner = auth_headers()
+    other = auth_headers('other@example.com')
+    admin = auth_headers('admin@example.com', is_admin=True)
+    _link_phone(client, owner, monkeypatch, '1212')
+    post_webhook(_commands_payload('1212', ['hola'], 'wamid.MINE'))
+    post_webhook(_commands_payload('3434', ['secreto'], 'wamid.THEIRS'))
+
+    mine = client.get('/whatsapp/', headers=owner).json()
+    assert [m['body'] for m in mine] == ['hola']
+    # Another sender's number cannot be requested either
+    resp = client.get('/whatsapp/', params={'from_number': '3434'}, headers=owner)
+    assert resp.json() == []
+    assert client.get('/whatsapp/', headers=other).json() == []
+
+    everything = client.get('/whatsapp/', headers=admin).json()
+    assert [m['body'] for m in everything] == ['hola', 'secreto']
+    resp = client.get('/whatsapp/', params={'from_number': '3434'}, headers=admin)
+    assert [m['body'] for m in resp.json()] == ['secreto']
+
+    # Unlinking the number hides its messages right away
+    client.patch('/users/me/', json={'phone_number': None}, headers=owner)
+    assert client.get('/whatsapp/', headers=owner).json() == []